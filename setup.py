@@ -5,5 +5,5 @@ setup(
     version="0.1",
     description="Repository for web-based physics simulations",
     package_dir={"": "src"},
-    packages=["web", "schrodinger", "pendulum", "mandelbrot"]
+    packages=["backend", "web", "schrodinger", "pendulum", "mandelbrot", "nbody"]
 )
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Array backend shared by the simulations: CuPy on GPU hosts, NumPy and SciPy elsewhere.
+
+PHYSICS_DEMOS_BACKEND selects "cupy" or "numpy"; by default CuPy is used when it
+imports and finds a device. `xp`, `sparse`, `linalg`, `fft` and `ndimage` have the
+same interface either way, so solver code never branches on the backend. On the CPU,
+eigsh runs on ARPACK and dense kernels on NumPy's BLAS, both multithreaded.
+"""
+import os
+
+import numpy as np
+
+BACKEND = os.environ.get("PHYSICS_DEMOS_BACKEND", "auto").lower()
+
+if BACKEND not in ("auto", "cupy", "numpy"):
+    raise ValueError(f"Unknown PHYSICS_DEMOS_BACKEND: {BACKEND}")
+
+
+def _load_cupy():
+    import cupy
+    import cupyx.scipy.fft
+    import cupyx.scipy.ndimage
+    import cupyx.scipy.sparse
+    import cupyx.scipy.sparse.linalg
+
+    # Raises when the driver or a device is missing, not just when cupy isn't installed
+    cupy.cuda.runtime.getDeviceCount()
+
+    return cupy, cupyx.scipy.sparse, cupyx.scipy.sparse.linalg, cupyx.scipy.fft, cupyx.scipy.ndimage
+
+
+xp = None
+if BACKEND != "numpy":
+    try:
+        xp, sparse, linalg, fft, ndimage = _load_cupy()
+    except Exception:
+        if BACKEND == "cupy":
+            raise
+
+if xp is None:
+    import scipy.fft as fft
+    import scipy.ndimage as ndimage
+    import scipy.sparse as sparse
+    import scipy.sparse.linalg as linalg
+
+    xp = np
+
+GPU = xp is not np
+
+
+def to_host(array):
+    """NumPy view of a backend array; a no-op on the CPU."""
+    return array.get() if GPU and isinstance(array, xp.ndarray) else array
+
+
+def to_device(array, dtype=None):
+    return xp.asarray(array, dtype=dtype)
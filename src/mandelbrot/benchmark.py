@@ -0,0 +1,82 @@
+import time
+
+from mandelbrot.julia import JULIA_BOUNDS, JuliaSet
+from mandelbrot.mandelbrot_set import MandelbrotSet
+
+# (real_lower, real_upper, imag_lower, imag_upper, n_iter)
+STANDARD_VIEWS = {
+    "full": (-2.0, 1.0, -1.0, 1.0, 500),
+    # Border entirely outside the set, so it has a single escape count
+    "wide": (-3.0, 3.0, -3.0, 3.0, 500),
+    "seahorse_valley": (-0.75, -0.74, 0.1, 0.11, 1000),
+    "elephant_valley": (0.25, 0.35, -0.05, 0.05, 1000),
+    "mini_mandelbrot": (-1.8, -1.7, -0.05, 0.05, 1000),
+    "spiral": (0.114, 0.122, 0.627, 0.635, 3000),
+}
+
+
+# Julia c values compared at JULIA_BOUNDS; the last is outside the Mandelbrot set
+JULIA_C = (-0.8 + 0.156j, -0.4 + 0.6j, -0.123 + 0.745j, -1.0, 0.285 + 0.01j, -0.7269 + 0.1889j, 0.3 + 0.5j)
+
+
+def time_strategy(strategy, view, res, c=None):
+    real_lower, real_upper, imag_lower, imag_upper, n_iter = view
+    if c is None:
+        mandelbrot_set = MandelbrotSet(real_lower, real_upper, imag_lower, imag_upper, *res)
+    else:
+        mandelbrot_set = JuliaSet(c, real_lower, real_upper, imag_lower, imag_upper, *res)
+
+    start = time.perf_counter()
+    if strategy == "mariani_silver":
+        mandelbrot_set.mariani_silver(n_iter)
+    else:
+        mandelbrot_set.iterate(n_iter)
+
+    return time.perf_counter() - start, mandelbrot_set
+
+
+def compare_strategies(res=(1536, 1024)):
+    print(f"{'view':<18}{'brute force':>14}{'mariani-silver':>16}{'speedup':>10}{'agreement':>12}")
+
+    for name, view in STANDARD_VIEWS.items():
+        t_brute, brute = time_strategy("brute_force", view, res)
+        t_ms, ms = time_strategy("mariani_silver", view, res)
+
+        agreement = float((brute.escape_time == ms.escape_time).mean())
+
+        print(f"{name:<18}{t_brute:>13.3f}s{t_ms:>15.3f}s{t_brute / t_ms:>9.2f}x{agreement:>12.6f}")
+
+
+def compare_julia(res=(1024, 1024), n_iter=500):
+    print(f"{'c':<18}{'brute force':>14}{'mariani-silver':>16}{'speedup':>10}{'agreement':>12}")
+
+    for c in JULIA_C:
+        t_brute, brute = time_strategy("brute_force", JULIA_BOUNDS + (n_iter,), res, c)
+        t_ms, ms = time_strategy("mariani_silver", JULIA_BOUNDS + (n_iter,), res, c)
+
+        agreement = float((brute.escape_time == ms.escape_time).mean())
+
+        print(f"{str(complex(c)):<18}{t_brute:>13.3f}s{t_ms:>15.3f}s{t_brute / t_ms:>9.2f}x{agreement:>12.6f}")
+
+
+def time_colorization(res=(1536, 1024)):
+    print(f"{'view':<18}{'render':>10}{'colorize':>10}{'smooth':>10}{'resampled':>11}")
+
+    for name, view in STANDARD_VIEWS.items():
+        t_render, mandelbrot_set = time_strategy("brute_force", view, res)
+
+        timings = []
+        for smooth, resolution in ((False, res), (True, res), (False, (res[0] // 2, res[1] // 2))):
+            mandelbrot_set.colorizer.smooth = smooth
+
+            start = time.perf_counter()
+            mandelbrot_set.get_image(resolution)
+            timings.append(time.perf_counter() - start)
+
+        print(f"{name:<18}{t_render:>9.3f}s" + "".join(f"{t:>9.3f}s" for t in timings[:2]) + f"{timings[2]:>10.3f}s")
+
+
+if __name__=="__main__":
+    compare_strategies()
+    compare_julia()
+    time_colorization()
@@ -0,0 +1,173 @@
+"""Buddhabrot / Nebulabrot orbit-density renders.
+
+Random c values are sampled in large batches; points inside the main cardioid and the
+period-2 bulb never escape and are rejected before iterating. The escape counts of the
+rest come from the escape-time kernel, and the orbits of escaping points are replayed
+and binned into a 2-D histogram per color channel, one channel per iteration limit
+(a single limit gives the Buddhabrot). Each worker process accumulates its own
+histogram; the parent merges them as they arrive and can emit previews along the way.
+
+    python -m mandelbrot.buddhabrot --samples 2e8 --limits 5000 500 50 --output nebula.png
+"""
+import argparse
+from multiprocessing import Pool
+import os
+
+import numpy as np
+from PIL import Image
+
+from mandelbrot.mandelbrot_set import iterate_points
+
+SAMPLE_REGION = (-2.0, 1.0, -1.5, 1.5)
+
+
+def in_main_bulbs(c):
+    """Points of the main cardioid and the period-2 bulb, which never escape."""
+    x = c.real - 0.25
+    y2 = c.imag * c.imag
+    q = x * x + y2
+
+    return (q * (q + x) <= 0.25 * y2) | ((c.real + 1) ** 2 + y2 <= 1 / 16)
+
+
+def escape_counts(c, n_iter):
+    z = np.zeros_like(c)
+    z_mask = np.ones(c.shape, dtype=bool)
+    escape_time = np.zeros(c.shape, dtype=np.int32)
+
+    iterate_points(c, z, z_mask, escape_time, n_iter, np.arange(len(c)))
+
+    return escape_time, ~z_mask
+
+
+def accumulate_batch(hist, c, escape_time, limits, bounds, min_iter):
+    """Replay the orbits of escaping points and bin every point that lands in `bounds`."""
+    real_lower, real_upper, imag_lower, imag_upper = bounds
+    n_channels, height, width = hist.shape
+
+    x_scale = width / (real_upper - real_lower)
+    y_scale = height / (imag_upper - imag_lower)
+
+    z = np.zeros_like(c)
+    pixels = []
+    counts = []
+
+    for i in range(int(escape_time.max()) + 1):
+        z *= z
+        z += c
+
+        col = ((z.real - real_lower) * x_scale).astype(np.int64)
+        row = ((z.imag - imag_lower) * y_scale).astype(np.int64)
+        inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+
+        pixels.append(row[inside] * width + col[inside])
+        counts.append(escape_time[inside])
+
+        # The orbit of a point with escape count n ends at z_(n + 1), the first point outside |z| < 2
+        alive = escape_time > i
+        c, z, escape_time = c[alive], z[alive], escape_time[alive]
+
+        if len(c) == 0:
+            break
+
+    pixels = np.concatenate(pixels)
+    counts = np.concatenate(counts)
+
+    for channel, limit in enumerate(limits):
+        selected = pixels[(counts < limit) & (counts >= min_iter)]
+        hist[channel] += np.bincount(selected, minlength=height * width).reshape(height, width).astype(hist.dtype)
+
+
+def accumulate(n_samples, limits, resolution, bounds, seed, batch_size=1 << 18, min_iter=0, sample_region=SAMPLE_REGION):
+    """One worker's histogram over `n_samples` random c values."""
+    rng = np.random.default_rng(seed)
+    hist = np.zeros((len(limits), resolution[1], resolution[0]), dtype=np.uint32)
+
+    n_iter = max(limits)
+
+    for start in range(0, n_samples, batch_size):
+        n = min(batch_size, n_samples - start)
+
+        c = rng.uniform(sample_region[0], sample_region[1], n) + 1j * rng.uniform(sample_region[2], sample_region[3], n)
+        c = c[~in_main_bulbs(c)]
+
+        escape_time, escaped = escape_counts(c, n_iter)
+        if escaped.any():
+            accumulate_batch(hist, c[escaped], escape_time[escaped], limits, bounds, min_iter)
+
+    return hist
+
+
+def accumulate_task(task):
+    return task[0], accumulate(*task)
+
+
+def render(n_samples, limits=(1000,), resolution=(1000, 1000), bounds=SAMPLE_REGION, processes=None,
+           task_samples=1 << 21, min_iter=0, seed=0, preview=None):
+    """Merge worker histograms; `preview(hist, samples_done)` is called after every `processes` tasks."""
+    processes = processes or os.cpu_count() or 1
+
+    n_tasks = max(1, -(-int(n_samples) // task_samples))
+    seeds = np.random.SeedSequence(seed).spawn(n_tasks)
+    tasks = [
+        (min(task_samples, int(n_samples) - i * task_samples), tuple(limits), tuple(resolution), tuple(bounds), seeds[i], 1 << 18, min_iter)
+        for i in range(n_tasks)
+    ]
+
+    hist = np.zeros((len(limits), resolution[1], resolution[0]), dtype=np.uint64)
+    samples_done = 0
+
+    with Pool(processes) as pool:
+        for i, (n, worker_hist) in enumerate(pool.imap_unordered(accumulate_task, tasks)):
+            hist += worker_hist
+            samples_done += n
+
+            if preview is not None and ((i + 1) % processes == 0 or i + 1 == n_tasks):
+                preview(hist, samples_done)
+
+    return hist
+
+
+def to_image(hist, gamma=0.5):
+    """Tone-map channel densities to an RGB image (one channel is shown in grayscale)."""
+    channels = []
+    for channel in hist:
+        peak = np.percentile(channel[channel > 0], 99.9) if channel.any() else 1
+        channels.append(np.clip(channel / peak, 0, 1) ** gamma)
+
+    while len(channels) < 3:
+        channels.append(channels[-1])
+
+    image = np.stack(channels[:3], axis=-1)[::-1]
+
+    return (image * 255).astype(np.uint8)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a Buddhabrot (one limit) or Nebulabrot (three limits).")
+    parser.add_argument("--samples", type=float, default=1e7)
+    parser.add_argument("--limits", type=int, nargs="+", default=(5000, 500, 50), help="iteration limit per RGB channel")
+    parser.add_argument("--min-iter", type=int, default=0, help="ignore orbits shorter than this")
+    parser.add_argument("--resolution", type=int, nargs=2, default=(1000, 1000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--bounds", type=float, nargs=4, default=SAMPLE_REGION,
+                        metavar=("REAL_LOWER", "REAL_UPPER", "IMAG_LOWER", "IMAG_UPPER"))
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--histogram", help="also save the merged histogram as .npy")
+    parser.add_argument("--output", required=True, help="PNG, rewritten with each preview")
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    args = parse_args()
+
+    def preview(hist, samples_done):
+        Image.fromarray(to_image(hist)).save(args.output)
+        print(f"{samples_done:.3e} / {args.samples:.3e} samples")
+
+    hist = render(int(args.samples), args.limits, args.resolution, args.bounds, args.processes,
+                  min_iter=args.min_iter, seed=args.seed, preview=preview)
+
+    if args.histogram:
+        np.save(args.histogram, hist)
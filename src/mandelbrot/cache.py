@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from threading import Lock
+import os
+
+import numpy as np
+
+from backend import xp, to_host
+from mandelbrot.mandelbrot_set import MandelbrotSet, PRECISIONS
+
+CACHE_DIR = os.environ.get("MANDELBROT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "physics-demos", "mandelbrot"))
+CACHE_MAX_BYTES = int(os.environ.get("MANDELBROT_CACHE_MAX_BYTES", 2 * 1024**3))
+
+
+class EscapeTimeCache:
+    """Disk cache of MandelbrotSet state keyed by bounds, resolution and precision mode.
+
+    Entries hold the escape counts, the orbit of every still-bounded point and |z| of
+    escaped points (enough for smooth coloring), so a deeper request resumes from the
+    stored depth. Files are compressed .npz; the least recently used are evicted once
+    the directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.lock = Lock()
+
+    def key(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision):
+        fields = (float(real_lower), float(real_upper), float(imag_lower), float(imag_upper), int(N_real), int(N_imag), str(precision))
+        return sha1(repr(fields).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def set_key(self, mandelbrot_set):
+        return self.key(*mandelbrot_set.real_range, *mandelbrot_set.imag_range, mandelbrot_set.N_real, mandelbrot_set.N_imag, mandelbrot_set.precision)
+
+    def depth(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision="double"):
+        """Stored iteration depth for a view, or 0 if it is not cached."""
+        path = self.path(self.key(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision))
+        try:
+            with np.load(path) as entry:
+                return int(entry["N_iterations"])
+        except (OSError, KeyError, ValueError):
+            return 0
+
+    def load(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision="double", **kwargs):
+        path = self.path(self.key(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision))
+
+        try:
+            with np.load(path) as entry:
+                escape_time = entry["escape_time"]
+                z_mask = entry["z_mask"]
+                z_active = entry["z_active"]
+                z_escaped_abs = entry["z_escaped_abs"]
+                N_iterations = int(entry["N_iterations"])
+                guessed = entry["guessed"] if "guessed" in entry.files else None
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+
+        mandelbrot_set = MandelbrotSet(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision=precision, **kwargs)
+
+        z = np.zeros(z_mask.shape, dtype=PRECISIONS[precision])
+        z[z_mask] = z_active
+        # Only |z| of escaped points is used after escape, so it is stored as a real number
+        z[~z_mask] = z_escaped_abs
+
+        mandelbrot_set.z = xp.asarray(z)
+        mandelbrot_set.z_mask = xp.asarray(z_mask)
+        mandelbrot_set.escape_time = xp.asarray(escape_time)
+        mandelbrot_set.N_iterations = N_iterations
+        mandelbrot_set.guessed = None if guessed is None else xp.asarray(guessed)
+
+        return mandelbrot_set
+
+    def snapshot(self, mandelbrot_set):
+        z = to_host(mandelbrot_set.z)
+        z_mask = to_host(mandelbrot_set.z_mask)
+
+        arrays = {
+            "escape_time": to_host(mandelbrot_set.escape_time).copy(),
+            "z_mask": z_mask.copy(),
+            "z_active": z[z_mask],
+            "z_escaped_abs": np.abs(z[~z_mask]).astype(np.float32),
+            "N_iterations": np.array(mandelbrot_set.N_iterations),
+        }
+        if mandelbrot_set.guessed is not None:
+            arrays["guessed"] = to_host(mandelbrot_set.guessed).copy()
+
+        return arrays
+
+    def write(self, key, arrays):
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def store(self, mandelbrot_set):
+        self.write(self.set_key(mandelbrot_set), self.snapshot(mandelbrot_set))
+
+    def store_async(self, mandelbrot_set):
+        """Snapshot now and write on the cache's writer thread."""
+        return self.writer.submit(self.write, self.set_key(mandelbrot_set), self.snapshot(mandelbrot_set))
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".npz"):
+                    continue
+
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                total -= size
@@ -0,0 +1,100 @@
+"""Render Mandelbrot images larger than memory in horizontal strips.
+
+Each strip is its own MandelbrotSet on the rows of the full lattice, sized so that its
+state and the iteration kernel's temporaries fit in the memory budget. Escape counts
+(int32, row 0 at imag_lower) or colors (uint8 RGB, image orientation) are written
+straight into a .npy file opened as a memory map.
+
+    python -m mandelbrot.chunked --bounds -2 1 -1 1 --resolution 16384 16384 \\
+        --n-iter 500 --memory-budget 1G --colors --output poster.npy
+"""
+import argparse
+
+import numpy as np
+
+from backend import to_host
+from mandelbrot.mandelbrot_set import MandelbrotSet, PRECISIONS
+from mandelbrot.palette import Colorizer
+
+# Peak bytes per sample while a strip is iterated and colored: z, mask and escape count
+# plus the kernel's gathered working set and complex temporaries
+BYTES_PER_SAMPLE = {"double": 128, "single": 80}
+
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(size):
+    size = str(size).strip().upper()
+    if size[-1] in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1]])
+
+    return int(size)
+
+
+def strip_rows(N_real, memory_budget, precision="double"):
+    return max(1, memory_budget // (N_real * BYTES_PER_SAMPLE[precision]))
+
+
+def render_chunked(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, n_iter, output_path,
+                   memory_budget=512 * 1024**2, precision="double", colors=False, palette="classic", smooth=False,
+                   progress=None):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    if colors:
+        out = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(N_imag, N_real, 3))
+        colorizer = Colorizer(palette, smooth=smooth)
+    else:
+        out = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.int32, shape=(N_imag, N_real))
+
+    imag = np.linspace(imag_lower, imag_upper, N_imag)
+    rows = strip_rows(N_real, memory_budget, precision)
+
+    for r0 in range(0, N_imag, rows):
+        r1 = min(r0 + rows, N_imag)
+
+        strip = MandelbrotSet(real_lower, real_upper, imag[r0], imag[r1 - 1], N_real, r1 - r0, precision=precision)
+        strip.iterate(n_iter)
+
+        if colors:
+            z = strip.z if smooth else None
+            strip_colors = colorizer.colorize(strip.escape_time, n_iter, z, in_place=True)
+            out[N_imag - r1:N_imag - r0] = to_host(strip_colors)[::-1]
+        else:
+            out[r0:r1] = to_host(strip.escape_time)
+
+        del strip
+        out.flush()
+
+        if progress is not None:
+            progress(r1, N_imag)
+
+    return out
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a Mandelbrot image in strips under a memory budget.")
+    parser.add_argument("--bounds", type=float, nargs=4, default=(-2.0, 1.0, -1.0, 1.0),
+                        metavar=("REAL_LOWER", "REAL_UPPER", "IMAG_LOWER", "IMAG_UPPER"))
+    parser.add_argument("--resolution", type=int, nargs=2, required=True, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--n-iter", type=int, default=500)
+    parser.add_argument("--memory-budget", type=parse_size, default=parse_size("512M"), help="e.g. 512M or 2G")
+    parser.add_argument("--precision", choices=sorted(PRECISIONS), default="double")
+    parser.add_argument("--colors", action="store_true", help="write RGB colors instead of escape counts")
+    parser.add_argument("--palette", default="classic")
+    parser.add_argument("--smooth", action="store_true")
+    parser.add_argument("--output", required=True, help=".npy file to memory-map")
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    args = parse_args()
+
+    def report(done, total):
+        print(f"\r{done}/{total} rows", end="", flush=True)
+
+    render_chunked(*args.bounds, *args.resolution, args.n_iter, args.output, memory_budget=args.memory_budget,
+                   precision=args.precision, colors=args.colors, palette=args.palette, smooth=args.smooth,
+                   progress=report)
+    print()
@@ -0,0 +1,144 @@
+"""Julia sets on the shared escape-time engine, and atlases of Julia thumbnails.
+
+A Julia set fixes c and starts each orbit at its lattice point z0, so `JuliaSet` only
+swaps what the lattice holds; progressive passes, reuse and zoom all work unchanged,
+and so does Mariani-Silver while the filled Julia set is connected. An atlas renders
+one thumbnail per c of a grid over the Mandelbrot plane: all thumbnails are stacked
+into one (K, t, t) array and iterated in a single kernel call. Every filled Julia set is symmetric under z -> -z, so only half of each
+thumbnail is iterated and the other half is mirrored.
+
+    python -m mandelbrot.julia --bounds -2 1 -1.5 1.5 --grid 12 12 --thumb 64 --output atlas.png
+"""
+import argparse
+
+from PIL import Image
+
+from backend import xp, to_host
+from mandelbrot.mandelbrot_set import MandelbrotSet, PRECISIONS, iterate_points
+from mandelbrot.palette import Colorizer
+
+# Every filled Julia set with |c| <= 2 lies inside |z| <= 2
+JULIA_BOUNDS = (-2.0, 2.0, -2.0, 2.0)
+
+
+class JuliaSet(MandelbrotSet):
+    def __init__(self, c, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, **kwargs):
+        self.julia_c = complex(c)
+
+        super().__init__(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, **kwargs)
+
+        self.z = (self.real[None, :] + 1j * self.imag[:, None]).astype(self.dtype)
+
+    def c_at(self, index):
+        return self.dtype.type(self.julia_c)
+
+    def start_at(self, index):
+        # The lattice holds the starting points, so the base class's c is z0 here
+        return super().c_at(index)
+
+    def fillable(self, y0, y1, x0, x1, value, N):
+        # A connected filled Julia set is symmetric about 0 and full, so it contains 0
+        # like the Mandelbrot set; a disconnected one (0 escapes) is never filled
+        if escapes(self.julia_c, N):
+            return xp.zeros(len(y0), dtype=bool)
+
+        return super().fillable(y0, y1, x0, x1, value, N)
+
+
+def escapes(c, N):
+    """Whether the orbit of 0 under z^2 + c leaves |z| <= 2 within N iterations, i.e. c is outside the set."""
+    z = 0j
+    for _ in range(N):
+        z = z * z + c
+        if abs(z) > 2:
+            return True
+    return False
+
+
+def atlas_c_values(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag):
+    """The c of every thumbnail, (N_imag, N_real) with row 0 at imag_lower."""
+    real = xp.linspace(real_lower, real_upper, N_real)
+    imag = xp.linspace(imag_lower, imag_upper, N_imag)
+
+    return real[None, :] + 1j * imag[:, None]
+
+
+def julia_atlas(c_values, thumb_size, n_iter, bounds=JULIA_BOUNDS, precision="double", check=None):
+    """Escape counts and final z of one Julia set per c, each (K, t, t) with row 0 at bounds[2]."""
+    dtype = xp.dtype(PRECISIONS[precision])
+    c_values = xp.asarray(c_values, dtype=dtype).ravel()
+
+    K = len(c_values)
+    t = thumb_size
+
+    real = xp.linspace(bounds[0], bounds[1], t)
+    imag = xp.linspace(bounds[2], bounds[3], t)
+
+    # With bounds symmetric about 0, sample (i, j) is the negative of (t-1-i, t-1-j)
+    symmetric = bounds[0] == -bounds[1] and bounds[2] == -bounds[3]
+    rows = (t + 1) // 2 if symmetric else t
+
+    z0 = (real[None, :] + 1j * imag[:rows, None]).astype(dtype)
+
+    z = xp.empty((K, t, t), dtype=dtype)
+    z_mask = xp.ones((K, t, t), dtype=bool)
+    escape_time = xp.zeros((K, t, t), dtype=xp.int32)
+
+    z[:, :rows] = z0
+
+    # Only the computed half is handed to the kernel; c is looked up per thumbnail
+    index = (xp.arange(K)[:, None, None] * (t * t) + xp.arange(rows * t).reshape(1, rows, t)).ravel()
+    iterate_points(c_values[index // (t * t)], z.ravel(), z_mask.ravel(), escape_time.ravel(), n_iter, index, check)
+
+    if symmetric:
+        mirrored = t - rows
+        escape_time[:, rows:] = escape_time[:, mirrored - 1::-1, ::-1]
+        z[:, rows:] = -z[:, mirrored - 1::-1, ::-1]
+
+    return escape_time, z
+
+
+def atlas_image(escape_time, z, n_iter, grid, colorizer, gap=1):
+    """Tile colored thumbnails into one (H, W, 3) image with the largest imaginary parts on top."""
+    N_real, N_imag = grid
+    K, t, _ = escape_time.shape
+
+    colors = colorizer.colorize(escape_time, n_iter, z if colorizer.smooth else None)
+    colors = colors.reshape(N_imag, N_real, t, t, 3)[::-1, :, ::-1]
+
+    if gap:
+        colors = xp.pad(colors, ((0, 0), (0, 0), (0, gap), (0, gap), (0, 0)))
+
+    image = colors.transpose(0, 2, 1, 3, 4).reshape(N_imag * (t + gap), N_real * (t + gap), 3)
+
+    return image[:image.shape[0] - gap, :image.shape[1] - gap] if gap else image
+
+
+def render_atlas(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, thumb_size, n_iter,
+                 palette="classic", smooth=False, precision="double", gap=1, check=None):
+    c_values = atlas_c_values(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag)
+    escape_time, z = julia_atlas(c_values, thumb_size, n_iter, precision=precision, check=check)
+
+    return atlas_image(escape_time, z, n_iter, (N_real, N_imag), Colorizer(palette, smooth=smooth), gap)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render an atlas of Julia sets over a grid of c values.")
+    parser.add_argument("--bounds", type=float, nargs=4, default=(-2.0, 1.0, -1.5, 1.5),
+                        metavar=("REAL_LOWER", "REAL_UPPER", "IMAG_LOWER", "IMAG_UPPER"))
+    parser.add_argument("--grid", type=int, nargs=2, default=(12, 12), metavar=("N_REAL", "N_IMAG"))
+    parser.add_argument("--thumb", type=int, default=64, help="thumbnail size in pixels")
+    parser.add_argument("--n-iter", type=int, default=100)
+    parser.add_argument("--palette", default="classic")
+    parser.add_argument("--smooth", action="store_true")
+    parser.add_argument("--precision", choices=sorted(PRECISIONS), default="double")
+    parser.add_argument("--output", required=True)
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    args = parse_args()
+
+    image = render_atlas(*args.bounds, *args.grid, args.thumb, args.n_iter, args.palette, args.smooth, args.precision)
+    Image.fromarray(to_host(image)).save(args.output)
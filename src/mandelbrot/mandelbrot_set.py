@@ -1,17 +1,122 @@
-try:
-    import cupy as xp
-    from cupyx.scipy.interpolate import RegularGridInterpolator
-except ModuleNotFoundError:
-    import numpy as xp
-    from scipy.interpolate import RegularGridInterpolator
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from PIL import Image
 
+from backend import xp, to_host
+from mandelbrot.palette import Colorizer
+
+PREVIEW_PIXELS = 160 * 160
+
+# complex64 halves the state and roughly doubles throughput, but only resolves shallow zooms
+PRECISIONS = {"double": "complex128", "single": "complex64"}
+
+
+def iterate_points(c, z, z_mask, escape_time, N, index, check=None):
+    """Advance the flat points at `index` (with values `c`) by N iterations, in place.
+
+    `c` is either one value per point or a scalar shared by all of them (Julia sets).
+    Only points that are still bounded are iterated; the working set is compacted
+    as points escape so late iterations touch a small fraction of the grid.
+
+    `check` is called every iteration and may raise to abandon the call. Points that
+    escaped so far are already final; the rest keep their values from before the call.
+    """
+    active = z_mask[index]
+    index = index[active]
+
+    per_point = xp.ndim(c) > 0
+    c_a = c[active] if per_point else c
+    z_a = z[index]
+    e_a = escape_time[index]
+
+    for i in range(N):
+        if index.size == 0:
+            break
+
+        if check is not None:
+            check()
+
+        z_a *= z_a
+        z_a += c_a
+
+        bounded = (z_a.real * z_a.real + z_a.imag * z_a.imag) < 4
+        e_a += bounded
+
+        if not bounded.all():
+            escaped = ~bounded
+            z[index[escaped]] = z_a[escaped]
+            z_mask[index[escaped]] = False
+            escape_time[index[escaped]] = e_a[escaped]
+
+            index = index[bounded]
+            if per_point:
+                c_a = c_a[bounded]
+            z_a = z_a[bounded]
+            e_a = e_a[bounded]
+
+    z[index] = z_a
+    escape_time[index] = e_a
+
+
+def lattice_overlap(old, new, tol=1e-3):
+    """Match two evenly spaced axes whose samples lie on a common lattice.
+
+    Returns (new_slice, old_slice) selecting the shared samples on each axis, or None
+    if one spacing is not an integer multiple of the other or the grids are offset
+    by a fraction of a sample.
+    """
+    if len(old) < 2 or len(new) < 2:
+        return None
+
+    d_old = float(old[1] - old[0])
+    d_new = float(new[1] - new[0])
+
+    if d_old >= d_new:
+        # Same spacing or zoomed in: every old sample lands on the new lattice
+        k = d_old / d_new
+        a = (float(old[0]) - float(new[0])) / d_new
+        if abs(k - round(k)) > tol or abs(a - round(a)) > tol:
+            return None
+        k, a = int(round(k)), int(round(a))
+
+        i_min = max(0, -(a // k))
+        i_max = min(len(old) - 1, (len(new) - 1 - a) // k)
+        if i_max < i_min:
+            return None
+
+        return slice(a + k * i_min, a + k * i_max + 1, k), slice(i_min, i_max + 1)
+
+    # Zoomed out: every new sample that lies inside the old grid is an old sample
+    k = d_new / d_old
+    b = (float(new[0]) - float(old[0])) / d_old
+    if abs(k - round(k)) > tol or abs(b - round(b)) > tol:
+        return None
+    k, b = int(round(k)), int(round(b))
+
+    j_min = max(0, -(b // k))
+    j_max = min(len(new) - 1, (len(old) - 1 - b) // k)
+    if j_max < j_min:
+        return None
+
+    return slice(j_min, j_max + 1), slice(b + k * j_min, b + k * j_max + 1, k)
+
+
+def spans(starts, lengths, step=1):
+    """Concatenate the ranges starts[i] + step * arange(lengths[i]).
+
+    Returns the flat values and, for each value, the index of the range it came from.
+    """
+    lengths = xp.maximum(lengths, 0)
+    ids = xp.repeat(xp.arange(len(starts)), lengths)
+    offsets = xp.arange(int(lengths.sum())) - xp.repeat(xp.cumsum(lengths) - lengths, lengths)
+
+    return starts[ids] + step * offsets, ids
+
+
 class MandelbrotSet:
-    def __init__(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, min_res=(500, 500)):
-        self.real_range = xp.array([real_lower, real_upper])
-        self.imag_range = xp.array([imag_lower, imag_upper])
+    def __init__(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, min_res=(500, 500), palette="classic", smooth=False, precision="double"):
+        self.real_range = xp.array([real_lower, real_upper], dtype=float)
+        self.imag_range = xp.array([imag_lower, imag_upper], dtype=float)
 
         self.real_view_range = self.real_range.copy()
         self.imag_view_range = self.imag_range.copy()
@@ -21,76 +126,305 @@ class MandelbrotSet:
         self.N_real = N_real
         self.N_imag = N_imag
 
-        self.setup_grid()
+        self.precision = precision
+        self.dtype = xp.dtype(PRECISIONS[precision])
 
-        self.z = xp.zeros_like(self.c)
-        self.z_mask = xp.ones(self.z.shape).astype(bool)
+        self.setup_grid()
 
-        self.increasing_res = False
+        self.z = xp.zeros((self.N_imag, self.N_real), dtype=self.dtype)
+        self.z_mask = xp.ones((self.N_imag, self.N_real), dtype=bool)
 
         self.N_iterations = 0
 
+        # In-set samples filled in by mariani_silver rather than iterated; their z is not a real orbit
+        self.guessed = None
+
+        # Cooperative cancellation hook passed down to the iteration kernel
+        self.check = None
+
         self.escape_time = xp.zeros((self.N_imag, self.N_real), dtype=xp.int32)
 
-        red = list(xp.random.randint(0, 255, 10))
-        green = list(xp.random.randint(0, 255, 10))
-        blue = list(xp.random.randint(0, 255, 10))
+        self.colorizer = Colorizer(palette, smooth=smooth)
 
-        self.red   = xp.array([0, ] + red + [0, ])
-        self.green = xp.array([0, ] + green + [0, ])
-        self.blue  = xp.array([0, ] + blue + [0, ])
+    def setup_grid(self):
+        self.real = xp.linspace(*self.real_range, self.N_real)
+        self.imag = xp.linspace(*self.imag_range, self.N_imag)
 
-        indices = list(xp.random.randint(0, 255, 10))
-        indices.sort()
-        self.indices = xp.array([0, ] + indices + [255, ])
+        self.d_real = (self.real_range[1] - self.real_range[0]) / max(self.N_real - 1, 1)
+        self.d_imag = (self.imag_range[1] - self.imag_range[0]) / max(self.N_imag - 1, 1)
 
-        self.red_interp = RegularGridInterpolator((self.indices, ), self.red)
-        self.green_interp = RegularGridInterpolator((self.indices, ), self.green)
-        self.blue_interp = RegularGridInterpolator((self.indices, ), self.blue)
+        self._c = None
 
-    def color_interp(self, _in):
-        r = self.red_interp(_in)
-        g = self.green_interp(_in)
-        b = self.blue_interp(_in)
+    @property
+    def c(self):
+        # The full grid of c is only built for whole-grid iteration; index-based
+        # iteration computes c from the axes so construction stays cheap
+        if self._c is None:
+            self._c = (self.real[None, :] + 1j * self.imag[:, None]).astype(self.dtype, copy=False)
 
-        return xp.stack([r, g, b], axis=-1)
+        return self._c
 
-    def setup_grid(self):
-        self.real = xp.linspace(*self.real_range, self.N_real)
-        self.imag = xp.linspace(*self.imag_range, self.N_imag)
+    @c.setter
+    def c(self, value):
+        self._c = value
+
+    def c_at(self, index):
+        if self._c is not None:
+            return self._c.ravel()[index]
 
-        self.d_real = xp.diff(self.real)[0]
-        self.d_imag = xp.diff(self.imag)[0]
-        
-        real, imag = xp.meshgrid(self.real, self.imag)
+        return (self.real[index % self.N_real] + 1j * self.imag[index // self.N_real]).astype(self.dtype, copy=False)
+
+    def start_at(self, index):
+        """Starting z of the samples at `index`; Mandelbrot orbits all start at 0."""
+        return 0
 
-        self.c = real + 1j * imag
-        
     def iterate(self, N=1):
-        if not self.increasing_res:
-            for i in range(N):
-                xp.putmask(self.z, self.z_mask, self.z * self.z + self.c)
-                xp.putmask(self.z_mask, self.z_mask, xp.abs(self.z) < 2)
-                xp.putmask(self.escape_time, self.z_mask, self.escape_time + 1)
+        if N > 0:
+            self.resolve_guesses()
+
+        self.iterate_index(xp.flatnonzero(self.z_mask), N)
+        self.N_iterations += N
+
+    def iterate_index(self, index, N):
+        iterate_points(self.c_at(index), self.z.ravel(), self.z_mask.ravel(), self.escape_time.ravel(), N, index, self.check)
+
+    def first_stride(self, min_stride=8):
+        stride = min_stride
+        while (self.N_real // stride) * (self.N_imag // stride) > PREVIEW_PIXELS:
+            stride *= 2
+
+        return stride
+
+    def progressive(self, N, known=None, min_stride=8):
+        """Bring every sample to depth N coarse-to-fine, yielding the stride of each finished pass.
+
+        The first pass samples every `stride`-th point; each later pass halves the
+        stride and computes only the samples that the previous passes did not.
+        Samples in `known` are already at depth `N_iterations` and are only resumed.
+        """
+        if N > self.N_iterations:
+            self.resolve_guesses()
+
+        N = max(N, self.N_iterations)
+        stride = self.first_stride(min_stride)
+        first = True
+
+        while stride >= 1:
+            rows = xp.arange(0, self.N_imag, stride)
+            cols = xp.arange(0, self.N_real, stride)
+            index = rows[:, None] * self.N_real + cols[None, :]
+
+            if not first:
+                # Samples on the even sub-lattice were computed by the previous pass
+                new = ~(((rows // stride) % 2 == 0)[:, None] & ((cols // stride) % 2 == 0)[None, :])
+                index = index[new]
+
+            index = index.ravel()
+            if known is not None:
+                index = index[~known.ravel()[index]]
+
+            self.iterate_index(index, N)
+
+            if stride == 1 and known is not None:
+                self.iterate_index(xp.flatnonzero(known), N - self.N_iterations)
+
+            yield stride
+            stride //= 2
+            first = False
+
+        self.N_iterations = N
+
+    def fill(self, N, known=None):
+        """Bring every sample to depth N, computing only the samples not in `known`."""
+        if known is None:
+            self.iterate(max(N - self.N_iterations, 0))
+            return
+
+        if N > self.N_iterations:
+            self.resolve_guesses()
 
-            self.N_iterations += N
+        N = max(N, self.N_iterations)
 
-        else:
-            increase_res_mask = xp.ones_like(self.z_mask)
-            increase_res_mask[::2, ::2] = False
+        self.iterate_index(xp.flatnonzero(~known), N)
+        self.iterate_index(xp.flatnonzero(known), N - self.N_iterations)
 
-            for i in range(self.N_iterations):
-                xp.putmask(self.z, increase_res_mask, self.z * self.z + self.c)
-                xp.putmask(increase_res_mask, increase_res_mask, xp.abs(self.z) < 2)
-                xp.putmask(self.escape_time, increase_res_mask, self.escape_time + 1)
+        self.N_iterations = N
 
-            self.increasing_res = False
+    def same_grid(self, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision="double"):
+        return (
+            (self.N_real, self.N_imag, self.precision) == (N_real, N_imag, precision)
+            and bool((self.real_range == xp.array([real_lower, real_upper])).all())
+            and bool((self.imag_range == xp.array([imag_lower, imag_upper])).all())
+        )
+
+    def reuse(self, previous):
+        """Copy the samples of `previous` that lie on this grid's lattice.
+
+        Returns the mask of copied samples, which are at depth `previous.N_iterations`,
+        or None if the two lattices do not share points.
+        """
+        rows = lattice_overlap(previous.imag, self.imag)
+        cols = lattice_overlap(previous.real, self.real)
+
+        if rows is None or cols is None:
+            return None
+
+        (new_rows, old_rows), (new_cols, old_cols) = rows, cols
+
+        self.z[new_rows, new_cols] = previous.z[old_rows, old_cols]
+        self.z_mask[new_rows, new_cols] = previous.z_mask[old_rows, old_cols]
+        self.escape_time[new_rows, new_cols] = previous.escape_time[old_rows, old_cols]
+        self.N_iterations = previous.N_iterations
+
+        known = xp.zeros(self.z_mask.shape, dtype=bool)
+        known[new_rows, new_cols] = True
+
+        if previous.guessed is not None:
+            # Guessed in-set samples cannot be resumed, so they are recomputed here
+            guessed = xp.zeros(self.z_mask.shape, dtype=bool)
+            guessed[new_rows, new_cols] = previous.guessed[old_rows, old_cols]
+            known &= ~guessed
+
+            index = xp.flatnonzero(guessed)
+            self.z.ravel()[index] = self.start_at(index)
+            self.escape_time.ravel()[index] = 0
+
+        return known
+
+    @classmethod
+    def from_previous(cls, previous, real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, cache=None, precision="double"):
+        """Build the set for a request, reusing what `previous` or `cache` already computed.
+
+        Returns the set and the mask of samples that are already known (None if none are).
+        """
+        if previous is not None and previous.same_grid(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision):
+            return previous, xp.ones(previous.z_mask.shape, dtype=bool)
+
+        if cache is not None:
+            cached = cache.load(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision)
+            if cached is not None:
+                return cached, xp.ones(cached.z_mask.shape, dtype=bool)
+
+        mandelbrot_set = cls(real_lower, real_upper, imag_lower, imag_upper, N_real, N_imag, precision=precision)
+        if previous is None or previous.precision != precision:
+            return mandelbrot_set, None
+
+        return mandelbrot_set, mandelbrot_set.reuse(previous)
+
+    def mariani_silver(self, N, min_size=16):
+        """Iterate a fresh grid to depth N by Mariani-Silver subdivision.
+
+        Only the borders of rectangles are iterated; a rectangle whose border has a
+        single escape count is filled with it (see fillable), otherwise it is split
+        in four until it is `min_size` across, at which point its interior is
+        iterated. Every rectangle of a level is handled in the same vectorized pass.
+        """
+        computed = xp.zeros(self.z_mask.shape, dtype=bool)
+        self.guessed = xp.zeros(self.z_mask.shape, dtype=bool)
+
+        escape_time = self.escape_time.ravel()
+
+        y0 = xp.array([0])
+        y1 = xp.array([self.N_imag - 1])
+        x0 = xp.array([0])
+        x1 = xp.array([self.N_real - 1])
+
+        leaves = []
+
+        while len(y0):
+            h = y1 - y0 + 1
+            w = x1 - x0 + 1
+
+            top, top_ids = spans(y0 * self.N_real + x0, w)
+            bottom, bottom_ids = spans(y1 * self.N_real + x0, w)
+            left, left_ids = spans(y0 * self.N_real + x0, h, self.N_real)
+            right, right_ids = spans(y0 * self.N_real + x1, h, self.N_real)
+
+            border = xp.concatenate([top, bottom, left, right])
+            ids = xp.concatenate([top_ids, bottom_ids, left_ids, right_ids])
+
+            todo = xp.unique(border)
+            todo = todo[~computed.ravel()[todo]]
+            self.iterate_index(todo, N)
+            computed.ravel()[todo] = True
+
+            order = xp.argsort(ids, kind="stable")
+            values = escape_time[border[order]]
+            starts = xp.searchsorted(ids[order], xp.arange(len(y0)))
+
+            low = xp.minimum.reduceat(values, starts)
+            high = xp.maximum.reduceat(values, starts)
+
+            uniform = (low == high) & self.fillable(y0, y1, x0, x1, low, N)
+            leaf = ~uniform & ((h <= min_size) | (w <= min_size))
+            split = ~uniform & ~leaf
+
+            self.fill_rectangles(y0[uniform], y1[uniform], x0[uniform], x1[uniform], low[uniform], N, computed)
+            leaves.append((y0[leaf], y1[leaf], x0[leaf], x1[leaf]))
+
+            y0, y1, x0, x1 = y0[split], y1[split], x0[split], x1[split]
+            ym = (y0 + y1) // 2
+            xm = (x0 + x1) // 2
+
+            y0, y1, x0, x1 = (
+                xp.concatenate([y0, y0, ym, ym]),
+                xp.concatenate([ym, ym, y1, y1]),
+                xp.concatenate([x0, xm, x0, xm]),
+                xp.concatenate([xm, x1, xm, x1]),
+            )
+
+        y0, y1, x0, x1 = (xp.concatenate(bounds) for bounds in zip(*leaves))
+        interior = self.interior(y0, y1, x0, x1)[0]
+        self.iterate_index(interior[~computed.ravel()[interior]], N)
+
+        self.N_iterations = N
+
+    def fillable(self, y0, y1, x0, x1, value, N):
+        """Whether rectangles whose whole border escapes after `value` iterations can be filled with it.
+
+        The set is connected and contains 0, so such a border either encloses none of
+        the set or all of it; only rectangles around the origin can be the latter.
+        """
+        around_origin = ((self.real[x0] <= 0) & (self.real[x1] >= 0) &
+                         (self.imag[y0] <= 0) & (self.imag[y1] >= 0))
+
+        return (value >= N) | ~around_origin
+
+    def interior(self, y0, y1, x0, x1):
+        rows, ids = spans(y0 + 1, y1 - y0 - 1)
+        index, row_ids = spans(rows * self.N_real + x0[ids] + 1, (x1 - x0 - 1)[ids])
+
+        return index, ids[row_ids]
+
+    def fill_rectangles(self, y0, y1, x0, x1, values, N, computed):
+        index, ids = self.interior(y0, y1, x0, x1)
+        values = values[ids]
+
+        self.escape_time.ravel()[index] = values
+        self.z_mask.ravel()[index] = values >= N
+        self.guessed.ravel()[index] = values >= N
+        computed.ravel()[index] = True
+
+    def resolve_guesses(self):
+        if self.guessed is None:
+            return
+
+        index = xp.flatnonzero(self.guessed & self.z_mask)
+
+        self.z.ravel()[index] = self.start_at(index)
+        self.escape_time.ravel()[index] = 0
+        self.iterate_index(index, self.N_iterations)
+
+        self.guessed = None
 
     def zoom(self, N=1):
-        self.c = self.c[N:-N, N:-N]
-        self.z = self.z[N:-N, N:-N]
-        self.z_mask = self.z_mask[N:-N, N:-N]
-        self.escape_time = self.escape_time[N:-N, N:-N]
+        self.resolve_guesses()
+
+        if self._c is not None:
+            self.c = xp.ascontiguousarray(self.c[N:-N, N:-N])
+        self.z = xp.ascontiguousarray(self.z[N:-N, N:-N])
+        self.z_mask = xp.ascontiguousarray(self.z_mask[N:-N, N:-N])
+        self.escape_time = xp.ascontiguousarray(self.escape_time[N:-N, N:-N])
 
         self.real = self.real[N:-N]
         self.imag = self.imag[N:-N]
@@ -105,68 +439,70 @@ class MandelbrotSet:
             self.increase_resolution()
 
     def increase_resolution(self):
-        self.z = xp.array(
-            xp.insert(
-                xp.insert(self.z.get(), xp.arange(-1, -self.N_imag, -1), 0, axis=0), xp.arange(-1, -self.N_real, -1), 0, axis=1
-            )
-        )
+        self.resolve_guesses()
 
-        self.z_mask = xp.array(
-            xp.insert(
-                xp.insert(self.z_mask.get(), xp.arange(-1, -self.N_imag, -1), True, axis=0), xp.arange(-1, -self.N_real, -1), True, axis=1
-            )
-        )
+        N_real = 2 * self.N_real - 1
+        N_imag = 2 * self.N_imag - 1
 
-        self.escape_time = xp.array(
-            xp.insert(
-                xp.insert(self.escape_time.get(), xp.arange(-1, -self.N_imag, -1), 0, axis=0), xp.arange(-1, -self.N_real, -1), 0, axis=1
-            )
-        )
+        z = xp.zeros((N_imag, N_real), dtype=self.z.dtype)
+        z_mask = xp.ones((N_imag, N_real), dtype=bool)
+        escape_time = xp.zeros((N_imag, N_real), dtype=self.escape_time.dtype)
+        known = xp.zeros((N_imag, N_real), dtype=bool)
 
-        self.N_real = 2 * self.N_real - 1
-        self.N_imag = 2 * self.N_imag - 1
+        # The existing samples become the even sub-lattice of the doubled grid
+        z[::2, ::2] = self.z
+        z_mask[::2, ::2] = self.z_mask
+        escape_time[::2, ::2] = self.escape_time
+        known[::2, ::2] = True
 
-        self.real = xp.linspace(*self.real_range, self.N_real)
-        self.imag = xp.linspace(*self.imag_range, self.N_imag)
+        self.z, self.z_mask, self.escape_time = z, z_mask, escape_time
+
+        self.N_real = N_real
+        self.N_imag = N_imag
 
         self.setup_grid()
 
-        self.increasing_res = True
-        self.iterate()
+        index = xp.flatnonzero(~known)
+        self.z.ravel()[index] = self.start_at(index)
+        self.iterate_index(index, self.N_iterations)
+
+    def get_colors(self, z_grid, N=None, z=None):
+        if N is None:
+            N = self.N_iterations or int(z_grid.max())
 
-    def get_colors(self, z_grid):
-        z_grid = (z_grid * 255 / z_grid.max())
-        z_grid[z_grid <= 0] = 0.1
-        z_grid[z_grid >= 255] = 254.9
+        return self.colorizer.colorize(z_grid, N, z)
 
-        shape = z_grid.shape
+    def sample_indices(self, resolution):
+        """Nearest-sample rows and columns for an output resolution, or None if it is the grid's own."""
+        if tuple(resolution) == (self.N_real, self.N_imag):
+            return None
 
-        colors = self.color_interp((z_grid.flatten())).reshape(*shape, 3).astype(xp.uint8)
+        rows = (xp.arange(resolution[1]) * self.N_imag) // resolution[1]
+        cols = (xp.arange(resolution[0]) * self.N_real) // resolution[0]
 
-        return colors
+        return rows[:, None], cols[None, :]
 
-    def get_image(self, resolution):
-        interp = RegularGridInterpolator((xp.arange(self.N_imag), xp.arange(self.N_real)), self.escape_time, bounds_error=True)
+    def get_image(self, resolution, max_iter=None):
+        N = self.N_iterations if max_iter is None else max_iter
+        samples = self.sample_indices(resolution)
 
-        r_n = xp.linspace(0.1, self.N_real - 1.1, resolution[0])
-        i_n = xp.linspace(0.1, self.N_imag - 1.1, resolution[1])
+        if samples is None:
+            return self.colorizer.colorize(self.escape_time, N, self.z)
 
-        image_grid = interp(tuple(xp.meshgrid(i_n, r_n, indexing="ij")))
+        z = self.z[samples] if self.colorizer.smooth else None
 
-        return self.get_colors(image_grid)
+        return self.colorizer.colorize(self.escape_time[samples], N, z, in_place=True)
     
     def shape(self):
         return self.N_real, self.N_imag
     
     def get_hmap(self, resolution):
-        interp = RegularGridInterpolator((xp.arange(self.N_imag), xp.arange(self.N_real)), self.escape_time, bounds_error=True)
-
-        r_n = xp.linspace(0.1, self.N_real - 1.1, resolution[0])
-        i_n = xp.linspace(0.1, self.N_imag - 1.1, resolution[1])
+        samples = self.sample_indices(resolution)
 
-        image_grid = interp(tuple(xp.meshgrid(i_n, r_n, indexing="ij")))
+        if samples is None:
+            return self.escape_time.copy()
 
-        return image_grid
+        return self.escape_time[samples]
 
 if __name__=="__main__":
     center = ( (-0.34853774148008254 -0.34831493420245574  ) / 2, (-0.6065922085831237 -0.606486596104741
@@ -182,7 +518,7 @@ if __name__=="__main__":
     ms = MandelbrotSet(lower[0], upper[0], lower[1], upper[1], *res, min_res=(801, 801))
     ms.iterate(3000)
 
-    log_im = xp.log(xp.log(ms.escape_time.get()))
+    log_im = xp.log(xp.log(to_host(ms.escape_time)))
     log_im *= 255 / log_im.max()
 
     plt.pcolormesh(real, imag, log_im, cmap="gray")
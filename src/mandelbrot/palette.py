@@ -0,0 +1,99 @@
+from functools import lru_cache
+
+import numpy as np
+from backend import xp
+
+# Control points (position in [0, 1], RGB) interpolated into the lookup tables
+PALETTES = {
+    "classic": [
+        (0.0, (0, 7, 100)),
+        (0.16, (32, 107, 203)),
+        (0.42, (237, 255, 255)),
+        (0.6425, (255, 170, 0)),
+        (0.8575, (0, 2, 0)),
+        (1.0, (0, 7, 100)),
+    ],
+    "fire": [
+        (0.0, (0, 0, 0)),
+        (0.3, (128, 0, 0)),
+        (0.6, (255, 128, 0)),
+        (0.85, (255, 255, 0)),
+        (1.0, (255, 255, 255)),
+    ],
+    "ocean": [
+        (0.0, (0, 0, 32)),
+        (0.35, (0, 64, 128)),
+        (0.7, (0, 192, 192)),
+        (1.0, (224, 255, 255)),
+    ],
+    "grayscale": [
+        (0.0, (0, 0, 0)),
+        (1.0, (255, 255, 255)),
+    ],
+}
+
+INTERIOR_COLOR = (0, 0, 0)
+
+
+@lru_cache(maxsize=None)
+def build_lut(palette, size=256, interior=INTERIOR_COLOR):
+    """uint8 RGB table of `size` palette entries followed by one entry for interior points."""
+    positions, colors = zip(*PALETTES[palette])
+
+    x = np.linspace(0, 1, size)
+    lut = np.stack([np.interp(x, positions, channel) for channel in zip(*colors)], axis=-1)
+    lut = np.concatenate([lut, [interior]])
+
+    return xp.asarray(np.round(lut).astype(np.uint8))
+
+
+class Colorizer:
+    def __init__(self, palette="classic", size=256, smooth=False, interior=INTERIOR_COLOR):
+        self.lut = build_lut(palette, size, interior)
+        self.size = size
+        self.smooth = smooth
+
+        self.scratch = {}
+
+    def buffer(self, shape, dtype):
+        # Scratch buffers are kept between calls so repeated renders of one size don't reallocate
+        key = (shape, xp.dtype(dtype))
+        if key not in self.scratch:
+            self.scratch[key] = xp.empty(shape, dtype=dtype)
+
+        return self.scratch[key]
+
+    def indices(self, escape_time, N, z=None, in_place=False):
+        """Map escape counts (depth N) to LUT indices.
+
+        With `in_place` the escape buffer itself is overwritten with the indices.
+        """
+        interior = escape_time >= N
+        scale = (self.size - 1) / max(N, 1)
+
+        index = escape_time if in_place else self.buffer(escape_time.shape, xp.int32)
+
+        if self.smooth and z is not None:
+            # Normalized iteration count n + 1 - log2(log|z|); filled samples carry z = 0
+            nu = self.buffer(escape_time.shape, xp.float32)
+            xp.abs(z, out=nu, casting="same_kind")
+            xp.maximum(nu, 2, out=nu)
+            xp.log(nu, out=nu)
+            xp.log2(nu, out=nu)
+            xp.subtract(escape_time, nu, out=nu, casting="same_kind")
+            nu += 1
+            nu *= scale
+            xp.clip(nu, 0, self.size - 1, out=nu)
+            xp.copyto(index, nu, casting="unsafe")
+        else:
+            xp.multiply(escape_time, self.size - 1, out=index, casting="unsafe")
+            xp.floor_divide(index, max(N, 1), out=index)
+
+        index[interior] = self.size
+
+        return index
+
+    def colorize(self, escape_time, N, z=None, in_place=False, out=None):
+        index = self.indices(escape_time, N, z, in_place)
+
+        return xp.take(self.lut, index, axis=0, out=out)
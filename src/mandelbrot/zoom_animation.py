@@ -0,0 +1,194 @@
+"""Render Mandelbrot zoom videos offline.
+
+Frames are cut from keyframes: keyframe j spans width start_width / 2**j at twice the
+output resolution, so every frame whose width lies between two keyframes is a crop of
+the wider one with at least one sample per output pixel. Consecutive keyframes share
+the zoom center and their lattices nest, so each keyframe reuses a quarter of its
+samples from the previous one. The frame range is split into contiguous segments, one
+per process, and each segment streams its frames to PNG files or to its own ffmpeg
+process; ffmpeg segments are concatenated without re-encoding at the end.
+
+    python -m mandelbrot.zoom_animation --center -0.743643887 0.131825904 \\
+        --start-width 3 --end-width 1e-6 --frames 600 --output zoom.mp4
+"""
+import argparse
+from multiprocessing import Pool
+import math
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from backend import to_host
+from mandelbrot.mandelbrot_set import MandelbrotSet
+from mandelbrot.palette import Colorizer
+
+
+def frame_width(args, k):
+    if args.frames == 1:
+        return args.start_width
+
+    return args.start_width * (args.end_width / args.start_width) ** (k / (args.frames - 1))
+
+
+def keyframe_index(args, width):
+    return max(0, math.floor(math.log2(args.start_width / width) + 1e-9))
+
+
+def keyframe_depth(args, j):
+    n_keyframes = keyframe_index(args, args.end_width) + 1
+    if n_keyframes == 1:
+        return args.n_iter
+
+    return int(round(args.n_iter + (args.n_iter_end - args.n_iter) * j / (n_keyframes - 1)))
+
+
+def render_keyframe(args, j, previous):
+    width = args.start_width / 2**j
+    height = width * args.resolution[1] / args.resolution[0]
+
+    # Odd sample counts put the center on the lattice, so keyframe j + 1's lattice
+    # contains every sample of keyframe j that it covers
+    N_real = 2 * args.resolution[0] + 1
+    N_imag = 2 * args.resolution[1] + 1
+
+    keyframe = MandelbrotSet(
+        args.center[0] - width / 2, args.center[0] + width / 2,
+        args.center[1] - height / 2, args.center[1] + height / 2,
+        N_real, N_imag,
+    )
+    known = None if previous is None else keyframe.reuse(previous)
+    keyframe.fill(keyframe_depth(args, j), known)
+
+    return keyframe
+
+
+def crop(keyframe, colorizer, width, resolution):
+    """Color the centered window of `width` from a keyframe at the output resolution."""
+    height = width * resolution[1] / resolution[0]
+
+    center_col = (keyframe.N_real - 1) / 2
+    center_row = (keyframe.N_imag - 1) / 2
+
+    cols = np.rint(center_col + np.linspace(-width / 2, width / 2, resolution[0]) / float(keyframe.d_real)).astype(int)
+    rows = np.rint(center_row + np.linspace(-height / 2, height / 2, resolution[1]) / float(keyframe.d_imag)).astype(int)
+    cols = np.clip(cols, 0, keyframe.N_real - 1)
+    rows = np.clip(rows, 0, keyframe.N_imag - 1)
+    samples = rows[::-1, None], cols[None, :]
+
+    z = keyframe.z[samples] if colorizer.smooth else None
+    image = colorizer.colorize(keyframe.escape_time[samples], keyframe.N_iterations, z, in_place=True)
+
+    return to_host(image)
+
+
+def ffmpeg_writer(path, args):
+    return subprocess.Popen(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24",
+            "-s", f"{args.resolution[0]}x{args.resolution[1]}", "-r", str(args.fps),
+            "-i", "-",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(args.crf),
+            path,
+        ],
+        stdin=subprocess.PIPE,
+    )
+
+
+def render_segment(args, first, last, segment_path):
+    """Render frames [first, last) in order, streaming each one to its destination."""
+    colorizer = Colorizer(args.palette, smooth=args.smooth)
+
+    writer = None if segment_path is None else ffmpeg_writer(segment_path, args)
+
+    keyframe = None
+    keyframe_j = None
+
+    for k in range(first, last):
+        width = frame_width(args, k)
+        j = keyframe_index(args, width)
+
+        if keyframe_j != j:
+            keyframe = render_keyframe(args, j, keyframe)
+            keyframe_j = j
+
+        frame = crop(keyframe, colorizer, width, args.resolution)
+
+        if writer is None:
+            Image.fromarray(frame).save(os.path.join(args.output, f"frame_{k:05d}.png"), compress_level=args.compress_level)
+        else:
+            writer.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    if writer is not None:
+        writer.stdin.close()
+        if writer.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed writing {segment_path}")
+
+    return last - first
+
+
+def render(args):
+    n_segments = max(1, min(args.processes, args.frames))
+    bounds = [round(i * args.frames / n_segments) for i in range(n_segments + 1)]
+
+    video = os.path.splitext(args.output)[1] in (".mp4", ".mkv", ".mov")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if video:
+            ext = os.path.splitext(args.output)[1]
+            segment_paths = [os.path.join(temp_dir, f"segment_{i:03d}{ext}") for i in range(n_segments)]
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            segment_paths = [None] * n_segments
+
+        tasks = [(args, bounds[i], bounds[i + 1], segment_paths[i]) for i in range(n_segments)]
+
+        with Pool(n_segments) as pool:
+            n_frames = sum(pool.starmap(render_segment, tasks))
+
+        if video:
+            list_path = os.path.join(temp_dir, "segments.txt")
+            with open(list_path, "w") as f:
+                f.writelines(f"file '{path}'\n" for path in segment_paths)
+
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", args.output],
+                check=True,
+            )
+
+    return n_frames
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a Mandelbrot zoom as an image sequence or video.")
+    parser.add_argument("--center", type=float, nargs=2, required=True, metavar=("REAL", "IMAG"))
+    parser.add_argument("--start-width", type=float, default=3.0)
+    parser.add_argument("--end-width", type=float, required=True)
+    parser.add_argument("--frames", type=int, required=True)
+    parser.add_argument("--resolution", type=int, nargs=2, default=(1280, 720), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--n-iter", type=int, default=200, help="iterations at the start width")
+    parser.add_argument("--n-iter-end", type=int, default=None, help="iterations at the end width (default: --n-iter)")
+    parser.add_argument("--palette", default="classic")
+    parser.add_argument("--smooth", action="store_true")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--crf", type=int, default=18, help="x264 quality for video output")
+    parser.add_argument("--compress-level", type=int, default=1, help="PNG compression for image sequences")
+    parser.add_argument("--output", required=True, help="directory for a PNG sequence, or a .mp4/.mkv/.mov file")
+
+    args = parser.parse_args(argv)
+    if args.n_iter_end is None:
+        args.n_iter_end = args.n_iter
+    if not 0 < args.end_width <= args.start_width:
+        parser.error("--end-width must be positive and no larger than --start-width")
+
+    return args
+
+
+if __name__=="__main__":
+    args = parse_args()
+    n_frames = render(args)
+    print(f"Rendered {n_frames} frames to {args.output}")
@@ -0,0 +1,103 @@
+"""Barnes-Hut against direct O(n^2) summation: time per force pass and acceleration error.
+
+Direct summation is timed in full up to `--direct-limit` bodies; above that it is
+timed on a random sample of targets and scaled up to all n, and marked as estimated.
+Errors are always measured on such a sample. "per n log n" is the tree time divided
+by n log2 n, which stays roughly flat if the tree scales as O(n log n).
+
+    python -m nbody.benchmark --model disc --bodies 1000 10000 100000 --theta 0.3 0.5 0.8
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from nbody.gravity import WORKERS, direct_accelerations, tree_accelerations
+from nbody.simulation import MODELS, initial_conditions
+from nbody.tree import LEAF_SIZE, Tree, morton_order
+
+# Largest n whose direct sum is timed over every target
+DIRECT_LIMIT = 10000
+# Targets sampled for errors, and for the direct timing above DIRECT_LIMIT
+SAMPLE = 1000
+
+
+def best_time(function, repeat):
+    """Fastest of `repeat` calls, and the last result."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def tree_pass(positions, masses, theta, softening, leaf_size, workers):
+    """Sort, build and evaluate, as a simulation step does; accelerations come back in input order."""
+    order, codes, _, side = morton_order(positions)
+    tree = Tree(codes, positions[order], masses[order], side, leaf_size)
+
+    acceleration = np.empty_like(positions)
+    acceleration[order] = tree_accelerations(tree, positions[order], masses[order], theta, softening, workers=workers)
+    return acceleration
+
+
+def benchmark(model, n, thetas, softening=1e-2, leaf_size=LEAF_SIZE, workers=WORKERS, repeat=3,
+              direct_limit=DIRECT_LIMIT, sample=SAMPLE, seed=0):
+    """One row per theta: n, theta, tree seconds, direct seconds, whether direct was estimated, and relative errors."""
+    positions, _, masses = initial_conditions(model, n, seed)
+    rng = np.random.default_rng(seed)
+    targets = np.sort(rng.choice(n, min(n, sample), replace=False))
+
+    if n <= direct_limit:
+        direct_time, reference = best_time(lambda: direct_accelerations(positions, masses, softening), repeat)
+        reference = reference[targets]
+    else:
+        direct_time, reference = best_time(lambda: direct_accelerations(positions, masses, softening, targets=targets), repeat)
+        direct_time *= n / len(targets)
+
+    rows = []
+    for theta in thetas:
+        tree_time, acceleration = best_time(lambda: tree_pass(positions, masses, theta, softening, leaf_size, workers), repeat)
+
+        error = np.linalg.norm(acceleration[targets] - reference, axis=1) / np.linalg.norm(reference, axis=1)
+        rows.append({
+            "n": n,
+            "theta": theta,
+            "tree": tree_time,
+            "direct": direct_time,
+            "estimated": n > direct_limit,
+            "median_error": float(np.median(error)),
+            "max_error": float(error.max()),
+        })
+
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time Barnes-Hut force passes against direct summation.")
+    parser.add_argument("--model", choices=MODELS, default="disc")
+    parser.add_argument("--bodies", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--theta", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--softening", type=float, default=1e-2)
+    parser.add_argument("--leaf-size", type=int, default=LEAF_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--direct-limit", type=int, default=DIRECT_LIMIT,
+                        help="above this many bodies, direct summation is timed on a sample and scaled")
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    args = parse_args()
+
+    print(f"{'n':>8} {'theta':>6} {'tree (s)':>10} {'direct (s)':>11} {'speedup':>8} {'per n log n':>12} {'median err':>11} {'max err':>9}")
+    for n in args.bodies:
+        for row in benchmark(args.model, n, args.theta, args.softening, args.leaf_size, args.workers, args.repeat, args.direct_limit):
+            direct = f"{row['direct']:.3f}" + ("*" if row["estimated"] else " ")
+            print(f"{n:>8} {row['theta']:>6.2f} {row['tree']:>10.3f} {direct:>11} {row['direct'] / row['tree']:>8.1f} "
+                  f"{1e9 * row['tree'] / (n * math.log2(n)):>9.1f} ns {row['median_error']:>11.2e} {row['max_error']:>9.2e}")
+
+    print("* estimated from a sample of targets")
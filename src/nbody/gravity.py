@@ -0,0 +1,174 @@
+"""Gravitational accelerations: Barnes-Hut over a flat tree, and direct summation for reference.
+
+Barnes-Hut works on batches of consecutive leaves, whose interaction lists are built
+together (Tree.interactions) and evaluated in a few vectorized passes:
+
+- far nodes act on a leaf as a whole: each contributes its acceleration at the
+  leaf's centre of mass and the gradient of that acceleration, summed per leaf, so
+  the far field costs one pair per (leaf, node) rather than per (body, node), and
+  each body then gets a0 + J (x - c) from its leaf;
+- near leaves interact body by body, as dense blocks of the leaves' bodies padded
+  to a common width with massless slots.
+
+Consecutive leaves hold consecutive bodies, so every batch writes its own slice of
+the result and batches run on a thread pool without locking; NumPy releases the GIL
+inside the arithmetic that dominates a batch.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+# Leaves whose interaction lists are built and evaluated together
+LEAF_BATCH = 64
+
+# Body pairs per near-field pass: bounds its temporaries to a few tens of MB per thread
+NEAR_CHUNK = 1 << 20
+
+WORKERS = os.cpu_count() or 1
+
+
+def inverse_cubes(r2):
+    """1 / r^3 from r^2, with coincident points (a body and itself, padding) giving 0."""
+    with np.errstate(divide="ignore"):
+        inverse = 1 / (r2 * np.sqrt(r2))
+    inverse[r2 == 0] = 0
+    return inverse
+
+
+class LeafBlocks:
+    """Bodies of each leaf in (dim, leaves, width) blocks, padded with massless copies of the leaf's centre of mass."""
+
+    def __init__(self, tree, positions, masses):
+        counts = tree.end[tree.leaves] - tree.start[tree.leaves]
+        self.width = int(counts.max())
+
+        owner = np.repeat(np.arange(len(tree.leaves)), counts)
+        self.slot = np.arange(len(positions)) - tree.start[tree.leaves][owner]
+        self.owner = owner
+
+        self.positions = np.repeat(tree.leaf_com.T[:, :, None], self.width, axis=2)
+        for axis in range(positions.shape[1]):
+            self.positions[axis][owner, self.slot] = positions[:, axis]
+        self.masses = np.zeros((len(tree.leaves), self.width))
+        self.masses[owner, self.slot] = masses
+
+        # Leaf number of each leaf node
+        self.leaf_of_node = np.full(len(tree), -1)
+        self.leaf_of_node[tree.leaves] = np.arange(len(tree.leaves))
+
+
+def far_field(tree, leaves, nodes, first, last, softening, G):
+    """Acceleration (leaves, dim) and its gradient (leaves, dim, dim) at each leaf's centre of mass."""
+    dim = tree.com.shape[1]
+
+    # Axis by axis: NumPy reduces slowly over a trailing axis of length 2 or 3
+    delta = [tree.com[nodes, axis] - tree.leaf_com[leaves, axis] for axis in range(dim)]
+    r2 = sum(d * d for d in delta) + softening**2
+    inverse = G * tree.mass[nodes] * inverse_cubes(r2)
+
+    count = last - first
+    rows = leaves - first
+    acceleration = np.empty((count, dim))
+    gradient = np.empty((count, dim, dim))
+    scaled = [d * (3 * inverse / r2) for d in delta]
+    for i in range(dim):
+        acceleration[:, i] = np.bincount(rows, weights=delta[i] * inverse, minlength=count)
+
+        # d a_i / d x_j at the leaf: (3 r_i r_j / r^2 - delta_ij) G m / r^3, symmetric in i and j
+        for j in range(i, dim):
+            term = scaled[i] * delta[j] - inverse if i == j else scaled[i] * delta[j]
+            gradient[:, i, j] = gradient[:, j, i] = np.bincount(rows, weights=term, minlength=count)
+
+    return acceleration, gradient
+
+
+def near_field(blocks, leaves, sources, first, last, softening, G, chunk=NEAR_CHUNK):
+    """Direct accelerations (leaves, width, dim) of each padded leaf slot from its near leaves."""
+    dim = len(blocks.positions)
+    width = blocks.width
+
+    count = last - first
+    acceleration = np.zeros((count * width, dim))
+    pairs = max(1, chunk // width**2)
+    for start in range(0, len(leaves), pairs):
+        chunk_leaves = leaves[start:start + pairs]
+        chunk_sources = sources[start:start + pairs]
+
+        delta = [blocks.positions[axis][chunk_sources][:, None, :] - blocks.positions[axis][chunk_leaves][:, :, None] for axis in range(dim)]
+        r2 = sum(d * d for d in delta) + softening**2
+        weight = G * blocks.masses[chunk_sources][:, None, :] * inverse_cubes(r2)
+
+        rows = ((chunk_leaves - first)[:, None] * width + np.arange(width)).ravel()
+        for axis in range(dim):
+            pair_sums = np.einsum("psu,psu->ps", delta[axis], weight).ravel()
+            acceleration[:, axis] += np.bincount(rows, weights=pair_sums, minlength=count * width)
+
+    return acceleration.reshape(count, width, dim)
+
+
+def batch_accelerations(tree, blocks, positions, first, last, theta, softening, G):
+    """Accelerations of the bodies in leaves first..last-1, with the body offset they start at."""
+    offset = int(tree.start[tree.leaves[first]])
+    end = int(tree.end[tree.leaves[last - 1]])
+
+    far_leaf, far_node, near_leaf, near_node = tree.interactions(first, last, theta)
+
+    far, gradient = far_field(tree, far_leaf, far_node, first, last, softening, G)
+    near = near_field(blocks, near_leaf, blocks.leaf_of_node[near_node], first, last, softening, G)
+
+    owner = blocks.owner[offset:end] - first
+    slot = blocks.slot[offset:end]
+    displacement = positions[offset:end] - tree.leaf_com[first:last][owner]
+
+    acceleration = far[owner] + np.einsum("bij,bj->bi", gradient[owner], displacement) + near[owner, slot]
+    return offset, acceleration
+
+
+def tree_accelerations(tree, positions, masses, theta=0.5, softening=1e-2, G=1.0, batch=LEAF_BATCH, workers=WORKERS):
+    """Barnes-Hut accelerations of bodies in the tree's (Morton) order; `theta` trades accuracy for speed."""
+    blocks = LeafBlocks(tree, positions, masses)
+
+    acceleration = np.empty_like(positions)
+    batches = [(first, min(first + batch, len(tree.leaves))) for first in range(0, len(tree.leaves), batch)]
+
+    def run(bounds):
+        offset, result = batch_accelerations(tree, blocks, positions, *bounds, theta, softening, G)
+        acceleration[offset:offset + len(result)] = result
+
+    if workers == 1 or len(batches) == 1:
+        for bounds in batches:
+            run(bounds)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(run, batches))
+
+    return acceleration
+
+
+def direct_accelerations(positions, masses, softening=1e-2, G=1.0, targets=None, chunk=256):
+    """O(n^2) accelerations of `targets` (default all bodies), summed over every body in chunks of targets."""
+    targets = np.arange(len(positions)) if targets is None else targets
+    acceleration = np.empty((len(targets), positions.shape[1]))
+
+    for first in range(0, len(targets), chunk):
+        chunk_targets = targets[first:first + chunk]
+        delta = positions[None, :, :] - positions[chunk_targets, None, :]
+        r2 = np.einsum("tsd,tsd->ts", delta, delta) + softening**2
+        acceleration[first:first + chunk] = G * np.einsum("tsd,ts->td", delta, masses * inverse_cubes(r2))
+
+    return acceleration
+
+
+def direct_potential_energy(positions, masses, softening=1e-2, G=1.0, chunk=256):
+    """Softened potential energy of every pair, summed directly in chunks of rows."""
+    energy = 0.0
+    for first in range(0, len(positions), chunk):
+        delta = positions[None, :, :] - positions[first:first + chunk, None, :]
+        r2 = np.einsum("tsd,tsd->ts", delta, delta)
+        inverse = 1 / np.sqrt(r2 + softening**2)
+        # Each pair once: only sources past the row's own body
+        inverse[np.arange(r2.shape[1])[None, :] <= np.arange(first, first + r2.shape[0])[:, None]] = 0
+        energy -= G * float(masses[first:first + chunk] @ inverse @ masses)
+
+    return energy
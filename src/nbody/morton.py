@@ -0,0 +1,59 @@
+"""Morton (Z-order) codes of 2-D and 3-D positions.
+
+Interleaving the bits of the quantized coordinates puts every quadtree / octree cell
+in one contiguous run of the sorted codes, and each cell's children in consecutive
+sub-runs, so a tree can be read off sorted codes without any per-node objects.
+"""
+import numpy as np
+
+# Bits per axis: 3 x 21 and 2 x 31 both fit a uint64
+BITS = {2: 31, 3: 21}
+
+
+def spread_bits_2d(v):
+    """Insert one zero bit between each of the low 32 bits of v."""
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def spread_bits_3d(v):
+    """Insert two zero bits between each of the low 21 bits of v."""
+    v = v.astype(np.uint64) & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def bounding_cube(positions):
+    """(origin, side) of the smallest axis-aligned cube holding every position, padded slightly."""
+    lower = positions.min(axis=0)
+    upper = positions.max(axis=0)
+
+    side = float((upper - lower).max()) * (1 + 1e-9) or 1.0
+    return lower, side
+
+
+def morton_codes(positions, origin, side):
+    """uint64 codes of (n, 2) or (n, 3) positions inside the cube at `origin` with edge `side`."""
+    dim = positions.shape[1]
+    bits = BITS[dim]
+
+    cells = ((positions - origin) * ((1 << bits) / side)).astype(np.int64)
+    np.clip(cells, 0, (1 << bits) - 1, out=cells)
+
+    spread = spread_bits_2d if dim == 2 else spread_bits_3d
+
+    # x is the lowest bit of each group, matching [x, y(, z)] positions
+    codes = spread(cells[:, 0])
+    for axis in range(1, dim):
+        codes |= spread(cells[:, axis]) << np.uint64(axis)
+
+    return codes
@@ -0,0 +1,181 @@
+"""Leapfrog integration of self-gravitating bodies on the Barnes-Hut tree, and initial conditions.
+
+Units have G = 1 and a total mass of 1. Bodies are re-sorted along the Z-order curve
+before every force pass: after one step they are nearly sorted already, so the sort
+is cheap, and the tree is rebuilt from scratch each time rather than updated.
+"""
+import numpy as np
+
+from nbody.gravity import WORKERS, direct_potential_energy, tree_accelerations
+from nbody.tree import LEAF_SIZE, Tree, morton_order
+
+
+class NBodySimulation:
+    """Bodies in Morton order, stepped with kick-drift-kick leapfrog.
+
+    `ids` holds each body's index in the initial arrays (see in_initial_order);
+    `theta` is the Barnes-Hut opening angle, 0 for exact direct summation.
+    """
+
+    def __init__(self, positions, velocities, masses, theta=0.5, softening=1e-2, G=1.0, leaf_size=LEAF_SIZE, workers=WORKERS):
+        self.positions = np.array(positions, dtype=float)
+        self.velocities = np.array(velocities, dtype=float)
+        self.masses = np.array(masses, dtype=float)
+        self.ids = np.arange(len(self.positions))
+
+        self.theta = theta
+        self.softening = softening
+        self.G = G
+        self.leaf_size = leaf_size
+        self.workers = workers
+
+        self.time = 0.0
+        self.acceleration = self.accelerations()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def sort(self):
+        """Reorder every body array along the Z-order curve; returns the sorted codes and cube edge."""
+        order, codes, _, side = morton_order(self.positions)
+
+        self.positions = self.positions[order]
+        self.velocities = self.velocities[order]
+        self.masses = self.masses[order]
+        self.ids = self.ids[order]
+
+        return codes, side
+
+    def accelerations(self):
+        codes, side = self.sort()
+        tree = Tree(codes, self.positions, self.masses, side, self.leaf_size)
+
+        return tree_accelerations(tree, self.positions, self.masses, self.theta, self.softening, self.G, workers=self.workers)
+
+    def step(self, dt):
+        """Advance by dt: second order, and symplectic, so energy errors stay bounded."""
+        self.velocities += 0.5 * dt * self.acceleration
+        self.positions += dt * self.velocities
+
+        # Sorts the bodies, so the half kick below uses the new order throughout
+        self.acceleration = self.accelerations()
+        self.velocities += 0.5 * dt * self.acceleration
+
+        self.time += dt
+
+    def in_initial_order(self, array):
+        """Per-body `array` (in the current order) rearranged to the order the bodies were given in."""
+        result = np.empty_like(array)
+        result[self.ids] = array
+        return result
+
+    def energy(self):
+        """Kinetic plus (softened) potential energy; the potential is an O(n^2) sum."""
+        kinetic = 0.5 * float(np.einsum("i,ij,ij->", self.masses, self.velocities, self.velocities))
+        return kinetic + direct_potential_energy(self.positions, self.masses, self.softening, self.G)
+
+
+def centred(positions, velocities, masses):
+    """Bodies moved to their centre-of-mass frame."""
+    total = masses.sum()
+    positions = positions - masses @ positions / total
+    velocities = velocities - masses @ velocities / total
+    return positions, velocities, masses
+
+
+def plummer(n, rng):
+    """3-D Plummer sphere in equilibrium (Aarseth, Henon & Wielen 1974), scaled to unit virial radius."""
+    scale = 3 * np.pi / 16
+
+    # Radii from the inverse cumulative mass, cut off beyond 10 scale lengths
+    fraction = rng.uniform(0, 0.999, n)
+    radius = scale / np.sqrt(fraction**(-2 / 3) - 1)
+
+    # Speeds as fractions q of the local escape speed, by rejection from q^2 (1 - q^2)^(7/2)
+    q = np.empty(n)
+    missing = np.arange(n)
+    while len(missing):
+        candidate = rng.uniform(0, 1, len(missing))
+        accepted = rng.uniform(0, 0.1, len(missing)) < candidate**2 * (1 - candidate**2)**3.5
+        q[missing[accepted]] = candidate[accepted]
+        missing = missing[~accepted]
+    speed = q * np.sqrt(2 / scale) * (1 + (radius / scale)**2)**(-0.25)
+
+    def directions():
+        v = rng.normal(size=(n, 3))
+        return v / np.linalg.norm(v, axis=1)[:, None]
+
+    return centred(radius[:, None] * directions(), speed[:, None] * directions(), np.full(n, 1.0 / n))
+
+
+def disc(n, rng, central_mass=0.5, inner=0.1, outer=1.0, dispersion=0.05):
+    """2-D disc of n - 1 bodies on near-circular orbits around one central body.
+
+    The disc's own mass is 1 - central_mass, spread evenly over its area; it is cold
+    enough to be unstable, so it soon breaks into spiral arms and clumps.
+    """
+    count = n - 1
+    disc_mass = 1.0 - central_mass
+
+    radius = np.sqrt(rng.uniform(inner**2, outer**2, count))
+    angle = rng.uniform(0, 2 * np.pi, count)
+
+    # Circular speed from the mass inside each radius, as if it were spherical
+    enclosed = central_mass + disc_mass * (radius**2 - inner**2) / (outer**2 - inner**2)
+    speed = np.sqrt(enclosed / radius) * (1 + dispersion * rng.normal(size=count))
+
+    direction = np.stack((np.cos(angle), np.sin(angle)), axis=1)
+    positions = np.vstack(([[0.0, 0.0]], radius[:, None] * direction))
+    velocities = np.vstack(([[0.0, 0.0]], speed[:, None] * direction @ [[0.0, 1.0], [-1.0, 0.0]]))
+    masses = np.concatenate(([central_mass], np.full(count, disc_mass / count)))
+
+    return centred(positions, velocities, masses)
+
+
+def collision(n, rng, offset=(1.5, 0.4), speed=0.3):
+    """Two half-mass 2-D discs passing close enough to merge."""
+    halves = []
+    for sign, count in ((1, n // 2), (-1, n - n // 2)):
+        positions, velocities, masses = disc(count, rng)
+        # Half the mass in a disc of half the size keeps its orbital speeds
+        halves.append((0.5 * positions + np.multiply(sign, offset), velocities + [-sign * speed, 0.0], 0.5 * masses))
+
+    return centred(*(np.concatenate(arrays) for arrays in zip(*halves)))
+
+
+# Initial conditions: (n, rng) -> (positions, velocities, masses), 2-D or 3-D
+MODELS = {
+    "disc": disc,
+    "collision": collision,
+    "plummer": plummer,
+}
+
+
+def initial_conditions(model, n, seed=0):
+    return MODELS[model](n, np.random.default_rng(seed))
+
+
+if __name__=="__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Step an N-body model and report the time per step and the energy drift.")
+    parser.add_argument("--model", choices=MODELS, default="disc")
+    parser.add_argument("--bodies", type=int, default=10000)
+    parser.add_argument("--theta", type=float, default=0.5)
+    parser.add_argument("--dt", type=float, default=1e-3)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--energy", action="store_true", help="also report the energy drift (an O(n^2) sum)")
+    args = parser.parse_args()
+
+    simulation = NBodySimulation(*initial_conditions(args.model, args.bodies), theta=args.theta)
+    initial_energy = simulation.energy() if args.energy else None
+
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        simulation.step(args.dt)
+    elapsed = time.perf_counter() - start
+    print(f"{args.bodies} bodies: {1000 * elapsed / args.steps:.1f} ms per step")
+
+    if args.energy:
+        print(f"relative energy drift: {abs(simulation.energy() / initial_energy - 1):.2e}")
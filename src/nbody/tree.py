@@ -0,0 +1,190 @@
+"""Barnes-Hut quadtrees (2-D) and octrees (3-D) stored as flat node arrays.
+
+Bodies are sorted by Morton code, so every node is a contiguous range [start, end)
+of the sorted bodies and the children of a node are consecutive nodes of the next
+level. The tree is built one level at a time from the code prefixes of the bodies in
+nodes still holding more than `leaf_size` bodies: each level is a handful of array
+operations over at most n bodies, and there are O(log n) levels for any reasonable
+distribution. Masses and centres of mass come from prefix sums over the sorted
+bodies rather than from a bottom-up pass.
+
+Interaction lists are built for batches of leaves at once: (leaf, node) pairs start
+at the root and are opened level by level until a node either passes the opening
+criterion against the whole leaf, which adds it to the leaf's far list, or is a leaf
+itself, which adds it to the near list. A node whose bodies come within the leaf's
+bounding sphere is always opened, whatever theta: its expansion about the leaf would
+not converge, and for an ancestor of the leaf it would count the leaf's own bodies.
+"""
+import numpy as np
+
+from nbody.morton import BITS, bounding_cube, morton_codes
+
+# Most bodies a leaf holds before it is split (unless it is at the deepest level)
+LEAF_SIZE = 8
+
+
+def ranges(starts, ends):
+    """Concatenated arange(start, end) of each range."""
+    counts = ends - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+
+def morton_order(positions):
+    """Order sorting bodies along the Z-order curve of their bounding cube, and the cube."""
+    origin, side = bounding_cube(positions)
+    codes = morton_codes(positions, origin, side)
+
+    # Stable sorts are fast on the nearly sorted codes of consecutive time steps
+    order = np.argsort(codes, kind="stable")
+    return order, codes[order], origin, side
+
+
+class Tree:
+    """Flat Barnes-Hut tree over bodies already in Morton order (see morton_order).
+
+    Node arrays: `start` / `end` (body range), `level`, `size` (cell edge), `mass`,
+    `com` (centre of mass), `lower` / `upper` (bounding box of its bodies), `reach`
+    (farthest corner of that box from `com`), `leaf`, and `child_start` / `child_end`
+    (node range of its children, empty for leaves). Node 0 is the root. `leaves` lists
+    the leaf nodes in body order, so they partition the bodies; `leaf_com` and
+    `leaf_radius` bound each leaf's bodies by a sphere for the group opening criterion.
+    """
+
+    def __init__(self, codes, positions, masses, side, leaf_size=LEAF_SIZE):
+        n, dim = positions.shape
+        bits = BITS[dim]
+
+        starts, ends, levels, children = [], [], [], []
+        start = np.array([0])
+        end = np.array([n])
+        level = 0
+        count = 1
+        while True:
+            split = (end - start > leaf_size) & (level < bits)
+            starts.append(start)
+            ends.append(end)
+            levels.append(np.full(len(start), level))
+
+            child_start = np.zeros(len(start), dtype=np.int64)
+            child_end = np.zeros(len(start), dtype=np.int64)
+            children.append((child_start, child_end))
+            if not split.any():
+                break
+
+            # Bodies of the nodes being split, cut wherever their next-level prefix changes
+            bodies = ranges(start[split], end[split])
+            prefix = codes[bodies] >> np.uint64(dim * (bits - level - 1))
+            cuts = np.flatnonzero(prefix[1:] != prefix[:-1]) + 1
+
+            first = np.concatenate(([0], cuts))
+            last = np.concatenate((cuts, [len(bodies)])) - 1
+            next_start = bodies[first]
+            next_end = bodies[last] + 1
+
+            # Children of one parent are consecutive, in the parents' order
+            parent = np.searchsorted(start[split], next_start, side="right") - 1
+            bounds = np.searchsorted(parent, np.arange(split.sum() + 1))
+            child_start[split] = count + bounds[:-1]
+            child_end[split] = count + bounds[1:]
+
+            start, end = next_start, next_end
+            level += 1
+            count += len(start)
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.level = np.concatenate(levels)
+        self.child_start = np.concatenate([c[0] for c in children])
+        self.child_end = np.concatenate([c[1] for c in children])
+        self.leaf = self.child_end == self.child_start
+
+        self.size = side / 2.0**self.level
+
+        mass_sums = np.concatenate(([0.0], np.cumsum(masses)))
+        moment_sums = np.concatenate((np.zeros((1, dim)), np.cumsum(masses[:, None] * positions, axis=0)))
+        self.mass = mass_sums[self.end] - mass_sums[self.start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.com = (moment_sums[self.end] - moment_sums[self.start]) / self.mass[:, None]
+        # Massless cells fall back to the mean position of their bodies
+        empty = ~(self.mass > 0)
+        if empty.any():
+            position_sums = np.concatenate((np.zeros((1, dim)), np.cumsum(positions, axis=0)))
+            self.com[empty] = (position_sums[self.end[empty]] - position_sums[self.start[empty]]) / (self.end[empty] - self.start[empty])[:, None]
+
+        # A level's nodes are disjoint, increasing body ranges, so reducing over the sorted
+        # bounds [start, end, start, end, ...] boxes all of them at once (the end-to-start
+        # gaps land in the odd slots); the extra row keeps an end of n a valid index
+        padded = np.vstack((positions, positions[-1:]))
+        self.lower = np.empty((len(self.start), dim))
+        self.upper = np.empty((len(self.start), dim))
+        offsets = np.cumsum([0] + [len(s) for s in starts])
+        for a, b in zip(offsets[:-1], offsets[1:]):
+            bounds = np.stack((self.start[a:b], self.end[a:b]), axis=1).ravel()
+            self.lower[a:b] = np.minimum.reduceat(padded, bounds)[::2]
+            self.upper[a:b] = np.maximum.reduceat(padded, bounds)[::2]
+
+        # Farthest corner of each box from the centre of mass
+        self.reach = np.sqrt((np.maximum(self.com - self.lower, self.upper - self.com)**2).sum(axis=1))
+
+        self.leaves = np.flatnonzero(self.leaf)
+        self.leaves = self.leaves[np.argsort(self.start[self.leaves], kind="stable")]
+
+        leaf_starts = self.start[self.leaves]
+        self.leaf_com = self.com[self.leaves]
+        owner = np.repeat(np.arange(len(self.leaves)), self.end[self.leaves] - leaf_starts)
+        delta = positions - self.leaf_com[owner]
+        distance = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+        self.leaf_radius = np.maximum.reduceat(distance, leaf_starts)
+
+    def __len__(self):
+        return len(self.start)
+
+    def interactions(self, first, last, theta):
+        """Far (leaf, node) and near (leaf, leaf node) pairs of leaves first..last-1 (indices into `leaves`).
+
+        A node is far from a leaf when its edge and reach, and the leaf's radius, are all
+        below `theta` times its distance from the nearest point of the leaf's bounding
+        sphere; the reach bounds the node's bodies however off-centre its centre of mass,
+        and the radius keeps the leaf-centred expansion of the far field accurate. Above
+        theta = 1 the box of the node's bodies must also clear that sphere. theta = 0
+        makes every pair near, i.e. direct summation.
+        """
+        targets = np.arange(first, last)
+        nodes = np.zeros(len(targets), dtype=np.int64)
+
+        far_targets, far_nodes, near_targets, near_nodes = [], [], [], []
+        while len(targets):
+            delta = self.com[nodes] - self.leaf_com[targets]
+            distance = np.sqrt(np.einsum("ij,ij->i", delta, delta)) - self.leaf_radius[targets]
+            reach = self.reach[nodes]
+            accept = np.maximum(np.maximum(self.size[nodes], reach), self.leaf_radius[targets]) < theta * distance
+
+            # Bodies within `reach` of the centre of mass are clear of the leaf's sphere, as they always
+            # are for theta <= 1; otherwise the nearest point of their box to the leaf's centre decides
+            check = np.flatnonzero(accept & (reach >= distance))
+            if len(check):
+                centre = self.leaf_com[targets[check]]
+                gap = np.clip(centre, self.lower[nodes[check]], self.upper[nodes[check]]) - centre
+                accept[check] = np.einsum("ij,ij->i", gap, gap) > self.leaf_radius[targets[check]]**2
+
+            far_targets.append(targets[accept])
+            far_nodes.append(nodes[accept])
+
+            rejected = ~accept
+            at_leaf = rejected & self.leaf[nodes]
+            near_targets.append(targets[at_leaf])
+            near_nodes.append(nodes[at_leaf])
+
+            opened = rejected & ~self.leaf[nodes]
+            opened_nodes = nodes[opened]
+            counts = self.child_end[opened_nodes] - self.child_start[opened_nodes]
+            targets = np.repeat(targets[opened], counts)
+            nodes = ranges(self.child_start[opened_nodes], self.child_end[opened_nodes])
+
+        return (np.concatenate(far_targets), np.concatenate(far_nodes),
+                np.concatenate(near_targets), np.concatenate(near_nodes))
@@ -0,0 +1,102 @@
+import time
+
+from backend import xp
+from schrodinger.schrodinger_equation import SchrodingerEquation, four_well_potential, BOHR_RADIUS, ELECTRON_MASS, H_BAR, HARTREE, ORDERS
+from schrodinger.solver import lanczos, lowest_states
+
+# Grid sizes tried per side in the convergence study
+CONVERGENCE_GRIDS = (16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512)
+
+# (grid points per side, box width in Bohr radii)
+STANDARD_GRIDS = {
+    "128^2": (128, 60),
+    "256^2": (256, 60),
+    "512^2": (512, 60),
+}
+
+
+def four_wells(n, width, BC='periodic'):
+    X = width * BOHR_RADIUS
+    V = four_well_potential(n, n, 0, X, X, X)
+
+    return SchrodingerEquation(n, n, 0, V, ELECTRON_MASS, X, X, X, BC=BC)
+
+
+def time_solver(se, k, method, **kwargs):
+    start = time.perf_counter()
+    if method == 'current':
+        # The original driver: Lanczos for as many states as grid points per side
+        eigenvalues, _ = lanczos(se, se.N)
+        eigenvalues = eigenvalues[:k]
+    else:
+        eigenvalues, _ = lowest_states(se, k, method=method, **kwargs)
+
+    return time.perf_counter() - start, eigenvalues
+
+
+def compare_solvers(k=20, grids=STANDARD_GRIDS, include_current=("128^2",)):
+    print(f"{'grid':<8}{'method':<24}{'time':>10}{'max rel. error':>16}")
+
+    for name, (n, width) in grids.items():
+        se = four_wells(n, width)
+
+        t_ref, reference = time_solver(se, k, 'lanczos')
+        scale = float(xp.abs(reference).max())
+
+        runs = [("eigsh k=20 (SA)", t_ref, reference)]
+        if name in include_current:
+            runs.append((f"eigsh k={n} (SA)", *time_solver(se, k, 'current')))
+        runs.append(("lobpcg, cold start", *time_solver(se, k, 'lobpcg', warm_start=False)))
+        runs.append(("lobpcg, warm start", *time_solver(se, k, 'lobpcg')))
+
+        window = (float(reference[0]) - 0.01 * scale, float(reference[-1]) + 0.01 * scale)
+        runs.append(("shift-invert window", *time_solver(se, k, 'shift_invert', window=window)))
+
+        for label, elapsed, eigenvalues in runs:
+            n_found = min(len(eigenvalues), k)
+            error = float(xp.abs(eigenvalues[:n_found] - reference[:n_found]).max()) / scale
+            print(f"{name:<8}{label:<24}{elapsed:>9.2f}s{error:>16.2e}")
+
+
+def harmonic_oscillator(n, width=30, omega=0.25, BC='periodic', order=2):
+    """2-D isotropic oscillator with hbar omega = `omega` Hartree; its exact levels are hbar omega (n_x + n_y + 1)."""
+    X = width * BOHR_RADIUS
+    # Centred samples at the solver's spacing X / n, so discretization is the only error
+    x = (xp.arange(n) - (n - 1) / 2) * (X / n)
+
+    w = omega * HARTREE / H_BAR
+    V = 0.5 * ELECTRON_MASS * w**2 * (x[None, :]**2 + x[:, None]**2)
+
+    return SchrodingerEquation(n, n, 0, V, ELECTRON_MASS, X, X, X, BC=BC, order=order)
+
+
+def oscillator_levels(k, omega=0.25):
+    levels = sorted(nx + ny + 1 for nx in range(k) for ny in range(k))[:k]
+    return xp.asarray(levels, dtype=float) * omega * HARTREE
+
+
+def convergence(k=10, target=1e-6, grids=CONVERGENCE_GRIDS, orders=ORDERS, BC='periodic'):
+    """Smallest grid per stencil whose k lowest oscillator levels are within `target` (relative) of exact."""
+    exact = oscillator_levels(k)
+
+    print(f"{'order':<10}" + "".join(f"{n:>10}" for n in grids) + f"{'needed':>10}")
+
+    for order in orders:
+        errors = []
+        needed = None
+        for n in grids:
+            se = harmonic_oscillator(n, BC=BC, order=order)
+
+            # The oscillator is separable, so this is the exact 1-D fast path on each discretization
+            eigenvalues, _ = lowest_states(se, k, vectors=False)
+            errors.append(float(xp.abs(eigenvalues - exact).max() / exact.max()))
+
+            if needed is None and errors[-1] <= target:
+                needed = n
+
+        print(f"{str(order):<10}" + "".join(f"{e:>10.1e}" for e in errors) + f"{needed or '-':>10}")
+
+
+if __name__=="__main__":
+    compare_solvers()
+    convergence()
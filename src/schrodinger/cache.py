@@ -0,0 +1,170 @@
+from hashlib import sha1
+from threading import Lock
+import os
+import shutil
+
+import numpy as np
+
+from backend import xp, to_host
+from schrodinger.solver import grid_shape, lowest_states
+
+CACHE_DIR = os.environ.get("SCHRODINGER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "physics-demos", "schrodinger"))
+CACHE_MAX_BYTES = int(os.environ.get("SCHRODINGER_CACHE_MAX_BYTES", 4 * 1024**3))
+
+
+class CachedStates:
+    """Eigenpairs of one cached problem; eigenvectors stay memory-mapped until a state is read."""
+
+    def __init__(self, key, eigenvalues, eigenvectors):
+        self.key = key
+        self.eigenvalues = eigenvalues
+        self.eigenvectors = eigenvectors
+
+    def __len__(self):
+        return len(self.eigenvalues)
+
+    def state(self, index):
+        """The index-th eigenvector shaped like the grid, read from disk on first touch."""
+        return self.eigenvectors[index]
+
+    def density(self, index):
+        state = np.asarray(self.state(index))
+        return state.real**2 + state.imag**2 if np.iscomplexobj(state) else state**2
+
+    def to_device(self, k=None):
+        """Eigenvalues and eigenvectors (columns) of the first k states in lowest_states's layout."""
+        k = len(self) if k is None else k
+        return xp.asarray(self.eigenvalues[:k]), xp.asarray(self.eigenvectors[:k].reshape(k, -1).T)
+
+
+class EigenstateCache:
+    """Disk cache of eigenpairs keyed by a hash of the potential and the problem's parameters.
+
+    Each entry is a directory holding eigenvalues.npy and eigenvectors.npy, the latter
+    stored one state per row (k, *grid) so a single state can be memory-mapped without
+    reading the rest. A request for more states than an entry holds solves again and
+    replaces it. Windowed solves (see lowest_states) are not the lowest states, so they
+    get entries of their own, keyed by the window and k. The least recently used entries are evicted once the directory grows
+    past `max_bytes`.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.lock = Lock()
+        # One [lock, users] per key, so concurrent requests for the same problem solve it once
+        self.key_locks = {}
+
+    def key(self, se, window=None, k=None):
+        """Hash of the problem; `window` (with the k solved for) selects a windowed solve's entry instead of the lowest states."""
+        V = np.ascontiguousarray(to_host(se.V))
+
+        extents = (se.dx * se.M, se.dy * se.N, se.dz * se.L if se.L != 0 else 0.0)
+        fields = (grid_shape(se), tuple(float(e) for e in extents), float(se.m), float(se.H_BAR), str(se.BC), str(se.order), str(V.dtype))
+        if window is not None:
+            fields += (("window", float(window[0]), float(window[1]), int(k)),)
+
+        digest = sha1(repr(fields).encode("utf-8"))
+        digest.update(V.tobytes())
+
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key, k=None):
+        """Cached states for `key`, or None if missing or holding fewer than k states."""
+        path = self.path(key)
+
+        try:
+            eigenvalues = np.load(os.path.join(path, "eigenvalues.npy"))
+            eigenvectors = np.load(os.path.join(path, "eigenvectors.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        if k is not None and len(eigenvalues) < k:
+            return None
+
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+
+        return CachedStates(key, eigenvalues, eigenvectors)
+
+    def store(self, se, eigenvalues, eigenvectors, key=None):
+        key = self.key(se) if key is None else key
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+
+        eigenvalues = to_host(eigenvalues)
+        eigenvectors = np.ascontiguousarray(to_host(eigenvectors).T).reshape((-1,) + grid_shape(se))
+
+        os.makedirs(temp_path, exist_ok=True)
+        np.save(os.path.join(temp_path, "eigenvalues.npy"), eigenvalues)
+        np.save(os.path.join(temp_path, "eigenvectors.npy"), eigenvectors)
+
+        # Directories can't be renamed over a non-empty one, so the old entry is moved aside first
+        with self.lock:
+            if os.path.isdir(path):
+                os.replace(path, f"{path}.{os.getpid()}.old")
+                shutil.rmtree(f"{path}.{os.getpid()}.old", ignore_errors=True)
+            os.replace(temp_path, path)
+
+        self.evict()
+
+        # An entry larger than the whole cache is evicted straight away but still returned
+        states = self.load(key)
+        return CachedStates(key, eigenvalues, eigenvectors) if states is None else states
+
+    def solve(self, se, k=20, window=None, **kwargs):
+        """The k lowest states of `se` (or a window's, see lowest_states), solved only if no cached entry has them.
+
+        Separable problems take lowest_states's separable path, with every eigenvector
+        formed so the entry can be written.
+        """
+        key = self.key(se, window, k)
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, [Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                # A window may hold fewer than k states, so its entry is whatever the solve found
+                states = self.load(key, k if window is None else None)
+                if states is None:
+                    eigenvalues, eigenvectors = lowest_states(se, k, window=window, **kwargs)
+                    states = self.store(se, eigenvalues, eigenvectors, key)
+        finally:
+            # Dropped with its last user: while anyone still waits on it, new requests queue behind the same lock
+            with self.lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self.key_locks[key]
+
+        return states
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".tmp") or name.endswith(".old") or not os.path.isdir(path):
+                    continue
+
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(path))
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                entries.append((mtime, size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                total -= size
@@ -0,0 +1,180 @@
+"""Streaming post-processing of eigenstates: densities, memmapped stacks, GIFs and PNG sequences.
+
+Every stage is a generator over states, so only one grid's density is alive at a
+time however many states there are. Columns of an eigenvector matrix are reshaped as
+views (ind / ind_2d is C order on [z, y, x]), and the lazy state containers
+(CachedStates, SymmetricStates, SeparableStates) are read one state at a time. PIL's
+animated GIF writer keeps every frame until it closes the file, so GIFs are written
+frame by frame with its header and frame encoders instead.
+
+    python -m schrodinger.export --grid 256 --box 60 --states 20 --gif four_well_states.gif
+"""
+import argparse
+
+import numpy as np
+from matplotlib import colormaps
+from PIL import Image, GifImagePlugin
+
+from backend import to_host
+from schrodinger.solver import grid_shape
+
+COLORMAP = "inferno"
+
+
+def colormap_palette(name=COLORMAP):
+    """(256, 3) uint8 lookup table of a matplotlib colormap."""
+    return (colormaps[name](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+
+def iter_states(states, shape=None):
+    """Grid-shaped states one at a time, from a state container or an (n, k) eigenvector matrix."""
+    if hasattr(states, "state"):
+        for i in range(len(states)):
+            yield states.state(i)
+        return
+
+    for i in range(states.shape[1]):
+        # A strided column reshapes without a copy
+        yield states[:, i].reshape(shape)
+
+
+def densities(states, shape=None):
+    """|psi|^2 of each state on the host."""
+    for state in iter_states(states, shape):
+        state = to_host(state)
+        yield state.real**2 + state.imag**2 if np.iscomplexobj(state) else state**2
+
+
+def density_indices(density):
+    """uint8 image of a density scaled to its own peak, y upwards; 3-D densities are projected along z."""
+    if density.ndim == 3:
+        density = density.sum(axis=0)
+
+    peak = float(density.max())
+    scaled = density[::-1] * (255 / peak if peak > 0 else 0)
+
+    return scaled.astype(np.uint8)
+
+
+def density_image(density, palette=None):
+    """(H, W, 3) uint8 colormapped image of a density."""
+    palette = colormap_palette() if palette is None else palette
+    return palette[density_indices(density)]
+
+
+class StackWriter:
+    """Densities written into a memory-mapped (count, *shape) float32 .npy file."""
+
+    def __init__(self, path, count, shape, dtype=np.float32):
+        self.path = path
+        self.stack = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(count,) + tuple(shape))
+        self.index = 0
+
+    def write(self, density):
+        self.stack[self.index] = density
+        self.index += 1
+
+    def close(self):
+        self.stack.flush()
+
+
+class GifWriter:
+    """Animated GIF written one frame at a time, `duration` milliseconds per frame."""
+
+    def __init__(self, path, duration=500, loop=0, colormap=COLORMAP):
+        self.path = path
+        self.duration = duration
+        self.loop = loop
+        self.palette = colormap_palette(colormap).ravel().tobytes()
+
+        self.file = open(path, "wb")
+        self.header_written = False
+
+    def write(self, density):
+        frame = Image.fromarray(density_indices(density), mode="P")
+        frame.putpalette(self.palette)
+
+        if not self.header_written:
+            header, _ = GifImagePlugin.getheader(frame, self.palette, {"loop": self.loop, "duration": self.duration})
+            self.file.write(b"".join(header))
+            self.header_written = True
+
+        for chunk in GifImagePlugin.getdata(frame, duration=self.duration):
+            self.file.write(chunk)
+
+    def close(self):
+        # GIF trailer
+        self.file.write(b";")
+        self.file.close()
+
+
+class PngWriter:
+    """One PNG per density; `pattern` is formatted with the state number, e.g. "state_{:03d}.png"."""
+
+    def __init__(self, pattern, colormap=COLORMAP):
+        self.pattern = pattern
+        self.palette = colormap_palette(colormap)
+        self.paths = []
+
+    def write(self, density):
+        path = self.pattern.format(len(self.paths))
+        Image.fromarray(density_image(density, self.palette)).save(path)
+        self.paths.append(path)
+
+    def close(self):
+        pass
+
+
+def write_densities(densities, writers):
+    """Feed each density to every writer in turn, then close them all."""
+    try:
+        for density in densities:
+            for writer in writers:
+                writer.write(density)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+def export_states(se, states, gif=None, pngs=None, stack=None, duration=500):
+    """Stream the states of `se` to any of a GIF, a PNG sequence and a .npy stack in one pass."""
+    shape = grid_shape(se)
+    count = len(states) if hasattr(states, "state") else states.shape[1]
+
+    writers = []
+    if gif is not None:
+        writers.append(GifWriter(gif, duration))
+    if pngs is not None:
+        writers.append(PngWriter(pngs))
+    if stack is not None:
+        writers.append(StackWriter(stack, count, shape))
+
+    write_densities(densities(states, shape), writers)
+
+    return writers
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the four-well problem and export its eigenstate densities.")
+    parser.add_argument("--grid", type=int, default=256, help="grid points per side")
+    parser.add_argument("--box", type=float, default=60.0, help="box width in Bohr radii")
+    parser.add_argument("--BC", choices=("periodic", "dirichlet"), default="periodic")
+    parser.add_argument("--states", type=int, default=20)
+    parser.add_argument("--duration", type=int, default=500, help="milliseconds per GIF frame")
+    parser.add_argument("--gif")
+    parser.add_argument("--pngs", help='filename pattern such as "state_{:03d}.png"')
+    parser.add_argument("--stack", help=".npy file for the memory-mapped density stack")
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    from schrodinger.benchmark import four_wells
+    from schrodinger.cache import EigenstateCache
+
+    args = parse_args()
+
+    se = four_wells(args.grid, args.box, args.BC)
+    states = EigenstateCache().solve(se, k=args.states, symmetries='auto')
+
+    export_states(se, states, args.gif, args.pngs, args.stack, args.duration)
@@ -0,0 +1,167 @@
+"""Isosurfaces of 3-D probability densities, extracted in chunks on a process pool.
+
+The grid is cut into blocks of `chunk` samples per side, overlapping by one sample
+so that neighbouring blocks produce the same vertices along their shared faces.
+Workers read their block straight from a .npy file (a density stack, or the
+eigenvector file of an EigenstateCache entry, squared on the fly), so neither the
+parent nor any worker holds more than a block of the grid; blocks the level doesn't
+cross are skipped. The pieces are stitched into one trimesh mesh whose seam vertices
+are merged, then quadric-decimated into levels of detail and exported as GLB.
+
+    python -m schrodinger.isosurface four_well_states.npy --index 0 --output state0.glb
+"""
+import argparse
+from itertools import product
+from multiprocessing import Pool
+import os
+
+import numpy as np
+import trimesh
+from skimage.measure import marching_cubes
+
+# Samples per block side; a 64^3 float64 block is 2 MB
+CHUNK = 64
+
+# Fraction of the full mesh's faces kept at each level of detail
+LOD_FRACTIONS = (1.0, 0.25, 0.0625)
+
+
+def load_block(path, index, slices, square):
+    grid = np.load(path, mmap_mode="r")
+    if index is not None:
+        grid = grid[index]
+
+    block = np.asarray(grid[slices], dtype=np.float64 if not np.iscomplexobj(grid) else np.complex128)
+    if square:
+        block = block.real**2 + block.imag**2 if np.iscomplexobj(block) else block**2
+
+    return block
+
+
+def block_peak(task):
+    path, index, slices, square = task
+    return float(load_block(path, index, slices, square).max())
+
+
+def block_surface(task):
+    """Vertices ([x, y, z], physical units) and faces of one block's piece of the isosurface."""
+    path, index, slices, square, level, spacing, origin = task
+
+    block = load_block(path, index, slices, square)
+    if block.min() > level or block.max() < level or min(block.shape) < 2:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int32)
+
+    vertices, faces, _, _ = marching_cubes(block, level, spacing=spacing)
+
+    start = np.array([s.start for s in slices], dtype=float)
+    vertices += np.asarray(origin) + start * np.asarray(spacing)
+
+    # Arrays are [z, y, x]. Reversing the coordinates mirrors the mesh, which also turns
+    # marching cubes' triangles (facing up the gradient) outward around density peaks
+    return vertices[:, ::-1].astype(np.float32), faces.astype(np.int32)
+
+
+def blocks(shape, chunk=CHUNK):
+    """Slices of overlapping blocks covering a grid, each at most chunk + 1 samples per side."""
+    ranges = [[slice(start, min(start + chunk + 1, n)) for start in range(0, max(n - 1, 1), chunk)] for n in shape]
+    return list(product(*ranges))
+
+
+def grid_shape_of(path, index):
+    grid = np.load(path, mmap_mode="r")
+    return grid.shape[1:] if index is not None else grid.shape
+
+
+def isosurface(path, spacing, index=None, level=None, fraction=0.1, square=False, origin=None, chunk=CHUNK, processes=None):
+    """The isosurface of a 3-D density stored in a .npy file, as one trimesh mesh.
+
+    `index` picks one grid from a stack (k, L, N, M); `square` treats the stored grid as
+    an amplitude and contours |psi|^2. The level defaults to `fraction` of the peak.
+    `spacing` and `origin` are [z, y, x]; the origin defaults to centring the grid.
+    """
+    processes = processes or os.cpu_count() or 1
+    shape = grid_shape_of(path, index)
+    if len(shape) != 3:
+        raise ValueError("isosurfaces need a 3-D grid")
+
+    if origin is None:
+        origin = [-(n - 1) * d / 2 for n, d in zip(shape, spacing)]
+
+    grid_blocks = blocks(shape, chunk)
+
+    with Pool(processes) as pool:
+        if level is None:
+            peak = max(pool.imap_unordered(block_peak, [(path, index, slices, square) for slices in grid_blocks]))
+            level = fraction * peak
+
+        tasks = [(path, index, slices, square, level, tuple(spacing), tuple(origin)) for slices in grid_blocks]
+
+        pieces = []
+        offset = 0
+        for vertices, faces in pool.imap_unordered(block_surface, tasks):
+            if len(faces) == 0:
+                continue
+
+            pieces.append((vertices, faces + offset))
+            offset += len(vertices)
+
+    if not pieces:
+        return trimesh.Trimesh()
+
+    vertices = np.concatenate([vertices for vertices, _ in pieces])
+    faces = np.concatenate([faces for _, faces in pieces])
+
+    # Processing merges the duplicated vertices along block seams
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=True)
+
+
+def levels_of_detail(mesh, fractions=LOD_FRACTIONS):
+    """The mesh decimated to each fraction of its faces, finest first."""
+    lods = []
+    for fraction in fractions:
+        face_count = max(4, int(len(mesh.faces) * fraction))
+        lods.append(mesh if face_count >= len(mesh.faces) else mesh.simplify_quadric_decimation(face_count=face_count))
+
+    return lods
+
+
+def to_glb(mesh):
+    return mesh.export(file_type="glb")
+
+
+def export_lods(mesh, path, fractions=LOD_FRACTIONS):
+    """Write one GLB per level of detail; `path` is formatted with the level, e.g. "state_lod{}.glb"."""
+    paths = []
+    for lod, decimated in enumerate(levels_of_detail(mesh, fractions)):
+        paths.append(path.format(lod))
+        with open(paths[-1], "wb") as f:
+            f.write(to_glb(decimated))
+
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract an isosurface of a 3-D density stored in a .npy file.")
+    parser.add_argument("path", help=".npy density grid or (k, L, N, M) stack")
+    parser.add_argument("--index", type=int, help="grid of the stack to contour")
+    parser.add_argument("--spacing", type=float, nargs=3, default=(1.0, 1.0, 1.0), metavar=("DZ", "DY", "DX"))
+    parser.add_argument("--fraction", type=float, default=0.1, help="isovalue as a fraction of the peak")
+    parser.add_argument("--amplitude", action="store_true", help="the file holds psi rather than |psi|^2")
+    parser.add_argument("--chunk", type=int, default=CHUNK)
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--output", required=True, help='GLB path, with "{}" for the level of detail to write every level')
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    args = parse_args()
+
+    mesh = isosurface(args.path, args.spacing, args.index, fraction=args.fraction, square=args.amplitude,
+                      chunk=args.chunk, processes=args.processes)
+
+    if "{}" in args.output:
+        export_lods(mesh, args.output)
+    else:
+        with open(args.output, "wb") as f:
+            f.write(to_glb(mesh))
@@ -0,0 +1,45 @@
+"""Named potentials, each called like four_well_potential(M, N, L, X, Y, Z) and returning [y, x] or [z, y, x]."""
+from backend import xp
+from schrodinger.schrodinger_equation import four_well_potential, BOHR_RADIUS, ELECTRON_MASS, H_BAR, HARTREE
+
+
+def grid(M, N, L, X, Y, Z):
+    x = xp.linspace(-X / 2, X / 2, M)
+    y = xp.linspace(-Y / 2, Y / 2, N)
+    z = xp.linspace(-Z / 2, Z / 2, L) if L != 0 else xp.zeros(1)
+
+    return xp.meshgrid(z, y, x, indexing='ij')
+
+
+def harmonic_potential(M, N, L, X, Y, Z, omega=0.25):
+    """Isotropic oscillator with hbar omega = `omega` Hartree."""
+    z, y, x = grid(M, N, L, X, Y, Z)
+
+    w = omega * HARTREE / H_BAR
+    V = 0.5 * ELECTRON_MASS * w**2 * (x**2 + y**2 + z**2)
+
+    return V[0] if L == 0 else V
+
+
+def box_potential(M, N, L, X, Y, Z):
+    """Free particle; with Dirichlet boundaries, a particle in a box."""
+    return xp.zeros((N, M) if L == 0 else (L, N, M))
+
+
+def lattice_potential(M, N, L, X, Y, Z, period=5 * BOHR_RADIUS, depth=0.5):
+    """Cosine lattice `depth` Hartree deep with minima `period` apart."""
+    z, y, x = grid(M, N, L, X, Y, Z)
+
+    k = 2 * xp.pi / period
+    V = -depth * HARTREE / 2 * (xp.cos(k * x) + xp.cos(k * y) + (xp.cos(k * z) if L != 0 else 0))
+    V -= V.min()
+
+    return V[0] if L == 0 else V
+
+
+PRESETS = {
+    "four_wells": four_well_potential,
+    "harmonic": harmonic_potential,
+    "box": box_potential,
+    "lattice": lattice_potential,
+}
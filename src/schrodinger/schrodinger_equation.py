@@ -1,17 +1,291 @@
 import numpy as np
-import cupy as cp
-import matplotlib.pyplot as plt
 import trimesh
-import cupyx.scipy.sparse as sparse
-import cupyx.scipy.sparse.linalg as linalg
-from progress.bar import Bar
 from scipy.sparse import lil_matrix
 
+from backend import xp, sparse, linalg, fft, to_host
+
+
+# Central second-derivative weights at offsets 0, 1, 2, ... for each order of accuracy
+STENCILS = {
+    2: (-2.0, 1.0),
+    4: (-5 / 2, 4 / 3, -1 / 12),
+    6: (-49 / 18, 3 / 2, -3 / 20, 1 / 90),
+}
+ORDERS = (2, 4, 6, 'spectral')
+
+
+def second_derivative_symbol(n, d, periodic=False, order=2):
+    """Eigenvalues of the 1-D second derivative operator, in FFT (periodic) or DST-I (Dirichlet) order.
+
+    Dirichlet stencils reflect oddly about the walls one sample beyond each end, which
+    keeps every order diagonal in the DST-I basis.
+    """
+    if periodic:
+        theta = 2 * xp.pi * xp.arange(n) / n
+    else:
+        theta = xp.pi * xp.arange(1, n + 1) / (n + 1)
+
+    if order == 'spectral':
+        k = 2 * xp.pi * xp.fft.fftfreq(n, d) if periodic else theta / d
+        return -k**2
+
+    weights = STENCILS[order]
+    symbol = weights[0] + sum(2 * w * xp.cos(j * theta) for j, w in enumerate(weights[1:], 1))
+
+    return symbol / d**2
+
+
+def _laplacian_1d(n, d, periodic=False, order=2):
+    """Second-derivative matrix of n samples spaced d apart; periodic wraps the two ends together.
+
+    The spectral operator is dense, so it is only practical in matrix form for modest n.
+    """
+    if order == 'spectral':
+        symbol = second_derivative_symbol(n, d, periodic, order)[:, None]
+        identity = xp.eye(n)
+
+        if periodic:
+            dense = fft.ifft(symbol * fft.fft(identity, axis=0), axis=0).real
+        else:
+            dense = fft.idst(symbol * fft.dst(identity, type=1, axis=0), type=1, axis=0)
+
+        return sparse.csr_matrix(dense)
+
+    i = xp.arange(n)
+    rows, cols, data = [i], [i], [xp.full(n, STENCILS[order][0])]
+
+    for j, w in enumerate(STENCILS[order][1:], 1):
+        for col in (i - j, i + j):
+            weight = xp.full(n, w)
+            if periodic:
+                col = col % n
+            else:
+                # Past a wall the stencil reads the odd reflection of the grid; the wall itself is zero
+                weight = xp.where((col < -1) | (col > n), -w, w)
+                weight = xp.where((col == -1) | (col == n), 0.0, weight)
+                col = xp.where(col < -1, -2 - col, xp.where(col > n, 2 * n - col, col))
+
+            keep = weight != 0
+            rows.append(i[keep])
+            cols.append(col[keep])
+            data.append(weight[keep])
+
+    row = xp.concatenate(rows)
+    col = xp.concatenate(cols)
+    data = xp.concatenate(data)
+
+    # Duplicate entries (wrapped or reflected onto the same sample) are summed
+    return sparse.coo_matrix((data / d**2, (row, col)), shape=(n, n)).tocsr()
+
+
+H_BAR = 1.05457e-34
+ELECTRON_MASS = 9.10938e-31
+ELEMENTARY_CHARGE = 1.6021766e-19
+EPSILON_0 = 8.8541878e-12
+FINE_STRUCTURE = 1 / 137
+SPEED_OF_LIGHT = 2.998e8
+BOHR_RADIUS = H_BAR / (ELECTRON_MASS * SPEED_OF_LIGHT * FINE_STRUCTURE)
+# hbar^2 / m a_0^2
+HARTREE = H_BAR**2 / (ELECTRON_MASS * BOHR_RADIUS**2)
+
+
+class Stage:
+    """Steps of one named stage, reported to a progress hook as hook(name, done, total).
+
+    Reports are thinned to about one per percent, so per-entry loops can call next().
+    """
+
+    def __init__(self, hook, name, total):
+        self.hook = hook
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.every = max(1, total // 100)
+
+    def next(self):
+        self.done += 1
+        if self.hook is not None and self.done % self.every == 0:
+            self.hook(self.name, self.done, self.total)
+
+    def finish(self):
+        if self.hook is not None:
+            self.hook(self.name, self.total, self.total)
+
+
+def terminal_progress():
+    """A progress hook drawing one progress.bar.Bar per stage."""
+    from progress.bar import Bar
+
+    bars = {}
+
+    def report(name, done, total):
+        if name not in bars:
+            bars[name] = Bar(name, max=total)
+        bars[name].goto(done)
+        if done >= total:
+            bars[name].finish()
+
+    return report
+
+
+class StencilHamiltonian(linalg.LinearOperator):
+    """-hbar^2 / 2m Laplacian + V applied with shifted slices of the grid, never stored as a matrix.
+
+    `V` is the grid potential ([z, y, x] or [y, x]) and `spacings` the sample spacing
+    along each of its axes. Neighbours are subtracted unscaled straight into the
+    output and each axis's coupling is folded in with one multiply, so a product
+    allocates nothing beyond its result. Blocks of vectors (as used by lobpcg) are
+    applied in the same pass. Wider 4th/6th-order stencils (`order`) add each weighted
+    neighbour in turn, reflecting oddly past Dirichlet walls like `_laplacian_1d`.
+    """
+
+    def __init__(self, V, spacings, m, h_bar, BC='periodic', order=2):
+        self.grid_shape = V.shape
+        self.periodic = BC == 'periodic'
+        self.order = order
+
+        self.couplings = [h_bar**2 / (2 * m * d**2) for d in spacings]
+
+        if order != 2:
+            # -c w_j for each axis and offset j
+            self.neighbours = [[-c * w for w in STENCILS[order][1:]] for c in self.couplings]
+        else:
+            # out = c_0 (V' psi - n_0) -> c_1 (... - n_1) ...: the diagonal is stored in units of
+            # the first coupling and the running sum is rescaled between axes
+            self.rescale = [a / b for a, b in zip(self.couplings, self.couplings[1:] + [1.0])]
+
+        self.set_potential(V)
+
+        n = V.size
+        super().__init__(dtype=self.diagonal.dtype, shape=(n, n))
+
+    def set_potential(self, V):
+        """Replace V; only the stored diagonal changes, the kinetic couplings are kept."""
+        if self.order != 2:
+            self.diagonal = V - STENCILS[self.order][0] * sum(self.couplings)
+        else:
+            self.diagonal = (V + 2 * sum(self.couplings)) / self.couplings[0]
+
+    def apply(self, psi, out=None):
+        """H psi for psi shaped like the grid, optionally with a trailing block axis; `out` may be reused."""
+        diagonal = self.diagonal.reshape(self.diagonal.shape + (1,) * (psi.ndim - self.diagonal.ndim))
+
+        if out is None:
+            out = xp.empty(psi.shape, dtype=xp.result_type(psi, diagonal))
+        xp.multiply(psi, diagonal, out=out)
+
+        if self.order != 2:
+            return self.add_wide_neighbours(psi, out)
+
+        # (target, source) slices of each neighbour along an axis; periodic grids also couple the two ends
+        pairs = [(slice(1, None), slice(None, -1)), (slice(None, -1), slice(1, None))]
+        if self.periodic:
+            pairs += [(slice(0, 1), slice(-1, None)), (slice(-1, None), slice(0, 1))]
+
+        for axis, rescale in enumerate(self.rescale):
+            for target, source in pairs:
+                target = (slice(None),) * axis + (target,)
+                source = (slice(None),) * axis + (source,)
+
+                xp.subtract(out[target], psi[source], out=out[target])
+
+            if rescale != 1:
+                out *= rescale
+
+        return out
+
+    def add_wide_neighbours(self, psi, out):
+        for axis, weights in enumerate(self.neighbours):
+            n = self.grid_shape[axis]
+            prefix = (slice(None),) * axis
+
+            for j, weight in enumerate(weights, 1):
+                # (target, source, sign): the two shifts, then the wrap or the reflection past each wall
+                terms = [(slice(j, None), slice(None, -j), 1), (slice(None, -j), slice(j, None), 1)]
+                if self.periodic:
+                    terms += [(slice(0, j), slice(n - j, None), 1), (slice(n - j, None), slice(0, j), 1)]
+                elif j > 1:
+                    terms += [(slice(0, j - 1), slice(j - 2, None, -1), -1), (slice(n - j + 1, None), slice(n - 1, n - j, -1), -1)]
+
+                for target, source, sign in terms:
+                    out[prefix + (target,)] += (sign * weight) * psi[prefix + (source,)]
+
+        return out
+
+    def _matvec(self, x):
+        # A fresh result each call: eigsh copies it, but lobpcg keeps A @ X between iterations
+        return self.apply(x.reshape(self.grid_shape)).reshape(x.shape)
+
+    def _matmat(self, X):
+        return self.apply(X.reshape(self.grid_shape + (X.shape[1],))).reshape(X.shape)
+
+    def _adjoint(self):
+        return self
+
+
+class SpectralHamiltonian(linalg.LinearOperator):
+    """-hbar^2 / 2m Laplacian + V with the kinetic term applied exactly in the Fourier (periodic) or sine (Dirichlet) basis."""
+
+    def __init__(self, V, spacings, m, h_bar, BC='periodic'):
+        self.grid_shape = V.shape
+        self.periodic = BC == 'periodic'
+        self.axes = tuple(range(V.ndim))
+        self.V = V
+
+        self.symbol = 0
+        for axis, (n, d) in enumerate(zip(V.shape, spacings)):
+            shape = [1] * V.ndim
+            shape[axis] = -1
+            self.symbol = self.symbol - h_bar**2 / (2 * m) * second_derivative_symbol(n, d, self.periodic, 'spectral').reshape(shape)
+
+        # rfftn keeps only the non-negative frequencies of the last axis
+        self.real_symbol = self.symbol[..., :V.shape[-1] // 2 + 1]
+
+        n = V.size
+        super().__init__(dtype=V.dtype, shape=(n, n))
+
+    def set_potential(self, V):
+        """Replace V, keeping the kinetic symbol."""
+        self.V = V
+
+    def apply(self, psi, out=None):
+        """H psi for psi shaped like the grid, optionally with a trailing block axis."""
+        extra = (1,) * (psi.ndim - self.V.ndim)
+
+        if not self.periodic:
+            kinetic = fft.idstn(self.symbol.reshape(self.symbol.shape + extra) * fft.dstn(psi, type=1, axes=self.axes), type=1, axes=self.axes)
+        elif xp.iscomplexobj(psi):
+            kinetic = fft.ifftn(self.symbol.reshape(self.symbol.shape + extra) * fft.fftn(psi, axes=self.axes), axes=self.axes)
+        else:
+            transformed = fft.rfftn(psi, axes=self.axes)
+            transformed *= self.real_symbol.reshape(self.real_symbol.shape + extra)
+            kinetic = fft.irfftn(transformed, s=self.grid_shape, axes=self.axes)
+
+        kinetic += self.V.reshape(self.V.shape + extra) * psi
+        if out is None:
+            return kinetic
+
+        out[...] = kinetic
+        return out
+
+    def _matvec(self, x):
+        return self.apply(x.reshape(self.grid_shape)).reshape(x.shape)
+
+    def _matmat(self, X):
+        return self.apply(X.reshape(self.grid_shape + (X.shape[1],))).reshape(X.shape)
+
+    def _adjoint(self):
+        return self
+
+
 class SchrodingerEquation:
 
-    H_BAR = 1.05457e-34
+    H_BAR = H_BAR
+
+    def __init__(self, M, N, L, V, m, X, Y, Z, BC='periodic', order=2, progress=None):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown stencil order: {order}")
 
-    def __init__(self, M, N, L, V, m, X, Y, Z, BC='periodic'):
         self.M = M
         self.N = N
         self.L = L
@@ -26,6 +300,10 @@ class SchrodingerEquation:
             self.dz = Z / self.L
 
         self.BC = BC        
+        self.order = order
+
+        # hook(stage, done, total), e.g. terminal_progress(); None reports nothing
+        self.progress = progress
 
         if self.L == 0:
             self.n_nonzero = 5 * self.M * self.N
@@ -44,10 +322,21 @@ class SchrodingerEquation:
 
             self.n_unknowns = self.M * self.N * self.L
 
-        self.data = cp.zeros(self.n_nonzero)
-        self.row  = cp.zeros(self.n_nonzero)
-        self.col  = cp.zeros(self.n_nonzero)
-        
+        # COO staging for the loop-based assembly, only allocated if it is used
+        self.data = None
+        self.row = None
+        self.col = None
+
+    def check_second_order(self):
+        if self.order != 2:
+            raise ValueError("Loop assembly only builds the second-order stencil; use populate_matrix_kron")
+
+    def allocate_staging(self):
+        self.check_second_order()
+        self.data = xp.zeros(self.n_nonzero)
+        self.row  = xp.zeros(self.n_nonzero, dtype=xp.int64)
+        self.col  = xp.zeros(self.n_nonzero, dtype=xp.int64)
+
     def ind(self, x, y, z):
         x = x % self.M
         y = y % self.N
@@ -97,34 +386,34 @@ class SchrodingerEquation:
 
     def set_off_diag(self, x, y, z, counter):
         row = self.ind(x, y, z)
-        if x > 0:
+        if x > 0 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x - 1, y, z)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
             counter += 1
-        if x < self.M - 1:
+        if x < self.M - 1 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x + 1, y, z)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
             counter += 1
 
-        if y > 0:
+        if y > 0 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x, y - 1, z)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
             counter += 1
-        if y < self.N - 1:
+        if y < self.N - 1 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x, y + 1, z)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
             counter += 1
 
-        if z > 0:
+        if z > 0 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x, y, z - 1)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
             counter += 1
-        if z < self.L - 1:
+        if z < self.L - 1 or self.BC == 'periodic':
             self.row[counter] = row
             self.col[counter] = self.ind(x, y, z + 1)
             self.data[counter] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
@@ -159,8 +448,9 @@ class SchrodingerEquation:
         return counter
 
     def populate_matrix(self):
+        self.allocate_staging()
         counter = 0
-        bar = Bar("Populating Matrix...", max=self.M * self.N * self.L)
+        bar = Stage(self.progress, "Populating Matrix...", self.M * self.N * self.L)
         for z in range(self.L):
             for y in range(self.N):
                 for x in range(self.M):
@@ -172,20 +462,22 @@ class SchrodingerEquation:
         self.A = sparse.csr_matrix((self.data, (self.row, self.col)))
 
     def populate_matrix_efficient(self):
-        x = cp.arange(self.M)
-        y = cp.arange(self.N)
-        z = cp.arange(self.L)
+        self.check_second_order()
+
+        x = xp.arange(self.M)
+        y = xp.arange(self.N)
+        z = xp.arange(self.L)
 
-        z, y, x = cp.meshgrid(z, y, x, indexing='ij')
+        z, y, x = xp.meshgrid(z, y, x, indexing='ij')
         x = x.flatten()
         y = y.flatten()
         z = z.flatten()
 
         self.A = lil_matrix((self.n_unknowns, self.n_unknowns))
 
-        bar = Bar("Populating matrix", max=9)
+        bar = Stage(self.progress, "Populating matrix", 9)
 
-        row_col = self.ind(x, y, z).get()
+        row_col = to_host(self.ind(x, y, z))
 
         self.A[row_col, row_col] += np.ones_like(row_col) * self.H_BAR**2 / (self.dx**2 * self.m)
         bar.next()
@@ -193,27 +485,28 @@ class SchrodingerEquation:
         bar.next()
         self.A[row_col, row_col] += np.ones_like(row_col) * self.H_BAR**2 / (self.dz**2 * self.m)
         bar.next()
-        self.A[row_col, row_col] += self.V[z, y, x].get()
+        self.A[row_col, row_col] += to_host(self.V[z, y, x])
         bar.next()
 
-        self.A[row_col, self.ind(x - 1, y, z).get()] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
+        self.A[row_col, to_host(self.ind(x - 1, y, z))] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
         bar.next()
-        self.A[row_col, self.ind(x + 1, y, z).get()] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
+        self.A[row_col, to_host(self.ind(x + 1, y, z))] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
         bar.next()
-        self.A[row_col, self.ind(x, y - 1, z).get()] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
+        self.A[row_col, to_host(self.ind(x, y - 1, z))] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
         bar.next()
-        self.A[row_col, self.ind(x, y + 1, z).get()] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
+        self.A[row_col, to_host(self.ind(x, y + 1, z))] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
         bar.next()
-        self.A[row_col, self.ind(x, y, z - 1).get()] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
+        self.A[row_col, to_host(self.ind(x, y, z - 1))] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
         bar.next()
-        self.A[row_col, self.ind(x, y, z + 1).get()] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
+        self.A[row_col, to_host(self.ind(x, y, z + 1))] = -self.H_BAR**2 / (2 * self.m * self.dz**2)
         bar.finish()
 
         self.A = sparse.csr_matrix(self.A)
 
     def populate_matrix_2d(self):
+        self.allocate_staging()
         counter = 0
-        bar = Bar("Populating Matrix...", max=self.M * self.N)
+        bar = Stage(self.progress, "Populating Matrix...", self.M * self.N)
         for y in range(self.N):
             for x in range(self.M):
                 counter = self.set_diag_2d(x, y, counter)
@@ -224,115 +517,143 @@ class SchrodingerEquation:
         self.A = sparse.csr_matrix((self.data, (self.row, self.col)))
 
     def populate_matrix_2d_efficient(self):
-        x = cp.arange(self.M)
-        y = cp.arange(self.N)
+        self.check_second_order()
 
-        y, x = cp.meshgrid(y, x, indexing='ij')
+        x = xp.arange(self.M)
+        y = xp.arange(self.N)
+
+        y, x = xp.meshgrid(y, x, indexing='ij')
         x = x.flatten()
         y = y.flatten()
 
         self.A = lil_matrix((self.n_unknowns, self.n_unknowns))
 
-        bar = Bar("Populating matrix", max=6)
+        bar = Stage(self.progress, "Populating matrix", 6)
 
-        row_col = self.ind_2d(x, y).get()
+        row_col = to_host(self.ind_2d(x, y))
 
         self.A[row_col, row_col] += np.ones_like(row_col) * self.H_BAR**2 / (self.dx**2 * self.m)
         bar.next()
         self.A[row_col, row_col] += np.ones_like(row_col) * self.H_BAR**2 / (self.dy**2 * self.m)
         bar.next()
-        self.A[row_col, row_col] += self.V[y, x].get()
+        self.A[row_col, row_col] += to_host(self.V[y, x])
         bar.next()
 
-        self.A[row_col, self.ind_2d(x - 1, y).get()] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
+        self.A[row_col, to_host(self.ind_2d(x - 1, y))] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
         bar.next()
-        self.A[row_col, self.ind_2d(x + 1, y).get()] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
+        self.A[row_col, to_host(self.ind_2d(x + 1, y))] = -self.H_BAR**2 / (2 * self.m * self.dx**2)
         bar.next()
-        self.A[row_col, self.ind_2d(x, y - 1).get()] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
+        self.A[row_col, to_host(self.ind_2d(x, y - 1))] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
         bar.next()
-        self.A[row_col, self.ind_2d(x, y + 1).get()] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
+        self.A[row_col, to_host(self.ind_2d(x, y + 1))] = -self.H_BAR**2 / (2 * self.m * self.dy**2)
         bar.finish()
 
         self.A = sparse.csr_matrix(self.A)
 
-    def populate_phi(self, eigenvector):
-        z = cp.arange(self.L)
-        y = cp.arange(self.N)
-        x = cp.arange(self.M)
+    def kinetic_matrix(self):
+        """-hbar^2 / 2m times the Laplacian, as a Kronecker sum of 1-D second differences.
 
-        z, y, x = cp.meshgrid(z, y, x, indexing='ij')
+        x is the fastest axis, matching ind / ind_2d; Dirichlet boundaries drop the
+        neighbours outside the grid and periodic boundaries wrap around. `order`
+        selects the stencil (see _laplacian_1d).
+        """
+        periodic = self.BC == 'periodic'
 
-        inds = self.ind(x, y, z)
+        axes = [(self.M, self.dx), (self.N, self.dy)]
+        if self.L != 0:
+            axes.append((self.L, self.dz))
 
-        return eigenvector[inds]
-    
-    def populate_phi_2d(self, eigenvector):
-        y = cp.arange(self.N)
-        x = cp.arange(self.M)
+        T = None
+        size = 1
+        for n, d in axes:
+            D = -self.H_BAR**2 / (2 * self.m) * _laplacian_1d(n, d, periodic, self.order)
 
-        y, x = cp.meshgrid(y, x, indexing='ij')
+            # Each slower axis acts on whole blocks of the faster ones
+            T = D if T is None else sparse.kron(sparse.identity(n), T) + sparse.kron(D, sparse.identity(size))
+            size *= n
 
-        inds = self.ind_2d(x, y)
+        return T.tocsr()
 
-        return eigenvector[inds]
+    def populate_matrix_kron(self):
+        """Assemble H = T + diag(V) without per-entry writes, in 2-D (L == 0) or 3-D."""
+        T = self.kinetic_matrix()
+        # Kept so set_potential can rewrite the diagonal without assembling T again
+        self.kinetic_diagonal = T.diagonal()
+        self.A = (T + sparse.diags(self.V.ravel())).tocsr()
 
+    def set_potential(self, V):
+        """Replace V, updating only the diagonal of an already assembled matrix."""
+        self.V = V
 
+        if getattr(self, 'A', None) is None:
+            return
+        if getattr(self, 'kinetic_diagonal', None) is None:
+            # Loop-assembled matrices are rebuilt when next needed
+            self.A = None
+            return
 
-        
-if __name__=='__main__':
-    M, N = 700, 700
-    L = 0
+        # T's diagonal is never zero, so this only overwrites stored entries
+        self.A.setdiag(self.kinetic_diagonal + V.ravel())
 
-    J_to_eV = 6.242e18
+    def sweep(self, potential, values, k=20, processes=None, **kwargs):
+        """Lowest k energies at each of `values`, V being potential(value) (see schrodinger.sweep)."""
+        from schrodinger.sweep import sweep
 
-    er = 2e-10
-    me = 9.10938e-31
-    q = 1.6021766e-19
-    alpha = 1 / 137
-    c = 2.998e8
-    epsilon_0 = 8.8541878e-12
+        return sweep(self, potential, values, k, processes, **kwargs)
 
-    Hr = SchrodingerEquation.H_BAR / (me * c * alpha)
+    def operator(self):
+        """Matrix-free H for eigsh / lobpcg, in 2-D (L == 0) or 3-D."""
+        spacings = (self.dy, self.dx) if self.L == 0 else (self.dz, self.dy, self.dx)
 
-    X = 150 * Hr
-    Y = 150 * Hr
-    Z = 150 * Hr
+        if self.order == 'spectral':
+            return SpectralHamiltonian(self.V, spacings, self.m, self.H_BAR, self.BC)
 
-    x = cp.linspace(-X / 2, X / 2, M)
-    y = cp.linspace(-Y / 2, Y / 2, N)
-    z = cp.linspace(-Z / 2, Z / 2, L)
+        return StencilHamiltonian(self.V, spacings, self.m, self.H_BAR, self.BC, self.order)
 
-    z, y, x = cp.meshgrid(z, y, x, indexing='ij')
+    def populate_phi(self, eigenvector):
+        # ind is C order on [z, y, x], so this is a view rather than a gather
+        return eigenvector.reshape(self.L, self.N, self.M)
+
+    def populate_phi_2d(self, eigenvector):
+        return eigenvector.reshape(self.N, self.M)
 
-    # 4 well example
-    r1 = cp.sqrt((x - 1.5*Hr)**2 + (y - 1.5*Hr)**2 + z**2)
-    r2 = cp.sqrt((x + 1.5*Hr)**2 + (y - 1.5*Hr)**2 + z**2)
-    r3 = cp.sqrt((x - 1.5*Hr)**2 + (y + 1.5*Hr)**2 + z**2)
-    r4 = cp.sqrt((x + 1.5*Hr)**2 + (y + 1.5*Hr)**2 + z**2)
 
-    V1 = -q**2 / (4 * np.pi * epsilon_0 * r1)
-    V2 = -q**2 / (4 * np.pi * epsilon_0 * r2)
-    V3 = -q**2 / (4 * np.pi * epsilon_0 * r3)
-    V4 = -q**2 / (4 * np.pi * epsilon_0 * r4)
+def four_well_potential(M, N, L, X, Y, Z, separation=1.5 * BOHR_RADIUS):
+    """Coulomb wells of four protons on a square; [y, x] when L == 0, else [z, y, x]."""
+    x = xp.linspace(-X / 2, X / 2, M)
+    y = xp.linspace(-Y / 2, Y / 2, N)
+    z = xp.linspace(-Z / 2, Z / 2, L) if L != 0 else xp.zeros(1)
 
-    V = V1
-    V += V2
-    V += V3
-    V += V4
+    z, y, x = xp.meshgrid(z, y, x, indexing='ij')
+
+    V = xp.zeros_like(x)
+    for sx, sy in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
+        r = xp.sqrt((x - sx * separation)**2 + (y - sy * separation)**2 + z**2)
+        V -= ELEMENTARY_CHARGE**2 / (4 * np.pi * EPSILON_0 * r)
 
     V -= V.max()
 
-    m = 0.511e6
+    return V[0] if L == 0 else V
 
-    se = SchrodingerEquation(M, N, L, V, me, X, Y, Z, BC='periodic')
 
-    se.populate_matrix_2d_efficient()
-    
-    print("Calculating Eigensolutions")
-    eigenvalues, eigenvectors = linalg.eigsh(se.A, k=N, which='SA', )
+if __name__=='__main__':
+    from schrodinger.cache import EigenstateCache
+    from schrodinger.export import export_states
 
-    phis = [se.populate_phi_2d(ev).get()**2 for ev in eigenvectors.T]
+    M, N = 700, 700
+    L = 0
+
+    X = 150 * BOHR_RADIUS
+    Y = 150 * BOHR_RADIUS
+    Z = 150 * BOHR_RADIUS
+
+    V = four_well_potential(M, N, L, X, Y, Z)
+
+    progress = terminal_progress()
+    se = SchrodingerEquation(M, N, L, V, ELECTRON_MASS, X, Y, Z, BC='periodic', progress=progress)
+
+    print("Calculating Eigensolutions")
+    states = EigenstateCache().solve(se, k=20, symmetries='auto', progress=progress)
 
-    for i in range(20):
-        plt.imshow(phis[i])
-        plt.show()
+    # Densities are streamed one state at a time into the animation and the stack
+    export_states(se, states, gif="four_well_states.gif", stack="four_well_states.npy")
@@ -0,0 +1,130 @@
+"""Exact fast path for separable potentials, V = Vx(x) + Vy(y) [+ Vz(z)].
+
+The discrete Hamiltonian of a separable V is a Kronecker sum of one 1-D Hamiltonian
+per axis, so its eigenvalues are sums of 1-D eigenvalues and its eigenvectors outer
+products of 1-D eigenvectors. Each axis needs at most its k lowest states: a
+tridiagonal eigh_tridiagonal solve for second-order Dirichlet boundaries, and a
+dense eigh for periodic ones, whose corner couplings break the tridiagonal form, and
+for the wider stencils. The k lowest sums
+are enumerated with a heap, and vectors are formed only when asked for.
+"""
+import heapq
+
+import numpy as np
+from scipy.linalg import eigh, eigh_tridiagonal
+
+from backend import xp, to_host
+from schrodinger.schrodinger_equation import _laplacian_1d
+from schrodinger.solver import grid_shape, spacings
+
+
+def separate(se, rtol=1e-9):
+    """Per-axis potentials ([z,] y, x order, on the host) summing to V, or None if V isn't separable."""
+    V = np.asarray(to_host(se.V), dtype=float)
+    axes = range(V.ndim)
+
+    # The mean over every other axis leaves each axis's term plus a shared constant
+    components = [V.mean(axis=tuple(b for b in axes if b != a)) for a in axes]
+    mean = V.mean()
+    for component in components[1:]:
+        component -= mean
+
+    total = 0
+    for a, component in enumerate(components):
+        shape = [1] * V.ndim
+        shape[a] = -1
+        total = total + component.reshape(shape)
+
+    scale = max(float(np.ptp(V)), np.finfo(float).tiny)
+    if float(np.abs(V - total).max()) > rtol * scale:
+        return None
+
+    return components
+
+
+def axis_states(V_axis, d, m, h_bar, periodic, k, order=2):
+    """The k lowest eigenpairs of -hbar^2/2m d^2/dx^2 + V_axis on one axis."""
+    n = len(V_axis)
+    k = min(k, n)
+    coupling = h_bar**2 / (2 * m * d**2)
+
+    if order == 2 and not (periodic and n > 2):
+        return eigh_tridiagonal(V_axis + 2 * coupling, np.full(n - 1, -coupling), select='i', select_range=(0, k - 1))
+
+    H = -h_bar**2 / (2 * m) * np.asarray(to_host(_laplacian_1d(n, d, periodic, order).toarray())) + np.diag(V_axis)
+    return eigh(H, subset_by_index=(0, k - 1))
+
+
+def smallest_sums(axis_values, k):
+    """The k smallest sums taking one value from each ascending list, with their indices."""
+    start = (0,) * len(axis_values)
+    heap = [(sum(values[0] for values in axis_values), start)]
+    seen = {start}
+
+    sums = []
+    while heap and len(sums) < k:
+        energy, index = heapq.heappop(heap)
+        sums.append((energy, index))
+
+        for a in range(len(index)):
+            if index[a] + 1 < len(axis_values[a]):
+                neighbour = index[:a] + (index[a] + 1,) + index[a + 1:]
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    heapq.heappush(heap, (sum(values[i] for values, i in zip(axis_values, neighbour)), neighbour))
+
+    return sums
+
+
+class SeparableStates:
+    """Lowest states of a separable problem; each eigenvector is an outer product built on demand."""
+
+    def __init__(self, shape, eigenvalues, indices, axis_vectors):
+        self.shape = shape
+        self.eigenvalues = eigenvalues
+        # Per-axis state numbers of each state, [z,] y, x
+        self.indices = indices
+        self.axis_vectors = axis_vectors
+
+    def __len__(self):
+        return len(self.eigenvalues)
+
+    def state(self, index):
+        factors = [vectors[:, i] for vectors, i in zip(self.axis_vectors, self.indices[index])]
+
+        state = factors[0]
+        for factor in factors[1:]:
+            state = xp.tensordot(state, factor, axes=0)
+
+        return state
+
+    def vector(self, index):
+        return self.state(index).ravel()
+
+    def eigenvectors(self):
+        return xp.stack([self.vector(i) for i in range(len(self))], axis=1)
+
+
+def separable_states(se, k=20, components=None):
+    """The k lowest states of `se`, whose V must be separable (see `separate`)."""
+    components = separate(se) if components is None else components
+    if components is None:
+        raise ValueError("V is not separable")
+
+    periodic = se.BC == 'periodic'
+
+    axis_values = []
+    axis_vectors = []
+    for V_axis, d in zip(components, spacings(se)):
+        values, vectors = axis_states(V_axis, d, se.m, se.H_BAR, periodic, k, se.order)
+        axis_values.append(values.tolist())
+        axis_vectors.append(xp.asarray(vectors))
+
+    sums = smallest_sums(axis_values, k)
+
+    return SeparableStates(
+        grid_shape(se),
+        xp.asarray([energy for energy, _ in sums]),
+        [index for _, index in sums],
+        axis_vectors,
+    )
@@ -0,0 +1,324 @@
+"""Targeted eigensolvers for SchrodingerEquation.
+
+`lowest_states` finds the k lowest states with LOBPCG on the matrix-free operator,
+preconditioned by the exact inverse of the kinetic operator plus a constant shift.
+That inverse is diagonal in the Fourier basis for periodic boundaries and in the
+sine basis for Dirichlet ones. The starting block comes from the same solve on a
+grid coarsened by two along every axis, interpolated back up, recursively, until the
+grid is small enough to solve directly. The block carries guard states above the k
+asked for, so a state the coarse grid misses can still enter the lowest k. LOBPCG stops
+once the lowest k have converged, whether or not the guard states have, and those k
+are checked against the tolerance before they are returned. With an energy window,
+shift-invert Lanczos finds the states nearest the window's middle instead.
+"""
+import warnings
+
+from backend import xp, fft, linalg, ndimage, GPU
+from schrodinger.schrodinger_equation import SchrodingerEquation, second_derivative_symbol
+
+# Grids at or below this many unknowns are solved directly with Lanczos
+COARSE_UNKNOWNS = 64 * 64
+
+# States solved beyond the k asked for (at least; k / 4 for large k)
+GUARD_STATES = 4
+
+# LOBPCG iterations between convergence checks and progress reports; each check restarts it from its current block
+CHECK_ROUND = 5
+
+# Rounds without a lower residual after which LOBPCG is taken to have stalled
+STALL_ROUNDS = 4
+
+
+def grid_shape(se):
+    return (se.N, se.M) if se.L == 0 else (se.L, se.N, se.M)
+
+
+def spacings(se):
+    return (se.dy, se.dx) if se.L == 0 else (se.dz, se.dy, se.dx)
+
+
+def guarded(k):
+    """Block size for the lowest k states: k plus the guard states."""
+    return k + max(GUARD_STATES, k // 4)
+
+
+def energy_scale(se):
+    """hbar^2 / m dx^2 for the finest spacing; solvers work in these units so tolerances are meaningful."""
+    return se.H_BAR**2 / (se.m * min(spacings(se))**2)
+
+
+def kinetic_symbol(se, real=False):
+    """Eigenvalues of the discrete kinetic operator (of se.order) on its Fourier (periodic) or DST-I (Dirichlet) grid.
+
+    With `real` the last periodic axis is halved to match rfftn.
+    """
+    shape = grid_shape(se)
+    periodic = se.BC == 'periodic'
+
+    symbol = 0
+    for axis, (n, d) in enumerate(zip(shape, spacings(se))):
+        eigenvalues = -second_derivative_symbol(n, d, periodic, se.order)
+        if periodic and real and axis == len(shape) - 1:
+            eigenvalues = eigenvalues[:n // 2 + 1]
+
+        axis_shape = [1] * len(shape)
+        axis_shape[axis] = -1
+        symbol = symbol + (se.H_BAR**2 / (2 * se.m) * eigenvalues).reshape(axis_shape)
+
+    return symbol
+
+
+class KineticPreconditioner(linalg.LinearOperator):
+    """(T + shift)^-1 applied by FFT (periodic) or DST-I (Dirichlet), with T the discrete kinetic operator."""
+
+    def __init__(self, se, shift, scale=1.0):
+        self.grid_shape = grid_shape(se)
+        self.periodic = se.BC == 'periodic'
+        self.axes = tuple(range(len(self.grid_shape)))
+
+        self.symbol = kinetic_symbol(se, real=True)
+        self.scale = scale
+        self.set_shift(shift)
+
+        n = 1
+        for size in self.grid_shape:
+            n *= size
+        super().__init__(dtype=self.inverse.dtype, shape=(n, n))
+
+    def set_shift(self, shift):
+        self.inverse = self.scale / (self.symbol + shift)
+
+    def apply(self, psi):
+        inverse = self.inverse.reshape(self.inverse.shape + (1,) * (psi.ndim - self.inverse.ndim))
+
+        if self.periodic:
+            transformed = fft.rfftn(psi, axes=self.axes)
+            transformed *= inverse
+            return fft.irfftn(transformed, s=self.grid_shape, axes=self.axes)
+
+        transformed = fft.dstn(psi, type=1, axes=self.axes)
+        transformed *= inverse
+        return fft.idstn(transformed, type=1, axes=self.axes)
+
+    def _matvec(self, x):
+        return self.apply(x.reshape(self.grid_shape)).reshape(x.shape)
+
+    def _matmat(self, X):
+        return self.apply(X.reshape(self.grid_shape + (X.shape[1],))).reshape(X.shape)
+
+
+def coarsen(se):
+    """The same problem on every other sample of each axis, or None if the grid is already small."""
+    shape = grid_shape(se)
+    if se.n_unknowns <= COARSE_UNKNOWNS or min(shape) < 8:
+        return None
+
+    V = se.V[tuple(slice(None, None, 2) for _ in shape)]
+    M, N, L = V.shape[-1], V.shape[-2], (V.shape[0] if se.L != 0 else 0)
+
+    # Keep the physical extent; the coarse spacing is then about twice the fine one
+    return SchrodingerEquation(M, N, L, V, se.m, se.dx * se.M, se.dy * se.N, se.dz * se.L if se.L != 0 else 0, BC=se.BC, order=se.order)
+
+
+def interpolate(coarse, fine, vectors):
+    """Linearly interpolate coarse-grid eigenvectors (n_coarse, k) onto the fine grid."""
+    coarse_shape = grid_shape(coarse)
+    fine_shape = grid_shape(fine)
+
+    block = vectors.reshape(coarse_shape + (vectors.shape[1],))
+    zoom = [f / c for f, c in zip(fine_shape, coarse_shape)] + [1]
+    mode = 'grid-wrap' if fine.BC == 'periodic' else 'nearest'
+
+    fine_block = ndimage.zoom(block, zoom, order=1, mode=mode, grid_mode=True)
+
+    return fine_block.reshape(fine.n_unknowns, vectors.shape[1])
+
+
+def lanczos(se, k, which='SA', sigma=None, tol=0):
+    """Plain (or shift-invert, with `sigma`) eigsh on the assembled matrix, in scaled units."""
+    if getattr(se, 'A', None) is None:
+        se.populate_matrix_kron()
+
+    scale = energy_scale(se)
+    A = se.A * (1 / scale)
+
+    if sigma is None:
+        eigenvalues, eigenvectors = linalg.eigsh(A, k=k, which=which, tol=tol)
+    else:
+        eigenvalues, eigenvectors = linalg.eigsh(A, k=k, sigma=sigma / scale, which='LM', tol=tol)
+
+    order = xp.argsort(eigenvalues)
+    return eigenvalues[order] * scale, eigenvectors[:, order]
+
+
+def lowest_states(se, k=20, window=None, method='auto', tol=1e-5, maxiter=500, warm_start=True, symmetries=None, progress=None,
+                  vectors=True):
+    """Eigenvalues (ascending) and eigenvectors (columns) of the lowest k states.
+
+    With `window=(E_min, E_max)` the k states nearest the middle of the window are
+    found by shift-invert and only those inside it are returned. `method` is 'auto',
+    'lobpcg', 'shift_invert', 'lanczos' (plain eigsh, smallest algebraic) or
+    'separable'; 'auto' takes the separable fast path whenever V is separable. SciPy's
+    shift-invert factorizes the matrix on the host, so on the GPU 'auto' uses LOBPCG
+    and filters its states by the window. `tol` is LOBPCG's residual tolerance in
+    units of `energy_scale(se)`. With `symmetries` ('auto' or a list of names from
+    schrodinger.symmetry) H is split into symmetry blocks that are solved separately
+    and `method` is ignored, unless V has none of them. `progress(stage, done, total)`
+    is told as each stage advances.
+
+    The separable path forms its eigenvectors only when asked: with vectors=False
+    None is returned in their place, and no (n_unknowns, k) array is built for callers
+    that only want energies. For a few states of a separable V, use
+    schrodinger.separable.separable_states, which builds one vector at a time.
+    EigenstateCache.solve, and so the web's solve jobs, always asks for the vectors,
+    which it writes to disk.
+    """
+    if symmetries is not None:
+        from schrodinger.symmetry import detect_symmetries
+
+        # With no symmetry the one block would be all of H, solved without the preconditioner
+        symmetries = list(detect_symmetries(se) if symmetries == 'auto' else symmetries) or None
+
+    components = None
+    if method == 'auto' and window is None and symmetries is None:
+        from schrodinger.separable import separate
+
+        components = separate(se)
+        if components is not None:
+            method = 'separable'
+
+    if method == 'auto':
+        method = 'shift_invert' if window is not None and not GPU else 'lobpcg'
+
+    if method == 'separable':
+        from schrodinger.separable import separable_states
+
+        states = separable_states(se, k, components)
+        eigenvalues, eigenvectors = states.eigenvalues, states.eigenvectors() if vectors else None
+        if progress is not None:
+            progress("Separable solve", 1, 1)
+    elif symmetries is not None:
+        from schrodinger.symmetry import symmetric_states
+
+        states = symmetric_states(se, k, symmetries, progress=progress)
+        eigenvalues, eigenvectors = states.eigenvalues, states.eigenvectors()
+    elif method == 'lanczos' or (method == 'lobpcg' and se.n_unknowns <= COARSE_UNKNOWNS):
+        eigenvalues, eigenvectors = lanczos(se, k)
+        if progress is not None:
+            progress(f"Lanczos ({se.n_unknowns} unknowns)", 1, 1)
+    elif method == 'shift_invert':
+        if window is None:
+            raise ValueError("shift-invert needs an energy window")
+        eigenvalues, eigenvectors = lanczos(se, k, sigma=(window[0] + window[1]) / 2)
+        if progress is not None:
+            progress("Shift-invert Lanczos", 1, 1)
+    elif method == 'lobpcg':
+        eigenvalues, eigenvectors = lobpcg_states(se, k, tol, maxiter, warm_start, progress)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    if not vectors:
+        eigenvectors = None
+
+    if window is not None:
+        inside = (eigenvalues >= window[0]) & (eigenvalues <= window[1])
+        eigenvalues = eigenvalues[inside]
+        eigenvectors = None if eigenvectors is None else eigenvectors[:, inside]
+
+    return eigenvalues, eigenvectors
+
+
+def lobpcg_states(se, k, tol=1e-5, maxiter=500, warm_start=True, progress=None, size=None):
+    """The lowest k states from a guarded LOBPCG block; Lanczos solves them instead if they haven't converged.
+
+    With `size`, the whole block of that many states is returned, only the lowest k checked.
+    """
+    eigenvalues, eigenvectors = lobpcg_block(se, size or guarded(k), tol, maxiter, warm_start, progress, k)
+    eigenvalues, eigenvectors = eigenvalues[:size or k], eigenvectors[:, :size or k]
+
+    norms = residual_norms(se, eigenvalues[:k], eigenvectors[:, :k])
+    if float(norms.max()) > tol:
+        warnings.warn(f"LOBPCG left residuals up to {float(norms.max()):.1e} (tol {tol:.0e}); solving with Lanczos instead")
+        eigenvalues, eigenvectors = lanczos(se, size or k)
+        if progress is not None:
+            progress(f"Lanczos ({se.n_unknowns} unknowns)", 1, 1)
+
+    return eigenvalues, eigenvectors
+
+
+def residual_norms(se, eigenvalues, eigenvectors):
+    """||H x - E x|| / ||x|| of each pair, in units of `energy_scale(se)` like LOBPCG's tolerance."""
+    scale = energy_scale(se)
+    residuals = se.operator() @ eigenvectors - eigenvectors * eigenvalues
+    return xp.linalg.norm(residuals, axis=0) / (scale * xp.linalg.norm(eigenvectors, axis=0))
+
+
+def lobpcg_block(se, size, tol=1e-5, maxiter=500, warm_start=True, progress=None, k=None):
+    """`size` eigenpairs from LOBPCG, started from the same block solved on coarser grids; unchecked.
+
+    Iteration stops once the lowest k (default all) have converged.
+    """
+    scale = energy_scale(se)
+
+    coarse = coarsen(se) if warm_start else None
+    if coarse is not None:
+        if coarse.n_unknowns <= COARSE_UNKNOWNS:
+            coarse_values, coarse_vectors = lanczos(coarse, size)
+            if progress is not None:
+                progress(f"Lanczos ({coarse.n_unknowns} unknowns)", 1, 1)
+        else:
+            coarse_values, coarse_vectors = lobpcg_block(coarse, size, tol, maxiter, warm_start, progress, k)
+        X = interpolate(coarse, se, coarse_vectors)
+        ground = float(coarse_values[0])
+    else:
+        X = xp.random.default_rng(0).standard_normal((se.n_unknowns, size))
+        ground = None
+
+    # With V replaced by its mean, (T + mean(V) - E_0)^-1 approximates (H - E_0)^-1
+    # near the ground state
+    shift = 1e-3 * scale
+    if ground is not None:
+        shift = max(float(se.V.mean()) - ground, shift)
+
+    preconditioner = KineticPreconditioner(se, shift, scale)
+    operator = se.operator() * (1 / scale)
+
+    eigenvalues, eigenvectors, _ = lobpcg_rounds(operator, X, preconditioner, tol, maxiter, k, progress,
+                                                 f"LOBPCG ({se.n_unknowns} unknowns)")
+
+    order = xp.argsort(eigenvalues)
+    return eigenvalues[order] * scale, eigenvectors[:, order]
+
+
+def lobpcg_rounds(operator, X, preconditioner, tol, maxiter, k=None, progress=None, stage=None):
+    """lobpcg restarted every CHECK_ROUND iterations from its last block, until its lowest k pairs (default all) converge.
+
+    scipy's lobpcg only stops once every pair has, and the guard states at the top of a
+    block converge slowest. It also stops once the lowest k stall, as they do when the
+    block's Gram matrices are too ill-conditioned to improve on it. Returns the pairs,
+    lowest first, and whether the lowest k converged.
+    """
+    k = X.shape[1] if k is None else k
+    done = 0
+    best, stalled = float("inf"), 0
+    while True:
+        rounds = min(CHECK_ROUND, maxiter - done)
+        with warnings.catch_warnings():
+            # Stopping short of the tolerance is expected between rounds, and checked after the last
+            warnings.simplefilter("ignore", UserWarning)
+            eigenvalues, X, residuals = linalg.lobpcg(operator, X, M=preconditioner, tol=tol, maxiter=rounds, largest=False,
+                                                      retResidualNormsHistory=True)
+        done += rounds
+
+        # The last residuals are those of the block returned
+        residual = float(xp.max(xp.asarray(residuals[-1])[:k]))
+        converged = residual <= tol
+        stalled = 0 if residual < best else stalled + 1
+        best = min(best, residual)
+
+        finished = converged or done >= maxiter or stalled >= STALL_ROUNDS
+        if progress is not None:
+            progress(stage, maxiter if finished else done, maxiter)
+
+        if finished:
+            return eigenvalues, X, converged
@@ -0,0 +1,230 @@
+"""Energy levels across a sweep of a parameterized potential, by eigenvector continuation.
+
+Only V changes between sweep points, so the kinetic part is assembled once: the
+matrix-free operator and an assembled matrix just have their diagonal rewritten,
+and the kinetic preconditioner only has its shift updated. Each point's LOBPCG solve
+starts from the lowest Ritz vectors of H in the span of the eigenvectors found at
+the last few points, which for a smooth sweep is already close to the new states,
+and stops as soon as the lowest k have converged. The block carries a few guard
+states above the k asked for, so levels crossing into the lowest k are already in
+it. A point that hasn't converged within CONTINUATION_MAXITER iterations is solved
+cold, as the first point is. Grids small enough to solve directly use Lanczos at
+every point. The values are cut into contiguous chunks, one per process, each
+starting cold once.
+
+    python -m schrodinger.sweep --sweep frequency --grid 256 --box 30 --values 0.2 0.6 24 --output levels.png
+"""
+import argparse
+from functools import partial
+from multiprocessing import Pool
+import os
+
+import numpy as np
+
+from backend import xp, to_host
+from schrodinger.presets import harmonic_potential
+from schrodinger.schrodinger_equation import SchrodingerEquation, four_well_potential, BOHR_RADIUS, ELECTRON_MASS, ELEMENTARY_CHARGE
+from schrodinger.solver import COARSE_UNKNOWNS, KineticPreconditioner, energy_scale, guarded, lanczos, lobpcg_rounds, lobpcg_states, lowest_states
+
+# Previous points whose eigenvectors span each point's starting subspace
+CONTINUATION_POINTS = 3
+
+# Gram eigenvalues below this fraction of the largest are dropped from the starting subspace
+GRAM_CUTOFF = 1e-8
+
+# LOBPCG iterations a continued point gets before it is solved cold instead
+CONTINUATION_MAXITER = 40
+
+
+def starting_block(operator, history, size):
+    """The `size` lowest Ritz vectors of `operator` in the span of the previous points' eigenvectors.
+
+    The span is orthonormalized through its small Gram matrix, several times faster
+    than a QR of the tall block, dropping directions the points share almost exactly.
+    """
+    Z = xp.concatenate(history, axis=1)
+    s, U = xp.linalg.eigh(Z.T @ Z)
+    keep = s > GRAM_CUTOFF * s[-1]
+    Q = Z @ (U[:, keep] / xp.sqrt(s[keep]))
+    _, Y = xp.linalg.eigh(Q.T @ (operator @ Q))
+
+    return Q @ Y[:, :size]
+
+
+def continuation(se, potential, values, k=20, tol=1e-5, maxiter=500):
+    """(value, eigenvalues, eigenvectors) of the lowest k states at each value in turn.
+
+    `se` is left holding the potential of the last value.
+    """
+    scale = energy_scale(se)
+    # Levels entering the lowest k from above start inside the block
+    size = guarded(k)
+
+    operator = preconditioner = None
+    history = []
+    for value in values:
+        se.set_potential(potential(value))
+
+        if se.n_unknowns <= COARSE_UNKNOWNS:
+            # Small enough to solve directly; the assembled matrix only has its diagonal rewritten
+            eigenvalues, eigenvectors = lanczos(se, k)
+            yield value, eigenvalues, eigenvectors
+            continue
+
+        converged = False
+        if history:
+            operator.set_potential(se.V)
+            # As in lobpcg_block, with the previous ground state standing in for the coarse one
+            preconditioner.set_shift(max(float(se.V.mean()) - float(eigenvalues[0]), 1e-3 * scale))
+
+            scaled = operator * (1 / scale)
+            eigenvalues, eigenvectors, converged = lobpcg_rounds(scaled, starting_block(scaled, history, size), preconditioner,
+                                                                 tol, min(maxiter, CONTINUATION_MAXITER), k)
+            eigenvalues = eigenvalues * scale
+
+        if not converged:
+            # The first point, or one the last few don't predict well; the guard states are kept for the next
+            eigenvalues, eigenvectors = lobpcg_states(se, k, tol, maxiter, size=size)
+
+            if operator is None:
+                operator = se.operator()
+                preconditioner = KineticPreconditioner(se, 1e-3 * scale, scale)
+
+        history = (history + [eigenvectors])[-CONTINUATION_POINTS:]
+
+        yield value, eigenvalues[:k], eigenvectors[:, :k]
+
+
+def problem(se):
+    """Everything but V needed to rebuild `se` in another process."""
+    return se.M, se.N, se.L, se.m, se.dx * se.M, se.dy * se.N, se.dz * se.L if se.L != 0 else 0, se.BC, se.order
+
+
+def sweep_chunk(task):
+    """Energies of one contiguous run of values, solved in a worker; returned with the run's index."""
+    index, parameters, potential, values, k, tol, maxiter = task
+    M, N, L, m, X, Y, Z, BC, order = parameters
+
+    se = SchrodingerEquation(M, N, L, None, m, X, Y, Z, BC=BC, order=order)
+    return index, [to_host(eigenvalues) for _, eigenvalues, _ in continuation(se, potential, values, k, tol, maxiter)]
+
+
+def chunks(values, n):
+    """`values` cut into at most n contiguous runs of near-equal length."""
+    bounds = np.linspace(0, len(values), min(n, len(values)) + 1).round().astype(int)
+    return [list(values[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+
+def sweep(se, potential, values, k=20, processes=None, tol=1e-5, maxiter=500, progress=None):
+    """Lowest k energies (len(values), k) of `se` with V = potential(value) at each value.
+
+    `potential` must return V on the grid of `se` and, with several processes, be
+    picklable: a module-level function or a functools.partial of one, e.g.
+    partial(four_well_potential, M, N, L, X, Y, Z) to sweep the well separation.
+    Symmetry and separability aren't used. `progress(stage, done, total)` counts points.
+    """
+    values = list(values)
+    processes = processes or os.cpu_count() or 1
+    runs = chunks(values, processes)
+
+    if len(runs) == 1:
+        energies = []
+        for done, (_, eigenvalues, _) in enumerate(continuation(se, potential, values, k, tol, maxiter), 1):
+            energies.append(to_host(eigenvalues))
+            if progress is not None:
+                progress("Sweep", done, len(values))
+
+        return np.array(energies)
+
+    tasks = [(index, problem(se), potential, run, k, tol, maxiter) for index, run in enumerate(runs)]
+
+    results = [None] * len(runs)
+    with Pool(len(runs)) as pool:
+        done = 0
+        for index, energies in pool.imap_unordered(sweep_chunk, tasks):
+            results[index] = energies
+            done += len(energies)
+            if progress is not None:
+                progress("Sweep", done, len(values))
+
+    return np.array([energies for result in results for energies in result])
+
+
+def cold_sweep(se, potential, values, k=20, method='lobpcg', tol=1e-5, maxiter=500):
+    """Every point solved from scratch with lowest_states, for comparison with `sweep`."""
+    energies = []
+    for value in values:
+        se.set_potential(potential(value))
+        se.A = None
+
+        eigenvalues, _ = lowest_states(se, k, method=method, tol=tol, maxiter=maxiter)
+        energies.append(to_host(eigenvalues))
+
+    return np.array(energies)
+
+
+def plot_levels(values, energies, path, xlabel):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(6, 6))
+    axes.plot(values, energies, color="tab:blue", linewidth=1)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel("Energy (eV)")
+    figure.savefig(path, dpi=150)
+    plt.close(figure)
+
+
+# Parameter swept by the driver: (potential on an n x n grid X across, value scale, axis label)
+SWEEPS = {
+    "separation": (lambda n, X: partial(four_well_potential, n, n, 0, X, X, X), BOHR_RADIUS, "Well separation (Bohr radii)"),
+    "frequency": (lambda n, X: partial(harmonic_potential, n, n, 0, X, X, X), 1.0, "Oscillator hbar omega (Hartree)"),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Energy levels across a sweep of the four-well separation or an oscillator's frequency.")
+    parser.add_argument("--sweep", choices=SWEEPS, default="separation")
+    parser.add_argument("--grid", type=int, default=128, help="grid points per side")
+    parser.add_argument("--box", type=float, default=60.0, help="box width in Bohr radii")
+    parser.add_argument("--BC", choices=("periodic", "dirichlet"), default="periodic")
+    parser.add_argument("--states", type=int, default=10)
+    parser.add_argument("--values", type=float, nargs=3, default=(0.5, 3.0, 24), metavar=("FIRST", "LAST", "COUNT"),
+                        help="swept values, in Bohr radii or Hartree")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--compare", action="store_true", help="also time solving every point from scratch, and check both against Lanczos")
+    parser.add_argument("--output", help="PNG of the energy-level curves")
+
+    return parser.parse_args(argv)
+
+
+if __name__=="__main__":
+    import time
+
+    args = parse_args()
+
+    n = args.grid
+    X = args.box * BOHR_RADIUS
+    se = SchrodingerEquation(n, n, 0, None, ELECTRON_MASS, X, X, X, BC=args.BC)
+
+    make_potential, unit, label = SWEEPS[args.sweep]
+    potential = make_potential(n, X)
+    swept = np.linspace(args.values[0], args.values[1], int(args.values[2]))
+    values = swept * unit
+
+    start = time.perf_counter()
+    energies = sweep(se, potential, values, args.states, args.processes)
+    print(f"continuation: {time.perf_counter() - start:.2f}s")
+
+    if args.compare:
+        start = time.perf_counter()
+        cold = cold_sweep(se, potential, values, args.states)
+        print(f"cold starts:  {time.perf_counter() - start:.2f}s")
+
+        reference = cold_sweep(se, potential, values, args.states, method='lanczos')
+        for name, result in (("continuation", energies), ("cold starts", cold)):
+            print(f"{name} max error: {np.abs(result - reference).max() / ELEMENTARY_CHARGE:.2e} eV")
+
+    if args.output is not None:
+        plot_levels(swept, energies / ELEMENTARY_CHARGE, args.output, label)
@@ -0,0 +1,248 @@
+"""Block diagonalization of SchrodingerEquation by the reflection symmetries of V.
+
+Each symmetry is an involution of the grid that commutes with the Hamiltonian: 'x',
+'y' and 'z' mirror one axis, 'diag' swaps x and y and 'antidiag' swaps them through
+the other diagonal. A commuting set of k of them splits the space into 2^k sectors,
+one per choice of parity (+1 or -1) under each. Every sector is spanned by
+(anti)symmetrized orbits of grid points, so its basis P is a sparse matrix with at
+most 2^k entries per column and its block P^T H P is about 2^k times smaller than H.
+Blocks are solved independently on a thread pool and their states merged by energy;
+full eigenvectors are P times the block's, built only when asked for.
+
+Of D4's reflections at most two commute, so the four-well potential splits four
+ways in 2D (eight in 3D, with 'z').
+"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+import os
+
+import numpy as np
+
+from backend import xp, sparse, linalg, GPU
+from schrodinger.solver import energy_scale, grid_shape
+
+SYMMETRIES = ("x", "y", "z", "diag", "antidiag")
+
+# Pairs that don't commute and so can't be used together
+CONFLICTS = {("x", "diag"), ("x", "antidiag"), ("y", "diag"), ("y", "antidiag")}
+
+# Blocks at or below this size are diagonalized densely
+DENSE_BLOCK = 1024
+
+# ARPACK and SciPy's sparse products run outside the GIL, so blocks overlap on threads
+BLOCK_WORKERS = os.cpu_count() or 1
+
+
+def permutation(shape, symmetry):
+    """Flat index map of a symmetry: (g psi)[i] = psi[perm[i]]."""
+    index = xp.arange(int(np.prod(shape))).reshape(shape)
+
+    if symmetry == "x":
+        index = xp.flip(index, axis=-1)
+    elif symmetry == "y":
+        index = xp.flip(index, axis=-2)
+    elif symmetry == "z":
+        index = xp.flip(index, axis=0)
+    elif symmetry == "diag":
+        index = xp.swapaxes(index, -1, -2)
+    elif symmetry == "antidiag":
+        index = xp.swapaxes(xp.flip(index, axis=(-1, -2)), -1, -2)
+    else:
+        raise ValueError(f"Unknown symmetry: {symmetry}")
+
+    return index.ravel()
+
+
+def applicable(se, symmetry):
+    """Whether the grid itself has the symmetry, regardless of V."""
+    if symmetry == "z":
+        return se.L != 0
+    if symmetry in ("diag", "antidiag"):
+        return se.M == se.N and np.isclose(se.dx, se.dy)
+    return symmetry in ("x", "y")
+
+
+def detect_symmetries(se, rtol=1e-9):
+    """The largest commuting set of symmetries V has, preferring the axis mirrors."""
+    V = se.V
+    tolerance = rtol * float(xp.abs(V).max())
+
+    found = []
+    for symmetry in SYMMETRIES:
+        if not applicable(se, symmetry):
+            continue
+
+        mirrored = V.ravel()[permutation(V.shape, symmetry)]
+        if float(xp.abs(mirrored - V.ravel()).max()) <= tolerance:
+            if all((a, symmetry) not in CONFLICTS for a in found):
+                found.append(symmetry)
+
+    return found
+
+
+def check_symmetries(se, symmetries):
+    for symmetry in symmetries:
+        if symmetry not in SYMMETRIES or not applicable(se, symmetry):
+            raise ValueError(f"Symmetry {symmetry!r} does not apply to this grid")
+
+    for a, b in product(symmetries, repeat=2):
+        if (a, b) in CONFLICTS:
+            raise ValueError(f"Symmetries {a!r} and {b!r} do not commute")
+
+
+def sector_basis(shape, symmetries, parities):
+    """Orthonormal sparse basis (n, n_sector) of the sector with the given parity under each symmetry."""
+    n = int(np.prod(shape))
+    generators = [permutation(shape, symmetry) for symmetry in symmetries]
+
+    # Every element of the group and its character in this sector
+    elements = []
+    for bits in product((0, 1), repeat=len(generators)):
+        perm = xp.arange(n)
+        character = 1
+        for bit, generator, parity in zip(bits, generators, parities):
+            if bit:
+                perm = perm[generator]
+                character *= parity
+        elements.append((perm, character))
+
+    # Each orbit is represented by its smallest index
+    representative = xp.arange(n)
+    for perm, _ in elements:
+        representative = xp.minimum(representative, perm)
+    representatives = xp.nonzero(representative == xp.arange(n))[0]
+    n_orbits = len(representatives)
+
+    rows = xp.concatenate([perm[representatives] for perm, _ in elements])
+    cols = xp.tile(xp.arange(n_orbits), len(elements))
+    data = xp.concatenate([xp.full(n_orbits, float(character)) for _, character in elements])
+
+    # Duplicates (points fixed by some element) are summed; orbits whose sum cancels
+    # don't exist in this sector
+    P = sparse.coo_matrix((data, (rows, cols)), shape=(n, n_orbits)).tocsc()
+    norms = xp.sqrt(xp.asarray(P.multiply(P).sum(axis=0)).ravel())
+
+    keep = xp.nonzero(norms > 0.5)[0]
+    return P[:, keep] @ sparse.diags(1 / norms[keep])
+
+
+class SymmetryBlock:
+    def __init__(self, parities, basis, matrix):
+        self.parities = parities
+        self.basis = basis
+        self.matrix = matrix
+
+    @property
+    def size(self):
+        return self.matrix.shape[0]
+
+    def solve(self, k, scale):
+        """The k lowest eigenpairs of the block, in scaled units."""
+        k = min(k, self.size)
+
+        if self.size <= DENSE_BLOCK or k >= self.size - 1:
+            eigenvalues, eigenvectors = xp.linalg.eigh(self.matrix.toarray() / scale)
+            return eigenvalues[:k], eigenvectors[:, :k]
+
+        eigenvalues, eigenvectors = linalg.eigsh(self.matrix * (1 / scale), k=k, which='SA')
+        order = xp.argsort(eigenvalues)
+        return eigenvalues[order], eigenvectors[:, order]
+
+
+def symmetry_blocks(se, symmetries="auto"):
+    """The blocks of H in each sector of `symmetries` ('auto', or a list of names)."""
+    if symmetries == "auto":
+        symmetries = detect_symmetries(se)
+    else:
+        check_symmetries(se, symmetries)
+
+    if getattr(se, 'A', None) is None:
+        se.populate_matrix_kron()
+
+    shape = grid_shape(se)
+    A = se.A.tocsr()
+
+    blocks = []
+    for parities in product((1, -1), repeat=len(symmetries)):
+        basis = sector_basis(shape, symmetries, parities)
+        if basis.shape[1] == 0:
+            continue
+
+        matrix = (basis.T @ A @ basis).tocsr()
+        blocks.append(SymmetryBlock(dict(zip(symmetries, parities)), basis.tocsr(), matrix))
+
+    return symmetries, blocks
+
+
+class SymmetricStates:
+    """Lowest states found block by block; full eigenvectors are reconstructed on demand."""
+
+    def __init__(self, se, eigenvalues, sectors, blocks, block_vectors):
+        self.shape = grid_shape(se)
+        self.eigenvalues = eigenvalues
+        # Index of each state's block, and its column within that block's vectors
+        self.sectors = sectors
+        self.blocks = blocks
+        self.block_vectors = block_vectors
+
+    def __len__(self):
+        return len(self.eigenvalues)
+
+    def parities(self, index):
+        return self.blocks[self.sectors[index][0]].parities
+
+    def vector(self, index):
+        block, column = self.sectors[index]
+        return self.blocks[block].basis @ self.block_vectors[block][:, column]
+
+    def state(self, index):
+        return self.vector(index).reshape(self.shape)
+
+    def eigenvectors(self):
+        return xp.stack([self.vector(i) for i in range(len(self))], axis=1)
+
+
+def symmetric_states(se, k=20, symmetries="auto", workers=BLOCK_WORKERS, progress=None):
+    """The k lowest states of `se`, found separately in each symmetry sector.
+
+    Every block is first asked for a share of k with some margin. A block whose states
+    are all below the k-th lowest found overall may hold more, so it is solved again
+    for twice as many until none does.
+    """
+    scale = energy_scale(se)
+    symmetries, blocks = symmetry_blocks(se, symmetries)
+
+    requested = [min(-(-k // len(blocks)) + 2, block.size) for block in blocks]
+    results = [None] * len(blocks)
+    pending = list(range(len(blocks)))
+
+    # CuPy's solvers share one stream, so blocks run in turn on the GPU
+    with ThreadPoolExecutor(max_workers=1 if GPU else max(1, workers)) as pool:
+        while pending:
+            solved = pool.map(lambda i: blocks[i].solve(requested[i], scale), pending)
+            for n_solved, (i, result) in enumerate(zip(pending, solved), 1):
+                results[i] = result
+                if progress is not None:
+                    progress("Symmetry blocks", n_solved, len(pending))
+
+            merged = xp.sort(xp.concatenate([values for values, _ in results]))
+            threshold = float(merged[min(k, len(merged)) - 1])
+
+            pending = []
+            for i, (values, _) in enumerate(results):
+                if len(values) < blocks[i].size and float(values[-1]) < threshold:
+                    requested[i] = min(2 * requested[i], blocks[i].size)
+                    pending.append(i)
+
+    values = xp.concatenate([values for values, _ in results])
+    labels = [(i, j) for i, (block_values, _) in enumerate(results) for j in range(len(block_values))]
+
+    order = [int(i) for i in xp.argsort(values)[:k]]
+
+    return SymmetricStates(
+        se,
+        values[xp.asarray(order)] * scale,
+        [labels[i] for i in order],
+        blocks,
+        [vectors for _, vectors in results],
+    )
@@ -0,0 +1,121 @@
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from io import BytesIO
+from threading import Lock
+import os
+import time
+
+from PIL import Image
+
+MIMETYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+# PIL releases the GIL while compressing, so a thread pool keeps encodes off the socket handlers
+ENCODE_WORKERS = os.cpu_count() or 1
+IMAGE_CACHE_SIZE = 64
+
+EncodedImage = namedtuple("EncodedImage", ["data", "mimetype", "etag", "encode_time"])
+
+
+class ImageCache:
+    def __init__(self, max_size=IMAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, encoded):
+        with self.lock:
+            self.entries[key] = encoded
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+def encode(image_array, fmt="png", quality=85, compress_level=1):
+    """Encode an (H, W, 3) uint8 array; `quality` applies to webp/jpeg, `compress_level` to png."""
+    if fmt not in MIMETYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+
+    start = time.perf_counter()
+
+    image = Image.fromarray(image_array)
+    buffer = BytesIO()
+
+    if fmt == "png":
+        image.save(buffer, format="PNG", compress_level=compress_level)
+    elif fmt == "webp":
+        image.save(buffer, format="WEBP", quality=quality)
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+
+    data = buffer.getvalue()
+
+    return EncodedImage(data, MIMETYPES[fmt], sha1(data).hexdigest(), time.perf_counter() - start)
+
+
+ENCODER_POOL = ThreadPoolExecutor(max_workers=ENCODE_WORKERS)
+IMAGE_CACHE = ImageCache()
+
+
+def submit(image_array, callback, on_error=None, **options):
+    """Encode on the worker pool and call `callback(encoded)` when done, or `on_error(exception)` if encoding fails."""
+    future = ENCODER_POOL.submit(encode, image_array, **options)
+
+    def done(f):
+        # Raising here would only be logged by the pool, leaving the client waiting
+        if f.exception() is not None:
+            if on_error is not None:
+                on_error(f.exception())
+            return
+
+        callback(f.result())
+
+    future.add_done_callback(done)
+
+    return future
+
+
+if __name__=="__main__":
+    import base64
+
+    import numpy as np
+    from PIL import ImageDraw
+
+    from mandelbrot.mandelbrot_set import MandelbrotSet
+
+    res = (1536, 1024)
+    mandelbrot_set = MandelbrotSet(-2.0, 1.0, -1.0, 1.0, *res, smooth=True)
+    mandelbrot_set.iterate(500)
+    image_array = np.ascontiguousarray(mandelbrot_set.get_image(res)[::-1])
+
+    # Previous pipeline: axes burned in, default PNG settings, base64 data URL
+    start = time.perf_counter()
+    image = Image.fromarray(image_array)
+    draw = ImageDraw.Draw(image)
+    for i in np.linspace(0, res[0], 10):
+        draw.line([(i, 0), (i, res[1])], fill="white", width=1)
+    for i in np.linspace(res[1], 0, 10):
+        draw.line([(0, i), (res[0], i)], fill="white", width=1)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    data_url = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+    print(f"{'data url png':<16}{(time.perf_counter() - start) * 1000:>9.1f} ms{len(data_url):>10} bytes")
+
+    for fmt, options in (
+        ("png", {"compress_level": 1}),
+        ("png", {"compress_level": 6}),
+        ("webp", {"quality": 85}),
+        ("jpeg", {"quality": 85}),
+    ):
+        encoded = encode(image_array, fmt, **options)
+        label = f"{fmt} {list(options.values())[0]}"
+        print(f"{label:<16}{encoded.encode_time * 1000:>9.1f} ms{len(encoded.data):>10} bytes")
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+import os
+import time
+
+RENDER_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+RENDER_TIMEOUT = 60.0
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderTimeout(RenderCancelled):
+    pass
+
+
+class Deadline:
+    def __init__(self, timeout=RENDER_TIMEOUT):
+        self.deadline = time.monotonic() + timeout
+
+    def check(self):
+        # Called from inside the compute loops; raising unwinds the render at a consistent point
+        if time.monotonic() > self.deadline:
+            raise RenderTimeout()
+
+
+class RenderJob(Deadline):
+    def __init__(self, sid, render, timeout=RENDER_TIMEOUT):
+        super().__init__(timeout)
+        self.sid = sid
+        self.render = render
+        self.cancelled = Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise RenderCancelled()
+
+        super().check()
+
+
+class RenderScheduler:
+    """Runs at most one render per session on a bounded pool; newer requests supersede older ones.
+
+    A request that arrives while the session's job is running cancels it and waits as
+    the session's pending job; a later request replaces the pending one without it ever
+    running.
+    """
+
+    def __init__(self, max_workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, on_error=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.timeout = timeout
+        self.on_error = on_error
+
+        self.running = {}
+        self.pending = {}
+        self.lock = Lock()
+
+    def submit(self, sid, render):
+        job = RenderJob(sid, render, self.timeout)
+
+        with self.lock:
+            if sid in self.running:
+                self.running[sid].cancel()
+                self.pending[sid] = job
+            else:
+                self.running[sid] = job
+                self.pool.submit(self.run, job)
+
+        return job
+
+    def cancel(self, sid):
+        with self.lock:
+            self.pending.pop(sid, None)
+            if sid in self.running:
+                self.running[sid].cancel()
+
+    def run(self, job):
+        try:
+            job.check()
+            job.render(job)
+        except RenderTimeout as e:
+            if self.on_error is not None:
+                self.on_error(job, e)
+        except RenderCancelled:
+            pass
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(job, e)
+        finally:
+            with self.lock:
+                next_job = self.pending.pop(job.sid, None)
+                if next_job is None:
+                    del self.running[job.sid]
+                else:
+                    self.running[job.sid] = next_job
+                    self.pool.submit(self.run, next_job)
@@ -0,0 +1,306 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock, Thread
+import multiprocessing
+import os
+import tempfile
+import uuid
+
+import numpy as np
+
+from schrodinger.cache import EigenstateCache
+from schrodinger.export import densities, density_indices
+from schrodinger.isosurface import LOD_FRACTIONS, isosurface, levels_of_detail, to_glb
+from schrodinger.presets import PRESETS
+from schrodinger.separable import separate
+from schrodinger.schrodinger_equation import SchrodingerEquation, BOHR_RADIUS, ELECTRON_MASS, ELEMENTARY_CHARGE, ORDERS
+from schrodinger.solver import grid_shape
+
+JOB_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+# Jobs queued or running at once, across all sessions
+JOB_QUEUE_SIZE = 8
+# About a 512^2 or 128^3 problem
+MAX_UNKNOWNS = 128**3
+MAX_STATES = 50
+
+
+class QueueFull(Exception):
+    pass
+
+
+def job_spec(data):
+    """Validated solve settings from a client message; an uploaded "V" is raw float32 eV with its "shape"."""
+    spec = {
+        "preset": data.get("preset", "four_wells"),
+        "grid": int(data.get("grid", 256)),
+        "depth": int(data.get("depth", 0)),
+        "box": float(data.get("box", 60.0)),
+        "BC": data.get("BC", "periodic"),
+        "order": data.get("order", 2),
+        "k": int(data.get("k", 20)),
+        "symmetries": bool(data.get("symmetries", True)),
+        "V": None,
+    }
+    if spec["order"] != "spectral":
+        spec["order"] = int(spec["order"])
+
+    shape = (spec["depth"],) * (spec["depth"] != 0) + (spec["grid"], spec["grid"])
+    if data.get("V") is not None:
+        shape = tuple(int(n) for n in data["shape"])
+        if len(shape) not in (2, 3) or len(data["V"]) != 4 * int(np.prod(shape)):
+            raise ValueError("uploaded V doesn't match its shape")
+
+        spec.update(preset=None, V=bytes(data["V"]), shape=shape)
+    elif spec["preset"] not in PRESETS:
+        raise ValueError(f"Unknown preset: {spec['preset']}")
+
+    if spec["BC"] not in ("periodic", "dirichlet") or spec["order"] not in ORDERS:
+        raise ValueError("unknown boundary condition or stencil order")
+    if min(shape) < 16 or int(np.prod(shape)) > MAX_UNKNOWNS or not 1 <= spec["k"] <= MAX_STATES or spec["box"] <= 0:
+        raise ValueError(f"grids need 16 to {MAX_UNKNOWNS} points, and 1 to {MAX_STATES} states")
+
+    return spec
+
+
+def build_problem(spec, progress=None):
+    width = spec["box"] * BOHR_RADIUS
+
+    if spec["V"] is None:
+        M = N = spec["grid"]
+        L = spec["depth"]
+        V = PRESETS[spec["preset"]](M, N, L, width, width, width)
+    else:
+        V = np.frombuffer(spec["V"], dtype=np.float32).reshape(spec["shape"]).astype(float) * ELEMENTARY_CHARGE
+        L, N, M = (0,) + V.shape if V.ndim == 2 else V.shape
+
+    return SchrodingerEquation(M, N, L, V, ELECTRON_MASS, width, width, width, BC=spec["BC"], order=spec["order"], progress=progress)
+
+
+# Set in every worker process by the pool's initializer
+_events = None
+_cache = None
+
+
+def init_worker(events, cache_directory):
+    global _events, _cache
+    _events = events
+    _cache = EigenstateCache(cache_directory)
+
+
+def solve_job(job_id, spec):
+    """Runs in a worker: solve (or read) the states, then send each density back as it is ready."""
+    def progress(stage, done, total):
+        _events.put(("progress", job_id, stage, done, total))
+
+    se = build_problem(spec, progress)
+
+    # Separable potentials are left to lowest_states's separable path, which symmetries would bypass;
+    # the cache has it form every eigenvector, since the densities and meshes are read from them
+    symmetries = "auto" if spec["symmetries"] and separate(se) is None else None
+    states = _cache.solve(se, spec["k"], symmetries=symmetries, progress=progress)
+
+    send_states(lambda *event: _events.put(event), job_id, se, states, spec["k"])
+
+
+def send_states(send, job_id, se, states, k):
+    send("solved", job_id, states.key, (np.asarray(states.eigenvalues[:k]) / ELEMENTARY_CHARGE).tolist())
+
+    shape = grid_shape(se)
+    for index, density in enumerate(densities(states, shape)):
+        if index >= k:
+            break
+        image = density_indices(density)
+        send("state", job_id, index, image.tobytes(), image.shape[1], image.shape[0])
+
+    send("done", job_id)
+
+
+def mesh_paths(directory, index, fraction):
+    """GLB of every level of detail of a cached state's isosurface, kept next to its eigenvectors."""
+    return [os.path.join(directory, f"mesh_{index}_{fraction}_lod{lod}.glb") for lod in range(len(LOD_FRACTIONS))]
+
+
+def mesh_job(directory, index, fraction):
+    """Runs in a worker: extract the isosurface, in grid units centred on the origin, and write each level."""
+    mesh = isosurface(os.path.join(directory, "eigenvectors.npy"), (1.0, 1.0, 1.0), index, fraction=fraction, square=True)
+
+    for decimated, path in zip(levels_of_detail(mesh), mesh_paths(directory, index, fraction)):
+        # Written under a unique name and renamed, so a file that exists is always complete
+        descriptor, temporary = tempfile.mkstemp(suffix=".glb.tmp", dir=directory)
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(to_glb(decimated))
+        os.replace(temporary, path)
+
+
+class SolveJob:
+    def __init__(self, job_id, key, sids):
+        self.job_id = job_id
+        self.key = key
+        self.sids = set(sids)
+        self.future = None
+
+
+class SchrodingerJobService:
+    """Eigensolves on a process pool, with their progress and densities relayed to Socket.IO sessions.
+
+    Workers report through a multiprocessing queue that one listener thread drains, so
+    no solve ever runs on a thread serving requests or animation frames. Sessions
+    asking for a problem already being solved join that job; problems already in the
+    eigenstate cache are streamed straight from it. At most `max_queue` solves and mesh
+    extractions are queued or running; beyond that submit and mesh raise QueueFull.
+    """
+
+    def __init__(self, emit, cache, max_workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE):
+        self.emit = emit
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self.jobs = {}
+        self.by_key = {}
+        self.meshes = {}
+        self.lock = Lock()
+
+        self.pool = None
+        self.events = None
+
+    def start(self):
+        # Workers are spawned rather than forked from a process full of server threads
+        context = multiprocessing.get_context("spawn")
+        if self.events is None:
+            self.events = context.Queue()
+            Thread(target=self.listen, daemon=True).start()
+
+        self.pool = ProcessPoolExecutor(self.max_workers, mp_context=context, initializer=init_worker,
+                                        initargs=(self.events, self.cache.directory))
+
+    def submit(self, sid, spec):
+        se = build_problem(spec)
+        key = self.cache.key(se)
+
+        with self.lock:
+            job = self.by_key.get(key)
+            if job is not None and job.job_id in self.jobs:
+                job.sids.add(sid)
+                return job.job_id
+
+            states = self.cache.load(key, spec["k"])
+            if states is not None:
+                job_id = uuid.uuid4().hex
+                Thread(target=send_states, args=(self.relay, job_id, se, states, spec["k"]), daemon=True).start()
+                self.jobs[job_id] = SolveJob(job_id, key, [sid])
+                return job_id
+
+            if len(self.by_key) + len(self.meshes) >= self.max_queue:
+                raise QueueFull(f"{self.max_queue} jobs are already queued")
+
+            if self.pool is None:
+                self.start()
+
+            job = SolveJob(uuid.uuid4().hex, key, [sid])
+            self.jobs[job.job_id] = job
+            self.by_key[key] = job
+
+            job.future = self.pool.submit(solve_job, job.job_id, spec)
+            job.future.add_done_callback(lambda future: self.finished(job, future))
+
+        return job.job_id
+
+    def mesh(self, directory, index, fraction):
+        """Future of a cached state's mesh files being written; concurrent requests share one extraction."""
+        name = (directory, index, fraction)
+        with self.lock:
+            future = self.meshes.get(name)
+            if future is not None:
+                return future
+
+            if len(self.by_key) + len(self.meshes) >= self.max_queue:
+                raise QueueFull(f"{self.max_queue} jobs are already queued")
+
+            if self.pool is None:
+                self.start()
+
+            future = self.meshes[name] = self.pool.submit(mesh_job, directory, index, fraction)
+
+        # Outside the lock: a future that is already done runs the callback right here
+        future.add_done_callback(lambda future: self.mesh_finished(name, future))
+        return future
+
+    def mesh_finished(self, name, future):
+        with self.lock:
+            self.meshes.pop(name, None)
+            if isinstance(future.exception(), BrokenProcessPool):
+                self.pool = None
+
+    def cancel(self, sid):
+        """Forget a session, and every job nobody is waiting for any more.
+
+        Such a job never runs if it is still queued; a running one finishes (and fills
+        the cache) but its events go nowhere, and a new request starts a new job.
+        """
+        with self.lock:
+            for job in list(self.jobs.values()):
+                job.sids.discard(sid)
+                if not job.sids:
+                    if job.future is not None:
+                        job.future.cancel()
+                    self.jobs.pop(job.job_id, None)
+                    if self.by_key.get(job.key) is job:
+                        del self.by_key[job.key]
+
+    def finished(self, job, future):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died (e.g. out of memory); the next submit starts a fresh pool
+            with self.lock:
+                self.pool = None
+
+        if error is not None:
+            for sid in self.sids(job.job_id):
+                self.emit("schrodinger_error", {"job": job.job_id, "error": str(error)}, sid)
+
+        with self.lock:
+            # A cancelled job's key may already belong to a newer job
+            if self.by_key.get(job.key) is job:
+                del self.by_key[job.key]
+            if error is not None:
+                self.jobs.pop(job.job_id, None)
+
+    def sids(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return list(job.sids) if job is not None else []
+
+    def listen(self):
+        while True:
+            self.relay(*self.events.get())
+
+    def relay(self, kind, job_id, *fields):
+        if kind == "progress":
+            stage, done, total = fields
+            payload = {"job": job_id, "stage": stage, "done": done, "total": total}
+            event = "schrodinger_progress"
+        elif kind == "solved":
+            key, eigenvalues = fields
+            payload = {"job": job_id, "key": key, "eigenvalues": eigenvalues}
+            event = "schrodinger_solved"
+        elif kind == "state":
+            index, density, width, height = fields
+            payload = {"job": job_id, "index": index, "density": density, "width": width, "height": height}
+            event = "schrodinger_state"
+        else:
+            payload = {"job": job_id}
+            event = "schrodinger_done"
+
+        for sid in self.sids(job_id):
+            self.emit(event, payload, sid)
+
+        if kind == "done":
+            with self.lock:
+                job = self.jobs.pop(job_id, None)
+                # Until its future's callback runs, by_key would hand the finished job to new sessions
+                if job is not None and self.by_key.get(job.key) is job:
+                    del self.by_key[job.key]
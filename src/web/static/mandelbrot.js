@@ -10,29 +10,199 @@ var $imag_upper = $("#imag_upper");
 var $x_res = $("#x_res");
 var $y_res = $("#y_res");
 var $n_iter = $("#n_iter");
+var $progressive = $("#progressive");
+var $strategy = $("#strategy");
+var $palette = $("#palette");
+var $smooth = $("#smooth");
+var $precision = $("#precision");
+var $format = $("#format");
+var $quality = $("#quality");
+var $transport = $("#transport");
+var $atlas_grid = $("#atlas_grid");
+var $atlas_thumb = $("#atlas_thumb");
 
 var $render = $("#render");
 
 var $rendered_img = $("#rendered_img").hide();
+var $rendered_canvas = $("#rendered_canvas").hide();
+var $axes_canvas = $("#axes_canvas").hide();
 var $spinner_container = $("#spinner-container").hide();
+var $julia_atlas = $("#julia_atlas").hide();
+
+var canvas = $rendered_canvas[0];
+var context = canvas.getContext("2d");
+
+var axes_canvas = $axes_canvas[0];
+var axes_context = axes_canvas.getContext("2d");
+
+// Coarsest stride drawn so far; passes that arrive late must not overwrite finer ones
+var drawn_stride = Infinity;
+
+var image_url = null;
+
+// Results of superseded requests can still arrive and are ignored
+var request_id = 0;
+
+function linspace(start, stop, n) {
+    var values = [];
+    for (var i = 0; i < n; i++) {
+        values.push(start + (stop - start) * i / (n - 1));
+    }
+    return values;
+}
+
+// Axes are drawn over the image so rendered (and cached) images stay axis-free
+function draw_axes(data) {
+    var width = axes_canvas.width;
+    var height = axes_canvas.height;
+
+    var x_ints = linspace(0, width, 10);
+    var y_ints = linspace(height, 0, 10);
+
+    var x_floats = linspace(data.real_lower, data.real_upper, 10);
+    var y_floats = linspace(data.imag_lower, data.imag_upper, 10);
+
+    axes_context.clearRect(0, 0, width, height);
+    axes_context.strokeStyle = "white";
+    axes_context.fillStyle = "white";
+    axes_context.lineWidth = 1;
+    axes_context.textBaseline = "top";
+
+    for (var i = 0; i < 10; i++) {
+        axes_context.beginPath();
+        axes_context.moveTo(x_ints[i], 0);
+        axes_context.lineTo(x_ints[i], height);
+        axes_context.stroke();
+        axes_context.fillText(x_floats[i].toExponential(2), x_ints[i], 0);
+
+        axes_context.beginPath();
+        axes_context.moveTo(0, y_ints[i]);
+        axes_context.lineTo(width, y_ints[i]);
+        axes_context.stroke();
+        axes_context.fillText(y_floats[i].toExponential(2), 0, y_ints[i]);
+    }
+
+    $axes_canvas.show();
+}
+
+function image_source(data) {
+    if (data.url) {
+        return data.url;
+    }
+
+    if (image_url) {
+        URL.revokeObjectURL(image_url);
+    }
+    image_url = URL.createObjectURL(new Blob([data.image], {type: data.mimetype}));
+
+    return image_url;
+}
+
+// One Julia set per c of the view, fetched as a single image
+function update_atlas(data) {
+    var params = new URLSearchParams({
+        real_lower: data.real_lower,
+        real_upper: data.real_upper,
+        imag_lower: data.imag_lower,
+        imag_upper: data.imag_upper,
+        n_real: $atlas_grid.val(),
+        n_imag: $atlas_grid.val(),
+        thumb: $atlas_thumb.val(),
+        n_iter: Math.min($n_iter.val(), 200),
+        palette: $palette.val(),
+        smooth: $smooth.is(":checked"),
+        format: $format.val(),
+        quality: $quality.val()
+    });
+
+    $julia_atlas.attr("src", "/mandelbrot/julia_atlas?" + params.toString()).show();
+}
+
+$atlas_grid.on("change", function() {
+    update_atlas({real_lower: $real_lower.val(), real_upper: $real_upper.val(), imag_lower: $imag_lower.val(), imag_upper: $imag_upper.val()});
+});
+$atlas_thumb.on("change", function() {
+    $atlas_grid.trigger("change");
+});
 
 $render.on("click", function() {
+    request_id += 1;
+
     socket.emit("render_mandelbrot", {
+        request_id: request_id,
         real_lower: $real_lower.val(),
         real_upper: $real_upper.val(),
         imag_lower: $imag_lower.val(),
         imag_upper: $imag_upper.val(),
         x_res: $x_res.val(),
         y_res: $y_res.val(),
-        n_iter: $n_iter.val()
+        n_iter: $n_iter.val(),
+        progressive: $progressive.is(":checked"),
+        strategy: $strategy.val(),
+        palette: $palette.val(),
+        smooth: $smooth.is(":checked"),
+        precision: $precision.val(),
+        format: $format.val(),
+        quality: $quality.val(),
+        compress_level: 1,
+        transport: $transport.val()
     });
 
+    canvas.width = axes_canvas.width = $x_res.val();
+    canvas.height = axes_canvas.height = $y_res.val();
+    drawn_stride = Infinity;
+
     $spinner_container.show();
     $rendered_img.hide();
+    $rendered_canvas.hide();
+    $axes_canvas.hide();
+});
+
+socket.on("rendered_mandelbrot_partial", function(data) {
+    if (data.request_id !== request_id) {
+        return;
+    }
+
+    var image = new Image();
+    var url = URL.createObjectURL(new Blob([data.image], {type: data.mimetype}));
+
+    image.onload = function() {
+        URL.revokeObjectURL(url);
+
+        if (data.stride > drawn_stride) {
+            return;
+        }
+        drawn_stride = data.stride;
+
+        context.imageSmoothingEnabled = false;
+        context.drawImage(image, 0, 0, canvas.width, canvas.height);
+
+        draw_axes(data);
+        $rendered_canvas.show();
+        $spinner_container.hide();
+    };
+
+    image.src = url;
 });
 
 socket.on("rendered_mandelbrot", function(data) {
-    $rendered_img.attr("src", data.image);
+    if (data.request_id !== request_id) {
+        return;
+    }
+
+    drawn_stride = 0;
+
+    console.log("Mandelbrot image: " + data.bytes + " bytes, encoded in " + data.encode_ms.toFixed(1) + " ms" + (data.cached ? " (cached)" : ""));
+
+    $rendered_img.attr("src", image_source(data));
+    draw_axes(data);
+    update_atlas(data);
     $rendered_img.show();
+    $rendered_canvas.hide();
     $spinner_container.hide();
-});
\ No newline at end of file
+});
+
+socket.on("render_mandelbrot_error", function(data) {
+    console.error(data.error);
+    $spinner_container.hide();
+});
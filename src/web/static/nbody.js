@@ -0,0 +1,112 @@
+var socket = io();
+
+socket.pingInterval = 10000;
+socket.pingTimeout = 10000;
+
+var $model = $("#model");
+var $bodies = $("#bodies");
+var $theta = $("#theta");
+var $theta_value = $("#theta_value");
+var $dt = $("#dt");
+var $steps_per_frame = $("#steps_per_frame");
+
+var $pause_play = $("#pause-play");
+var $status = $("#status");
+var $spinner_container = $("#spinner-container").hide();
+
+var canvas = $("#nbody_canvas")[0];
+var context = canvas.getContext("2d");
+var image_data = context.createImageData(canvas.width, canvas.height);
+var counts = new Float32Array(canvas.width * canvas.height);
+
+var playing = false;
+var frames_drawn = 0;
+var fps_start = performance.now();
+
+$theta.on("input", function() {
+    $theta_value.text($theta.val());
+});
+
+function play() {
+    socket.emit("play_nbody", {
+        model: $model.val(),
+        bodies: $bodies.val(),
+        theta: $theta.val(),
+        dt: $dt.val(),
+        steps_per_frame: $steps_per_frame.val()
+    });
+
+    playing = true;
+    frames_drawn = 0;
+    fps_start = performance.now();
+
+    $pause_play.text("Stop");
+    $spinner_container.show();
+}
+
+function pause() {
+    socket.emit("pause");
+
+    playing = false;
+    $pause_play.text("Compute");
+    $spinner_container.hide();
+}
+
+$pause_play.on("click", function() {
+    if (playing) {
+        pause();
+    } else {
+        play();
+    }
+});
+
+socket.on("nbody_frame", function(data) {
+    if (!playing) {
+        return;
+    }
+
+    var positions = new Float32Array(data.positions);
+    var width = canvas.width;
+    var height = canvas.height;
+    var scale = 0.5 * Math.min(width, height) / data.extent;
+
+    // Bodies per pixel, shown on a log scale so both the dense centre and the outskirts are visible
+    counts.fill(0);
+    var peak = 1;
+    for (var i = 0; i < data.bodies; i++) {
+        var x = Math.floor(0.5 * width + scale * positions[2 * i]);
+        var y = Math.floor(0.5 * height - scale * positions[2 * i + 1]);
+        if (x >= 0 && x < width && y >= 0 && y < height) {
+            var count = ++counts[y * width + x];
+            peak = Math.max(peak, count);
+        }
+    }
+
+    var pixels = image_data.data;
+    var log_peak = Math.log(1 + peak);
+    for (var p = 0; p < counts.length; p++) {
+        var value = counts[p] > 0 ? 0.35 + 0.65 * Math.log(1 + counts[p]) / log_peak : 0;
+        pixels[4 * p] = 255 * value;
+        pixels[4 * p + 1] = 255 * value * value;
+        pixels[4 * p + 2] = 255 * value * value * value + 60 * value;
+        pixels[4 * p + 3] = 255;
+    }
+    context.putImageData(image_data, 0, 0);
+
+    $spinner_container.hide();
+
+    frames_drawn += 1;
+    var elapsed = (performance.now() - fps_start) / 1000;
+    if (elapsed > 1) {
+        $status.text("t = " + data.time.toFixed(3) + ", " + (frames_drawn / elapsed).toFixed(1) + " fps, "
+                     + data.step_ms.toFixed(0) + " ms per step");
+        frames_drawn = 0;
+        fps_start = performance.now();
+    }
+});
+
+socket.on("nbody_error", function(data) {
+    console.error(data.error);
+    $status.text(data.error);
+    pause();
+});
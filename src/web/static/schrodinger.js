@@ -0,0 +1,247 @@
+var socket = io();
+
+socket.pingInterval = 10000;
+socket.pingTimeout = 10000;
+
+var $grid = $("#grid");
+var $BC = $("#BC");
+var $precision = $("#precision");
+var $dt = $("#dt");
+var $steps_per_frame = $("#steps_per_frame");
+var $center_x = $("#center_x");
+var $center_y = $("#center_y");
+var $momentum_x = $("#momentum_x");
+var $momentum_y = $("#momentum_y");
+
+var $pause_play = $("#pause-play");
+var $status = $("#status");
+var $spinner_container = $("#spinner-container").hide();
+
+var canvas = $("#density_canvas")[0];
+var context = canvas.getContext("2d");
+var image_data = null;
+
+// Density (0-255) to RGB: black through purple and orange to pale yellow
+var lut = new Uint8ClampedArray(256 * 3);
+for (var i = 0; i < 256; i++) {
+    var t = i / 255;
+    lut[3 * i] = Math.round(255 * Math.min(1, 1.6 * t));
+    lut[3 * i + 1] = Math.round(255 * Math.max(0, Math.min(1, 1.8 * t - 0.6)));
+    lut[3 * i + 2] = Math.round(255 * Math.max(0, Math.min(1, Math.sin(Math.PI * t) * 0.8 + Math.max(0, 3 * t - 2))));
+}
+
+var playing = false;
+var frames_drawn = 0;
+var fps_start = performance.now();
+
+function play() {
+    socket.emit("play_schrodinger", {
+        grid: $grid.val(),
+        BC: $BC.val(),
+        precision: $precision.val(),
+        dt: $dt.val(),
+        steps_per_frame: $steps_per_frame.val(),
+        center: [$center_x.val(), $center_y.val()],
+        momentum: [$momentum_x.val(), $momentum_y.val()]
+    });
+
+    playing = true;
+    frames_drawn = 0;
+    fps_start = performance.now();
+
+    $pause_play.text("Stop");
+    $spinner_container.show();
+}
+
+function pause() {
+    socket.emit("pause");
+
+    playing = false;
+    $pause_play.text("Compute");
+    $spinner_container.hide();
+}
+
+$pause_play.on("click", function() {
+    if (playing) {
+        pause();
+    } else {
+        play();
+    }
+});
+
+socket.on("schrodinger_frame", function(data) {
+    if (!playing) {
+        return;
+    }
+
+    if (image_data === null || image_data.width !== data.width || image_data.height !== data.height) {
+        canvas.width = data.width;
+        canvas.height = data.height;
+        image_data = context.createImageData(data.width, data.height);
+    }
+
+    var density = new Uint8Array(data.density);
+    var pixels = image_data.data;
+    for (var i = 0; i < density.length; i++) {
+        var value = 3 * density[i];
+        pixels[4 * i] = lut[value];
+        pixels[4 * i + 1] = lut[value + 1];
+        pixels[4 * i + 2] = lut[value + 2];
+        pixels[4 * i + 3] = 255;
+    }
+    context.putImageData(image_data, 0, 0);
+
+    $spinner_container.hide();
+
+    frames_drawn += 1;
+    var elapsed = (performance.now() - fps_start) / 1000;
+    if (elapsed > 1) {
+        $status.text("t = " + data.time.toFixed(2) + " a.u., " + (frames_drawn / elapsed).toFixed(1) + " fps");
+        frames_drawn = 0;
+        fps_start = performance.now();
+    }
+});
+
+socket.on("schrodinger_error", function(data) {
+    console.error(data.error);
+
+    // Solve errors carry their job, null if the solve was never queued
+    if (data.job === undefined) {
+        pause();
+    } else if (data.job === null || data.job === job) {
+        solve_finished("Solve failed: " + data.error);
+    }
+});
+
+// Eigenstates are solved as background jobs on the server, which reports its progress
+// and then streams each state's density as soon as it is ready
+var $load_states = $("#load_states");
+var $preset = $("#preset");
+var $state_grid = $("#state_grid");
+var $order = $("#order");
+var $potential_file = $("#potential_file");
+var $potential_shape = $("#potential_shape");
+var $state_index = $("#state_index");
+var $state_energy = $("#state_energy");
+var $solve_progress = $("#solve_progress");
+var $solve_stage = $("#solve_stage");
+
+var state_canvas = $("#state_canvas")[0];
+var state_context = state_canvas.getContext("2d");
+
+var job = null;
+var states = null;
+var state_images = [];
+
+function draw_density(target, data) {
+    if (target.canvas.width !== data.width || target.canvas.height !== data.height) {
+        target.canvas.width = data.width;
+        target.canvas.height = data.height;
+    }
+
+    var image = target.createImageData(data.width, data.height);
+    var density = new Uint8Array(data.density);
+    for (var i = 0; i < density.length; i++) {
+        var value = 3 * density[i];
+        image.data[4 * i] = lut[value];
+        image.data[4 * i + 1] = lut[value + 1];
+        image.data[4 * i + 2] = lut[value + 2];
+        image.data[4 * i + 3] = 255;
+    }
+    target.putImageData(image, 0, 0);
+}
+
+function show_state() {
+    if (states === null) {
+        return;
+    }
+
+    var index = Math.min(Math.max(parseInt($state_index.val()) || 0, 0), states.eigenvalues.length - 1);
+    if (state_images[index] !== undefined) {
+        draw_density(state_context, state_images[index]);
+    }
+    $state_energy.text("E = " + states.eigenvalues[index].toFixed(4) + " eV");
+}
+
+function solve_finished(message) {
+    $load_states.prop("disabled", false);
+    $solve_progress.hide();
+    $solve_stage.text(message || "");
+}
+
+// Events of a job this page started; anything else is a stale job's
+function current(data) {
+    if (job === null) {
+        job = data.job;
+    }
+    return data.job === job;
+}
+
+function solve(potential) {
+    var request = {preset: $preset.val(), grid: $state_grid.val(), BC: $BC.val(), order: $order.val(), k: 20};
+    if (potential !== null) {
+        request.V = potential;
+        request.shape = $potential_shape.val().split(",").map(function(n) { return parseInt(n); });
+    }
+
+    job = null;
+    states = null;
+    state_images = [];
+
+    $load_states.prop("disabled", true);
+    $state_energy.text("");
+    $solve_stage.text("Queued");
+    socket.emit("solve_schrodinger", request);
+}
+
+$load_states.on("click", function() {
+    var file = $potential_file[0].files[0];
+    if (file === undefined) {
+        solve(null);
+    } else {
+        file.arrayBuffer().then(solve);
+    }
+});
+
+socket.on("schrodinger_job", current);
+
+socket.on("schrodinger_progress", function(data) {
+    if (!current(data)) {
+        return;
+    }
+
+    $solve_progress.attr("max", data.total).val(data.done).show();
+    $solve_stage.text(data.stage);
+});
+
+socket.on("schrodinger_solved", function(data) {
+    if (!current(data)) {
+        return;
+    }
+
+    states = data;
+    $state_index.attr("max", data.eigenvalues.length - 1);
+    $solve_progress.attr("max", data.eigenvalues.length).val(0).show();
+    $solve_stage.text("Receiving states");
+});
+
+socket.on("schrodinger_state", function(data) {
+    if (!current(data)) {
+        return;
+    }
+
+    state_images[data.index] = data;
+    $solve_progress.val(data.index + 1);
+    if (data.index === (parseInt($state_index.val()) || 0)) {
+        show_state();
+    }
+});
+
+socket.on("schrodinger_done", function(data) {
+    if (current(data)) {
+        solve_finished();
+        show_state();
+    }
+});
+
+$state_index.on("change", show_state);
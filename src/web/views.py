@@ -1,16 +1,29 @@
-from flask import Flask, render_template, request
+from flask import Flask, Response, abort, render_template, request, send_file
 from flask_socketio import SocketIO, emit, Namespace
 
+from backend import to_host
 from pendulum.double_pendulum import DoublePendulum
-from mandelbrot.mandelbrot_set import MandelbrotSet
-
+from mandelbrot.mandelbrot_set import MandelbrotSet, PRECISIONS
+from mandelbrot.palette import PALETTES, Colorizer
+from mandelbrot.cache import EscapeTimeCache
+from mandelbrot.julia import render_atlas
+from nbody.simulation import MODELS as NBODY_MODELS, NBodySimulation, initial_conditions
+from schrodinger.schrodinger_equation import SchrodingerEquation, four_well_potential, BOHR_RADIUS, ELECTRON_MASS, ELEMENTARY_CHARGE
+from schrodinger.cache import EigenstateCache
+from schrodinger.export import density_image
+from schrodinger.isosurface import LOD_FRACTIONS
+from schrodinger.propagator import ATOMIC_TIME, PRECISIONS as WAVE_PRECISIONS, frames, gaussian_wavepacket, propagator
+from web import encoding
+from web.render_jobs import Deadline, RenderScheduler, RenderTimeout
+from web.schrodinger_jobs import QueueFull, SchrodingerJobService, build_problem, job_spec, mesh_paths
+
+from concurrent.futures import TimeoutError as FutureTimeout
 from threading import Thread
+import os
 import time
 from typing import List
 
-from PIL import Image, ImageDraw
-from io import BytesIO
-import base64
+from hashlib import sha1
 
 app = Flask(__name__)
 
@@ -19,6 +32,19 @@ socketio = SocketIO(app)
 
 PENDULA = {}
 THREADS = {}
+MANDELBROTS = {}
+ESCAPE_CACHE = EscapeTimeCache()
+EIGENSTATE_CACHE = EigenstateCache()
+# Caps one atlas request at about a 2048x2048 render
+ATLAS_MAX_SAMPLES = 2048 * 2048
+ATLAS_MAX_ITERATIONS = 10000
+# Atlases render inside the request, so they get less time than socket renders
+ATLAS_TIMEOUT = 20.0
+NBODY_MAX_BODIES = 100000
+# Isosurface levels are rounded to twentieths, so each state has at most 19 sets of mesh files
+MESH_FRACTION_STEPS = 20
+# A mesh request waits this long for its extraction before giving up with a 503
+MESH_TIMEOUT = 30.0
 RK4_H = 0.005
 FRAME_RATE = 60
 N_FRAMES = (1.0 / FRAME_RATE) / RK4_H
@@ -35,14 +61,144 @@ def pendulum():
 def schrodinger():
     return render_template("schrodinger.html")
 
+@app.route("/schrodinger/states")
+def schrodinger_states():
+    """Eigenvalues (eV) and cache key of an already solved preset problem; solves run as "solve_schrodinger" jobs."""
+    try:
+        spec = job_spec(request.args)
+    except ValueError:
+        abort(400)
+
+    # Never solves inside a request: a miss is a 404 until a job has filled the cache
+    states = EIGENSTATE_CACHE.load(EIGENSTATE_CACHE.key(build_problem(spec)), spec["k"])
+    if states is None:
+        abort(404)
+
+    return {"key": states.key, "eigenvalues": (states.eigenvalues[:spec["k"]] / ELEMENTARY_CHARGE).tolist()}
+
+@app.route("/schrodinger/density/<key>/<int:index>")
+def schrodinger_density(key, index):
+    if len(key) != 40 or any(c not in "0123456789abcdef" for c in key):
+        abort(404)
+
+    image_key = sha1(repr(("eigenstate_density", key, index)).encode("utf-8")).hexdigest()
+
+    encoded = encoding.IMAGE_CACHE.get(image_key)
+    if encoded is None:
+        states = EIGENSTATE_CACHE.load(key)
+        if states is None or index >= len(states):
+            abort(404)
+
+        # 3D states are shown as their projection along z
+        image_array = density_image(states.density(index))
+        encoded = encoding.encode(image_array)
+        encoding.IMAGE_CACHE.put(image_key, encoded)
+
+    response = Response(encoded.data, mimetype=encoded.mimetype)
+    response.set_etag(encoded.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+
+    return response.make_conditional(request)
+
+@app.route("/schrodinger/mesh/<key>/<int:index>/<int:lod>")
+def schrodinger_mesh(key, index, lod):
+    """GLB isosurface of a cached 3-D state at a fraction (to the nearest 0.05) of its peak density, in grid units centred on the origin."""
+    if len(key) != 40 or any(c not in "0123456789abcdef" for c in key) or lod >= len(LOD_FRACTIONS):
+        abort(404)
+
+    try:
+        fraction = round(float(request.args.get("fraction", 0.1)) * MESH_FRACTION_STEPS) / MESH_FRACTION_STEPS
+    except (ValueError, OverflowError):
+        abort(400)
+    if not 0 < fraction < 1:
+        abort(400)
+
+    states = EIGENSTATE_CACHE.load(key)
+    if states is None or index >= len(states) or states.eigenvectors.ndim != 4:
+        abort(404)
+
+    path = mesh_paths(EIGENSTATE_CACHE.path(key), index, fraction)[lod]
+    if not os.path.exists(path):
+        # Extracted on the job service's worker processes; every level is written at once,
+        # next to the states so eviction removes them together
+        try:
+            SCHRODINGER_JOBS.mesh(EIGENSTATE_CACHE.path(key), index, fraction).result(timeout=MESH_TIMEOUT)
+        except (QueueFull, FutureTimeout):
+            # A timed-out extraction keeps running, and a retry shares it
+            abort(503)
+        except Exception:
+            abort(500)
+
+    response = send_file(path, mimetype="model/gltf-binary", etag=True, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+
+    return response
+
 @app.route("/n-body")
 def n_body():
-    return render_template("coming_soon.html")
+    return render_template("nbody.html")
 
 @app.route("/mandelbrot")
 def mandelbrot():
     return render_template("mandelbrot.html")
 
+@app.route("/mandelbrot/image/<key>")
+def mandelbrot_image(key):
+    encoded = encoding.IMAGE_CACHE.get(key)
+    if encoded is None:
+        abort(404)
+
+    response = Response(encoded.data, mimetype=encoded.mimetype)
+    response.set_etag(encoded.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+
+    return response.make_conditional(request)
+
+@app.route("/mandelbrot/julia_atlas")
+def julia_atlas():
+    args = request.args
+    try:
+        bounds = [float(args.get(field, default)) for field, default in
+                  (("real_lower", -2.0), ("real_upper", 1.0), ("imag_lower", -1.5), ("imag_upper", 1.5))]
+        n_real = int(args.get("n_real", 12))
+        n_imag = int(args.get("n_imag", 12))
+        thumb = int(args.get("thumb", 64))
+        n_iter = int(args.get("n_iter", 100))
+        options = encoder_options(args)
+    except ValueError:
+        abort(400)
+
+    palette = args.get("palette", "classic")
+    smooth = args.get("smooth", "false") == "true"
+    precision = args.get("precision", "double")
+
+    if precision not in PRECISIONS or palette not in PALETTES or options["fmt"] not in encoding.MIMETYPES:
+        abort(400)
+    if min(n_real, n_imag) < 1 or thumb < 2 or not 1 <= n_iter <= ATLAS_MAX_ITERATIONS or n_real * n_imag * thumb * thumb > ATLAS_MAX_SAMPLES:
+        abort(400)
+
+    key = sha1(repr(("julia_atlas", bounds, n_real, n_imag, thumb, n_iter, palette, smooth, precision, options)).encode("utf-8")).hexdigest()
+
+    encoded = encoding.IMAGE_CACHE.get(key)
+    if encoded is None:
+        try:
+            image_array = to_uint8(render_atlas(*bounds, n_real, n_imag, thumb, n_iter, palette, smooth, precision,
+                                                check=Deadline(ATLAS_TIMEOUT).check))
+        except RenderTimeout:
+            abort(503)
+        encoded = encoding.encode(image_array, **options)
+        encoding.IMAGE_CACHE.put(key, encoded)
+
+    response = Response(encoded.data, mimetype=encoded.mimetype)
+    response.set_etag(encoded.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+
+    return response.make_conditional(request)
+
 import numpy as np
 
 @socketio.on("update") 
@@ -98,6 +254,180 @@ def pause():
         THREADS[request.sid].join()
         del THREADS[request.sid]
 
+def four_well_problem(n, box, BC, depth=0):
+    """The four-well potential on an n x n (x depth, if nonzero) grid `box` Bohr radii across."""
+    width = box * BOHR_RADIUS
+
+    V = four_well_potential(n, n, depth, width, width, width)
+    return SchrodingerEquation(n, n, depth, V, ELECTRON_MASS, width, width, width, BC=BC)
+
+class WavepacketThread(Thread):
+    """Propagates a wavepacket and streams |psi|^2 frames to one client at up to FRAME_RATE."""
+
+    def __init__(self, sid, settings):
+        super(WavepacketThread, self).__init__()
+        self.sid = sid
+        self.settings = settings
+        self.running = True
+
+    def setup(self):
+        se = four_well_problem(self.settings["grid"], self.settings["box"], self.settings["BC"])
+
+        psi = gaussian_wavepacket(
+            se,
+            [c * BOHR_RADIUS for c in self.settings["center"]],
+            self.settings["packet_width"] * BOHR_RADIUS,
+            [k / BOHR_RADIUS for k in self.settings["momentum"]],
+            self.settings["precision"],
+        )
+
+        return propagator(se, self.settings["dt"] * ATOMIC_TIME, self.settings["precision"]), psi
+
+    def run(self):
+        evolution, psi = self.setup()
+        steps_per_frame = self.settings["steps_per_frame"]
+        n = self.settings["grid"]
+
+        for frame, density in enumerate(frames(evolution, psi, steps_per_frame)):
+            if not self.running:
+                break
+
+            start = time.time()
+
+            peak = float(density.max())
+            image = to_uint8(density[::-1] * (255 / peak if peak > 0 else 0))
+
+            socketio.emit("schrodinger_frame", {
+                "density": image.tobytes(),
+                "width": n,
+                "height": n,
+                "frame": frame,
+                "time": (frame + 1) * steps_per_frame * self.settings["dt"],
+            }, to=self.sid)
+
+            time.sleep(max(0.0, 1.0 / FRAME_RATE - (time.time() - start)))
+
+def wavepacket_settings(data):
+    settings = {
+        "grid": int(data.get("grid", 512)),
+        "box": float(data.get("box", 60.0)),
+        "BC": data.get("BC", "periodic"),
+        "dt": float(data.get("dt", 0.05)),
+        "steps_per_frame": int(data.get("steps_per_frame", 1)),
+        "precision": data.get("precision", "single"),
+        "center": [float(c) for c in data.get("center", (-15.0, 0.0))],
+        "packet_width": float(data.get("packet_width", 2.0)),
+        "momentum": [float(k) for k in data.get("momentum", (1.0, 0.0))],
+    }
+
+    if settings["precision"] not in WAVE_PRECISIONS or settings["BC"] not in ("periodic", "dirichlet"):
+        raise ValueError("unknown precision or boundary condition")
+    if not 16 <= settings["grid"] <= 2048 or settings["steps_per_frame"] < 1 or settings["dt"] <= 0:
+        raise ValueError("grid must be 16-2048 points, with at least one positive step per frame")
+
+    return settings
+
+@socketio.on("play_schrodinger")
+def play_schrodinger(data):
+    pause()
+
+    try:
+        settings = wavepacket_settings(data)
+    except (TypeError, ValueError) as e:
+        emit("schrodinger_error", {"error": str(e)})
+        return
+
+    thread = WavepacketThread(request.sid, settings)
+    THREADS[request.sid] = thread
+    thread.start()
+
+SCHRODINGER_JOBS = SchrodingerJobService(lambda event, data, sid: socketio.emit(event, data, to=sid), EIGENSTATE_CACHE)
+
+@socketio.on("solve_schrodinger")
+def solve_schrodinger(data):
+    try:
+        job_id = SCHRODINGER_JOBS.submit(request.sid, job_spec(data))
+    except (TypeError, ValueError, KeyError, QueueFull) as e:
+        emit("schrodinger_error", {"job": None, "error": str(e)})
+        return
+
+    emit("schrodinger_job", {"job": job_id})
+
+class NBodyThread(Thread):
+    """Steps an N-body simulation and streams the bodies' (x, y) to one client at up to FRAME_RATE."""
+
+    def __init__(self, sid, settings):
+        super(NBodyThread, self).__init__()
+        self.sid = sid
+        self.settings = settings
+        self.running = True
+
+    def run(self):
+        positions, velocities, masses = initial_conditions(self.settings["model"], self.settings["bodies"])
+        simulation = NBodySimulation(positions, velocities, masses, self.settings["theta"], self.settings["softening"])
+
+        # The view stays fixed, wide enough for nearly all of the initial bodies
+        extent = 1.5 * float(np.percentile(np.abs(positions[:, :2]), 99))
+        step_ms = 0.0
+
+        frame = 0
+        while self.running:
+            start = time.time()
+
+            # Bodies are sent in their initial order so the client can tell them apart
+            xy = simulation.in_initial_order(simulation.positions[:, :2]).astype(np.float32)
+            socketio.emit("nbody_frame", {
+                "positions": xy.tobytes(),
+                "bodies": len(simulation),
+                "extent": extent,
+                "frame": frame,
+                "time": simulation.time,
+                "step_ms": step_ms,
+            }, to=self.sid)
+            frame += 1
+
+            step_start = time.time()
+            steps = 0
+            while steps < self.settings["steps_per_frame"] and self.running:
+                simulation.step(self.settings["dt"])
+                steps += 1
+            step_ms = 1000 * (time.time() - step_start) / max(steps, 1)
+
+            time.sleep(max(0.0, 1.0 / FRAME_RATE - (time.time() - start)))
+
+def nbody_settings(data):
+    settings = {
+        "model": data.get("model", "disc"),
+        "bodies": int(data.get("bodies", 10000)),
+        "theta": float(data.get("theta", 0.5)),
+        "dt": float(data.get("dt", 1e-3)),
+        "steps_per_frame": int(data.get("steps_per_frame", 1)),
+        "softening": float(data.get("softening", 1e-2)),
+    }
+
+    if settings["model"] not in NBODY_MODELS:
+        raise ValueError(f"Unknown model: {settings['model']}")
+    if not 2 <= settings["bodies"] <= NBODY_MAX_BODIES or not 0 <= settings["theta"] <= 1.5:
+        raise ValueError(f"bodies must be 2-{NBODY_MAX_BODIES}, and theta 0-1.5")
+    if settings["steps_per_frame"] < 1 or settings["dt"] <= 0 or settings["softening"] <= 0:
+        raise ValueError("need at least one positive step per frame, and a positive softening")
+
+    return settings
+
+@socketio.on("play_nbody")
+def play_nbody(data):
+    pause()
+
+    try:
+        settings = nbody_settings(data)
+    except (TypeError, ValueError) as e:
+        emit("nbody_error", {"error": str(e)})
+        return
+
+    thread = NBodyThread(request.sid, settings)
+    THREADS[request.sid] = thread
+    thread.start()
+
 @socketio.on("disconnect")
 def disconnect():
     print("Client disconnected")
@@ -109,25 +439,59 @@ def disconnect():
         THREADS[request.sid].join()
         del THREADS[request.sid]
 
-def add_axes(image, real_lower, real_upper, imag_lower, imag_upper, x_res, y_res):
-    draw = ImageDraw.Draw(image)
+    RENDER_SCHEDULER.cancel(request.sid)
+    SCHRODINGER_JOBS.cancel(request.sid)
 
-    x_ints = np.linspace(0, x_res, 10)
-    y_ints = np.linspace(y_res, 0, 10)
+    if request.sid in MANDELBROTS:
+        del MANDELBROTS[request.sid]
 
-    x_floats = np.linspace(real_lower, real_upper, 10)
-    y_floats = np.linspace(imag_lower, imag_upper, 10)
+def to_uint8(image_array):
+    return np.ascontiguousarray(to_host(image_array).astype(np.uint8))
 
-    for i, real in zip(x_ints, x_floats):
-        draw.line([(i, 0), (i, y_res)], fill="white", width=1)
-        draw.text((i, 0), "{:.2e}".format(real), fill="white")
+def render_key(data):
+    fields = ("real_lower", "real_upper", "imag_lower", "imag_upper", "x_res", "y_res", "n_iter",
+              "strategy", "palette", "smooth", "precision", "format", "quality", "compress_level")
 
-    for i, imag in zip(y_ints, y_floats):
-        draw.line([(0, i), (x_res, i)], fill="white", width=1)
-        draw.text((0, i), "{:.2e}".format(imag), fill="white")
+    return sha1(repr([data.get(field) for field in fields]).encode("utf-8")).hexdigest()
 
-@socketio.on("render_mandelbrot")
-def render_mandelbrot(data):
+def encoder_options(data):
+    return {
+        "fmt": data.get("format", "png"),
+        "quality": int(data.get("quality", 85)),
+        "compress_level": int(data.get("compress_level", 1)),
+    }
+
+def image_payload(encoded, transport, key=None):
+    payload = {"mimetype": encoded.mimetype, "bytes": len(encoded.data), "encode_ms": encoded.encode_time * 1000}
+
+    if transport == "http" and key is not None:
+        payload["url"] = f"/mandelbrot/image/{key}"
+    else:
+        payload["image"] = encoded.data
+
+    return payload
+
+def render_progressive(job, mandelbrot_set, known, n_iter, options, fields):
+    for stride in mandelbrot_set.progressive(n_iter, known):
+        if stride == 1:
+            continue
+
+        escape_time = mandelbrot_set.escape_time[::stride, ::stride]
+        z = mandelbrot_set.z[::stride, ::stride]
+        image_array = to_uint8(mandelbrot_set.get_colors(escape_time, n_iter, z)[::-1])
+
+        def send(encoded, stride=stride):
+            socketio.emit("rendered_mandelbrot_partial", dict(image_payload(encoded, "binary"), stride=stride, **fields), to=job.sid)
+
+        encoding.submit(image_array, send, lambda error: render_error(job, error), **options)
+
+def render_error(job, error):
+    message = "Render timed out" if isinstance(error, RenderTimeout) else f"Render failed: {error}"
+    socketio.emit("render_mandelbrot_error", {"error": message}, to=job.sid)
+
+RENDER_SCHEDULER = RenderScheduler(on_error=render_error)
+
+def run_render(job, data):
     real_lower = float(data["real_lower"])
     real_upper = float(data["real_upper"])
     imag_lower = float(data["imag_lower"])
@@ -135,7 +499,66 @@ def render_mandelbrot(data):
     x_res = int(data["x_res"])
     y_res = int(data["y_res"])
     n_iter = int(data["n_iter"])
+    progressive = bool(data.get("progressive", False))
+    strategy = data.get("strategy", "brute_force")
+    palette = data.get("palette", "classic")
+    smooth = bool(data.get("smooth", False))
+    transport = data.get("transport", "binary")
+    precision = data.get("precision", "double")
+    options = encoder_options(data)
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision {precision}")
+    if options["fmt"] not in encoding.MIMETYPES:
+        raise ValueError(f"unknown image format {options['fmt']}")
+    if real_lower >= real_upper or imag_lower >= imag_upper:
+        raise ValueError("lower bounds must be below upper bounds")
+    if x_res < 2 or y_res < 2 or n_iter < 1:
+        raise ValueError("resolution must be at least 2 and iterations at least 1")
+
+    key = render_key(data)
+    fields = {"real_lower": real_lower, "real_upper": real_upper, "imag_lower": imag_lower, "imag_upper": imag_upper,
+              "request_id": data.get("request_id")}
+
+    cached = encoding.IMAGE_CACHE.get(key)
+    if cached is not None:
+        socketio.emit("rendered_mandelbrot", dict(image_payload(cached, transport, key), cached=True, **fields), to=job.sid)
+        return
+
+    previous = MANDELBROTS.get(job.sid)
+    mandelbrot_set, known = MandelbrotSet.from_previous(previous, real_lower, real_upper, imag_lower, imag_upper, x_res, y_res, ESCAPE_CACHE, precision)
+    mandelbrot_set.colorizer = Colorizer(palette, smooth=smooth)
+
+    # A cancelled render leaves a reused set consistent but a new one half-computed,
+    # so the session only keeps the new set once it is finished
+    mandelbrot_set.check = job.check
+    try:
+        if progressive and strategy != "mariani_silver":
+            render_progressive(job, mandelbrot_set, known, n_iter, options, fields)
+        elif strategy == "mariani_silver" and known is None:
+            mandelbrot_set.mariani_silver(n_iter)
+        else:
+            mandelbrot_set.fill(n_iter, known)
+    finally:
+        mandelbrot_set.check = None
+
+    job.check()
+    MANDELBROTS[job.sid] = mandelbrot_set
+
+    if mandelbrot_set.N_iterations > ESCAPE_CACHE.depth(real_lower, real_upper, imag_lower, imag_upper, x_res, y_res, precision):
+        ESCAPE_CACHE.store_async(mandelbrot_set)
 
+    image_array = to_uint8(mandelbrot_set.get_image((x_res, y_res), max_iter=n_iter)[::-1])
+
+    def send(encoded):
+        encoding.IMAGE_CACHE.put(key, encoded)
+        app.logger.info("Encoded %s render: %d bytes in %.1f ms", encoded.mimetype, len(encoded.data), encoded.encode_time * 1000)
+        socketio.emit("rendered_mandelbrot", dict(image_payload(encoded, transport, key), cached=False, **fields), to=job.sid)
+
+    encoding.submit(image_array, send, lambda error: render_error(job, error), **options)
+
+@socketio.on("render_mandelbrot")
+def render_mandelbrot(data):
     if request.sid in PENDULA:
         del PENDULA[request.sid]
 
@@ -144,35 +567,7 @@ def render_mandelbrot(data):
         THREADS[request.sid].join()
         del THREADS[request.sid]
 
-    success = False
-
-    while not success:
-        try:
-            mandelbrot_set = MandelbrotSet(real_lower, real_upper, imag_lower, imag_upper, x_res, y_res)
-            mandelbrot_set.iterate(n_iter)
-            success = True
-        except:
-            pass
-    
-
-    image_array = mandelbrot_set.get_image((x_res, y_res))[::-1]
-    try:
-        image_array = image_array.get()
-    except:
-        pass
-
-    image_array = image_array.astype(np.uint8)
-
-    image = Image.fromarray(image_array)
-    add_axes(image, real_lower, real_upper, imag_lower, imag_upper, x_res, y_res)
-    
-
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    image_data = buffer.getvalue()
-    image_data_base64 = base64.b64encode(image_data).decode("utf-8")
-
-    socketio.emit("rendered_mandelbrot", {"image": f"data:image/png;base64,{image_data_base64}"})
+    RENDER_SCHEDULER.submit(request.sid, lambda job: run_render(job, data))
 
 if __name__=="__main__":
     app.run(debug=True)